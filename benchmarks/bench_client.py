@@ -0,0 +1,247 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+# Measures client hot paths against in-memory fixture transport. Results are
+# written as JSON so that runs of different versions can be compared:
+#
+#   python benchmarks/bench_client.py --output new.json --compare old.json
+
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+import urllib.parse
+
+# use package from repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rebrick
+from rebrick import config
+from rebrick.request import request, decode_json, set_transport
+from rebrick.transport import Transport, Response
+from rebrick.server import Catalogue
+
+
+class FixtureTransport(Transport):
+    """Serves pre-encoded pages of synthetic catalogue without network."""
+    
+    
+    def __init__(self, catalogue, page_size=1000):
+        
+        super().__init__()
+        
+        self._pages = {}
+        
+        # make set inventory pages
+        for set_num, data in catalogue.sets.items():
+            
+            items = [catalogue.get_element(k, q, s, True) for k, q, s in data['inventory']]
+            pages = [items[i:i+page_size] for i in range(0, len(items), page_size)] or [[]]
+            
+            for i, results in enumerate(pages):
+                next_url = "http://fixture/?page=%d" % (i + 2) if i + 1 < len(pages) else None
+                body = json.dumps({'count': len(items), 'next': next_url, 'previous': None, 'results': results})
+                self._pages[(set_num, str(i + 1))] = body.encode('utf-8')
+    
+    
+    def open(self, url, data=None, headers=None, timeout=None):
+        
+        parts = urllib.parse.urlsplit(url)
+        query = dict(urllib.parse.parse_qsl(parts.query))
+        
+        # get inventory page
+        if "/sets/" in parts.path:
+            set_num = parts.path.rstrip("/").split("/")[-2]
+            body = self._pages.get((set_num, query.get('page', '1')), None)
+            if body is not None:
+                return Response(body)
+        
+        return Response(b'{}')
+
+
+def measure(func, repeat, number=1):
+    """Runs function repeatedly and gets best time per call."""
+    
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        for j in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+    
+    return min(times)
+
+
+def bench_request(repeat):
+    """Measures request() overhead without network."""
+    
+    parameters = {'search': "brick", 'theme_id': None, 'page': "http://fixture/?page=3", 'page_size': 1000, 'key': None}
+    url = config.API_LEGO_URL + "sets/"
+    
+    best = measure(lambda: request(url, parameters), repeat, 1000)
+    
+    return {'mean_us': best * 1e6, 'ops_per_sec': 1 / best}
+
+
+def bench_decode(catalogue, repeat):
+    """Measures JSON decode of full inventory page."""
+    
+    items = [catalogue.get_element(k, 1, False, True) for k in list(catalogue.elements.values())[:1000]]
+    body = json.dumps({'count': len(items), 'next': None, 'previous': None, 'results': items}).encode('utf-8')
+    
+    best = measure(lambda: decode_json(body), repeat, 10)
+    
+    return {'mean_ms': best * 1e3, 'mb_per_sec': len(body) / best / 1e6, 'bytes': len(body)}
+
+
+def bench_create(catalogue, repeat):
+    """Measures entity creation throughput."""
+    
+    items = [catalogue.get_element(k, 1, False, True) for k in list(catalogue.elements.values())[:1000]]
+    parts = [x['part'] for x in items]
+    colors = [x['color'] for x in items]
+    
+    results = {}
+    
+    for name, create, data in (('element', rebrick.Element.create, items), ('part', rebrick.Part.create, parts), ('color', rebrick.Color.create, colors)):
+        best = measure(lambda: [create(x) for x in data], repeat)
+        results[name] = {'ops_per_sec': len(data) / best, 'mean_us': best / len(data) * 1e6}
+    
+    return results
+
+
+def bench_paging(catalogue, repeat):
+    """Measures paged retrieval of set inventories."""
+    
+    set_nums = list(catalogue.sets)
+    count = sum(len(catalogue.sets[s]['inventory']) for s in set_nums)
+    
+    results = {}
+    
+    for name, stream in (('buffered', False), ('streamed', True)):
+        rb = rebrick.Rebrick("fixture", stream=stream)
+        best = measure(lambda: [rb.get_set_elements(s, part_details=True) for s in set_nums], repeat)
+        results[name] = {'elements_per_sec': count / best, 'mean_ms': best * 1e3}
+    
+    return results
+
+
+def bench_memory(catalogue, count=100000):
+    """Measures memory used by created elements."""
+    
+    items = [catalogue.get_element(k, 1, False, True) for k in list(catalogue.elements.values())[:1000]]
+    
+    gc.collect()
+    tracemalloc.start()
+    
+    elements = [rebrick.Element.create(items[i % len(items)]) for i in range(count)]
+    
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    del elements
+    
+    return {'entities': count, 'mb': current / 1e6, 'peak_mb': peak / 1e6}
+
+
+def flatten(data, prefix=""):
+    """Flattens nested results into dotted names."""
+    
+    flat = {}
+    
+    for name, value in data.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, prefix + name + "."))
+        else:
+            flat[prefix + name] = value
+    
+    return flat
+
+
+def compare(current, previous, threshold):
+    """Prints comparison and gets number of regressions."""
+    
+    current = flatten(current['results'])
+    previous = flatten(previous['results'])
+    regressions = 0
+    
+    for name in sorted(current):
+        
+        if name not in previous or not previous[name]:
+            continue
+        
+        ratio = current[name] / previous[name]
+        
+        # lower is better for times and memory
+        higher_better = name.endswith("per_sec")
+        change = ratio - 1 if higher_better else 1 - ratio
+        
+        flag = ""
+        if change < -threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        
+        print("%-40s %12.3f %12.3f %+8.1f%%%s" % (name, previous[name], current[name], change * 100, flag))
+    
+    return regressions
+
+
+def main():
+    
+    parser = argparse.ArgumentParser(description="Benchmarks rebrick client hot paths.")
+    parser.add_argument('--output', help="path of JSON file to write results to")
+    parser.add_argument('--compare', help="path of JSON results to compare with")
+    parser.add_argument('--threshold', type=float, default=0.1, help="relative change reported as regression")
+    parser.add_argument('--repeat', type=int, default=5, help="number of repeats")
+    parser.add_argument('--sets', type=int, default=20, help="number of sets to page through")
+    args = parser.parse_args()
+    
+    # init fixture
+    catalogue = Catalogue(parts=2000, sets=args.sets, set_size=1500, seed=1)
+    
+    config.REQUEST_DELAY = 0
+    config.API_KEY = "fixture"
+    set_transport(FixtureTransport(catalogue))
+    
+    # run benchmarks
+    results = {
+        'request': bench_request(args.repeat),
+        'decode': bench_decode(catalogue, args.repeat),
+        'create': bench_create(catalogue, args.repeat),
+        'paging': bench_paging(catalogue, args.repeat),
+        'memory': bench_memory(catalogue)}
+    
+    set_transport(None)
+    
+    report = {
+        'rebrick': ".".join(str(x) for x in rebrick.version),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'results': results}
+    
+    # write results
+    output = json.dumps(report, indent=2)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+    
+    # compare results
+    if args.compare:
+        
+        with open(args.compare) as f:
+            previous = json.load(f)
+        
+        if compare(report, previous, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
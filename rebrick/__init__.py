@@ -4,12 +4,30 @@
 # set version
 version = (0, 4, 0)
 
-import json
 from . import config
+from . import metrics
 from . import api_lego as lego
 from . import api_users as users
+from .request import read_json
 from .objects import COLL_SET, COLL_MOC
 from .objects import Element, Color, Part, Collection, Theme, Category
+from .breaker import CircuitBreaker, CircuitOpenError
+from .cache import DiskCache, MemoryCache, ResponseCache, NegativeCache
+from .elements import ElementIndex
+from .graph import REL_PRINT, REL_MOLD, REL_ALTERNATE, PartGraph
+from .hedging import HedgePolicy
+from .images import ImageFetcher
+from .metrics import MetricsCollector, add_hook, remove_hook
+from .palette import Palette
+from .rediscache import RedisCache
+from .scheduler import PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BULK, Scheduler, CancelToken, scheduled
+from .reference import ReferenceData
+from .refresher import Refresher
+from .similarity import SimilarityIndex
+from .snapshot import Snapshot, write_snapshot
+from .stream import ResultsReader
+from .themes import ThemeTree
+from .transport import Transport, RecordingTransport, ReplayTransport, UnixSocketTransport
 from .rebrick import Rebrick
 
 
@@ -38,7 +56,7 @@ def init(*args):
     elif len(args) == 3:
         config.API_KEY = str(args[0])
         response = users.get_token(args[1], args[2])
-        data = json.loads(response.read())
+        data = read_json(response)
         config.USER_TOKEN = data.get('user_token', None)
     
     # show help
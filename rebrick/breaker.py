@@ -0,0 +1,266 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import io
+import time
+import threading
+import urllib.error
+
+# define states
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(urllib.error.HTTPError):
+    """
+    Raised if request is rejected by open circuit. It is reported as 503
+    error so that it is handled as any other server error.
+    """
+    
+    
+    def __init__(self, url, group):
+        """
+        Initializes a new instance of rebrick.CircuitOpenError.
+        
+        Args:
+            url: str
+                Request URL.
+            
+            group: str
+                Endpoint group.
+        """
+        
+        super().__init__(url, 503, "Circuit open! --> %s" % group, None, io.BytesIO())
+        
+        self.group = group
+
+
+class CircuitBreaker(object):
+    """
+    Provides per-endpoint-group circuit breaker. After given number of
+    consecutive failures (network errors, server errors or throttling) the
+    circuit opens and all requests of the group fail fast. Once the reset
+    timeout elapses, limited number of probe requests is allowed (half-open
+    state). Successful probe closes the circuit, failed one opens it again.
+    """
+    
+    
+    def __init__(self, threshold=5, reset_timeout=30., probes=1):
+        """
+        Initializes a new instance of rebrick.CircuitBreaker.
+        
+        Args:
+            threshold: int
+                Number of consecutive failures to open the circuit.
+            
+            reset_timeout: float
+                Time in seconds after which the probe requests are allowed.
+            
+            probes: int
+                Maximum number of concurrent probe requests.
+        """
+        
+        super().__init__()
+        
+        self._threshold = threshold
+        self._reset_timeout = reset_timeout
+        self._probes = probes
+        
+        self._groups = {}
+        self._lock = threading.Lock()
+    
+    
+    def get_state(self, group):
+        """
+        Gets current state of given group.
+        
+        Args:
+            group: str
+                Endpoint group (e.g. 'lego/sets').
+        
+        Returns:
+            str
+                State as rebrick.breaker.STATE_* constant.
+        """
+        
+        with self._lock:
+            
+            circuit = self._groups.get(group, None)
+            if circuit is None or circuit.opened is None:
+                return STATE_CLOSED
+            
+            if time.monotonic() - circuit.opened >= self._reset_timeout:
+                return STATE_HALF_OPEN
+            
+            return STATE_OPEN
+    
+    
+    def allow(self, group):
+        """
+        Checks whether request of given group can be sent. If allowed, the
+        result must be reported by success() or failure().
+        
+        Args:
+            group: str
+                Endpoint group (e.g. 'lego/sets').
+        
+        Returns:
+            bool
+                True if request can be sent, False otherwise.
+        """
+        
+        with self._lock:
+            
+            circuit = self._groups.get(group, None)
+            if circuit is None or circuit.opened is None:
+                return True
+            
+            # still open
+            if time.monotonic() - circuit.opened < self._reset_timeout:
+                return False
+            
+            # allow probe
+            if circuit.probing < self._probes:
+                circuit.probing += 1
+                return True
+            
+            return False
+    
+    
+    def release(self, group):
+        """
+        Releases allowed request which was not sent.
+        
+        Args:
+            group: str
+                Endpoint group (e.g. 'lego/sets').
+        """
+        
+        with self._lock:
+            
+            circuit = self._groups.get(group, None)
+            if circuit is not None and circuit.probing:
+                circuit.probing -= 1
+    
+    
+    def success(self, group):
+        """
+        Reports successful request and closes the circuit.
+        
+        Args:
+            group: str
+                Endpoint group (e.g. 'lego/sets').
+        """
+        
+        with self._lock:
+            self._groups.pop(group, None)
+    
+    
+    def failure(self, group):
+        """
+        Reports failed request.
+        
+        Args:
+            group: str
+                Endpoint group (e.g. 'lego/sets').
+        """
+        
+        with self._lock:
+            
+            circuit = self._groups.get(group, None)
+            if circuit is None:
+                circuit = _Circuit()
+                self._groups[group] = circuit
+            
+            circuit.failures += 1
+            
+            # reopen after failed probe
+            if circuit.opened is not None:
+                circuit.opened = time.monotonic()
+                circuit.probing = 0
+            
+            # open circuit
+            elif circuit.failures >= self._threshold:
+                circuit.opened = time.monotonic()
+    
+    
+    def reset(self):
+        """Closes all circuits."""
+        
+        with self._lock:
+            self._groups = {}
+
+
+def get_group(endpoint):
+    """
+    Gets endpoint group for given endpoint template.
+    
+    Args:
+        endpoint: str
+            Endpoint template (e.g. 'lego/sets/{id}/parts/').
+    
+    Returns:
+        str
+            Endpoint group (e.g. 'lego/sets').
+    """
+    
+    return "/".join(endpoint.split("/")[:2])
+
+
+def is_failure(error, expired=False):
+    """
+    Checks whether given request error should be counted as failure.
+    
+    Args:
+        error: Exception
+            Request error.
+        
+        expired: bool
+            Specifies whether the request was limited by caller's deadline
+            which has expired. Timeouts of such requests are not counted.
+    
+    Returns:
+        bool
+            True if the error indicates upstream problem.
+    """
+    
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code >= 500 or error.code == 429
+    
+    if expired and is_timeout(error):
+        return False
+    
+    return isinstance(error, (urllib.error.URLError, OSError))
+
+
+def is_timeout(error):
+    """
+    Checks whether given request error is a timeout.
+    
+    Args:
+        error: Exception
+            Request error.
+    
+    Returns:
+        bool
+            True if the error is a timeout.
+    """
+    
+    if isinstance(error, urllib.error.URLError) and not isinstance(error, urllib.error.HTTPError):
+        error = error.reason
+    
+    return isinstance(error, TimeoutError)
+
+
+class _Circuit(object):
+    """Holds state of single endpoint group."""
+    
+    
+    def __init__(self):
+        
+        super().__init__()
+        
+        self.failures = 0
+        self.opened = None
+        self.probing = 0
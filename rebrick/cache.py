@@ -0,0 +1,1015 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import io
+import os
+import time
+import zlib
+import struct
+import hashlib
+import threading
+import contextlib
+import collections
+import urllib.error
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# define compression methods
+COMPRESS_AUTO = 'auto'
+COMPRESS_ZLIB = 'zlib'
+COMPRESS_ZSTD = 'zstd'
+
+# define object header
+_OBJECT_MAGIC = b"\x89RBZ"
+_OBJECT_STRUCT = struct.Struct("<4sBIQ")
+_OBJECT_SIZE = _OBJECT_STRUCT.size
+
+_METHOD_RAW = 0
+_METHOD_ZLIB = 1
+_METHOD_ZSTD = 2
+
+# define preset dictionary (most frequent fragments last)
+_PRESET_DICT = "".join((
+    '{"count":', ',"next":"https://rebrickable.com/api/v3/lego/', '&page=2&page_size=1000"', ',"previous":null', ',"results":[',
+    '"last_modified_dt":"', 'T00:00:00.000000Z"', '"theme_id":', '"year":', '"num_parts":',
+    '"set_img_url":"https://cdn.rebrickable.com/media/sets/', '"set_url":"https://rebrickable.com/sets/',
+    '"Peeron":{"ext_ids":[null],"ext_descrs":[["', '"LDraw":{"ext_ids":[', '"LEGO":{"ext_ids":[',
+    '"BrickOwl":{"ext_ids":[', '"BrickLink":{"ext_ids":[', '],"ext_descrs":[["', '"]]},',
+    '"year_from":', ',"year_to":', ',"prints":[]', ',"molds":[]', ',"alternates":[]', ',"print_of":null',
+    '"Brickset":["', '"],"LDraw":["', '"],"LEGO":["', '"],"BrickOwl":["', ',"external_ids":{"BrickLink":["', '"]}',
+    'Trans-Clear', 'Reddish Brown', 'Dark Bluish Gray', 'Light Bluish Gray', 'Tan', 'Blue', 'Red', 'Yellow', 'White', 'Black',
+    'Technic ', 'Slope ', 'Tile ', 'Brick ', 'Plate ', ' x ',
+    '"color":{"id":', '","rgb":"', '","is_trans":true', '","is_trans":false',
+    ',"part":{"part_num":"', '","name":"', '","part_cat_id":', ',"part_url":"https://rebrickable.com/parts/',
+    '/","part_img_url":"https://cdn.rebrickable.com/media/parts/elements/', '.jpg"',
+    '"set_num":"', '","quantity":', ',"is_spare":false', ',"element_id":"', '","num_sets":', '},{"id":', ',"inv_part_id":',
+)).encode('utf-8')
+
+# define time stamp format
+_TIME_STRUCT = struct.Struct("<d")
+_TIME_SIZE = _TIME_STRUCT.size
+
+
+class DiskCache(object):
+    """
+    Provides persistent content-addressed storage of binary data. Each value
+    is stored once under the hash of its content, so identical data stored
+    under different keys occupy the space only once. Data are transparently
+    compressed by zlib or zstd, using preset dictionary of common Rebrickable
+    payload fragments, which makes even small JSON pages compress well. If the
+    total compressed size exceeds the limit, the least recently used data are
+    evicted.
+    
+    The directory can be shared by several processes (e.g. forked workers).
+    References of stored data are kept on disk and changes are synchronized by
+    a lock file, so data are only removed if no key of any process points to
+    them. The size limit is applied by each process to the data it knows.
+    Locking requires POSIX fcntl, elsewhere a single process must be used.
+    """
+    
+    
+    def __init__(self, path, max_size=None, compression=COMPRESS_AUTO, level=None, zdict=None, compress_min=64):
+        """
+        Initializes a new instance of rebrick.DiskCache.
+        
+        Args:
+            path: str
+                Path to the cache directory.
+            
+            max_size: int or None
+                Maximum total size of stored (compressed) data in bytes. If
+                set to None the size is not limited.
+            
+            compression: str or None
+                Compression method as rebrick.cache.COMPRESS_* constant. By
+                default zstd is used if the zstandard package is available,
+                otherwise zlib. If set to None, data are stored uncompressed.
+            
+            level: int or None
+                Compression level. If set to None, default level of the method
+                is used.
+            
+            zdict: bytes or None
+                Preset compression dictionary. If set to None, built-in
+                dictionary of common Rebrickable payload fragments is used.
+                Data stored with different dictionary are ignored.
+            
+            compress_min: int
+                Minimum size of data to be compressed in bytes.
+        """
+        
+        super().__init__()
+        
+        # check compression
+        if compression == COMPRESS_AUTO:
+            compression = COMPRESS_ZSTD if zstandard is not None else COMPRESS_ZLIB
+        
+        if compression not in (None, COMPRESS_ZLIB, COMPRESS_ZSTD):
+            raise ValueError("Unknown compression method! --> %s" % compression)
+        
+        if compression == COMPRESS_ZSTD and zstandard is None:
+            raise ValueError("Compression requires zstandard package! --> %s" % compression)
+        
+        self._path = path
+        self._max_size = max_size
+        self._compression = compression
+        self._level = level
+        self._compress_min = compress_min
+        self._lock = threading.RLock()
+        
+        # init dictionary
+        self._zdict = zdict if zdict is not None else _PRESET_DICT
+        self._zdict_id = zlib.crc32(self._zdict)
+        self._zstd_dict = None
+        
+        if zstandard is not None and self._zdict:
+            self._zstd_dict = zstandard.ZstdCompressionDict(self._zdict, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        
+        self._objects_dir = os.path.join(path, "objects")
+        self._keys_dir = os.path.join(path, "keys")
+        self._refs_dir = os.path.join(path, "refs")
+        
+        os.makedirs(self._objects_dir, exist_ok=True)
+        os.makedirs(self._keys_dir, exist_ok=True)
+        os.makedirs(self._refs_dir, exist_ok=True)
+        
+        # init index
+        self._objects = collections.OrderedDict()
+        self._size = 0
+        self._raw_size = 0
+        
+        # init process lock
+        self._lock_file = None
+        self._lock_pid = None
+        
+        with self._locked(exclusive=True):
+            self._load()
+    
+    
+    def __contains__(self, key):
+        """Checks whether given key is stored."""
+        
+        return self.get(key) is not None
+    
+    
+    @property
+    def size(self):
+        """
+        Gets total size of stored (compressed) data.
+        
+        Returns:
+            int
+                Size in bytes.
+        """
+        
+        return self._size
+    
+    
+    @property
+    def raw_size(self):
+        """
+        Gets total size of stored data before compression.
+        
+        Returns:
+            int
+                Size in bytes.
+        """
+        
+        return self._raw_size
+    
+    
+    def get(self, key):
+        """
+        Gets data stored under given key.
+        
+        Args:
+            key: str
+                Data key (e.g. URL).
+        
+        Returns:
+            bytes or None
+                Stored data.
+        """
+        
+        name = self._get_key_name(key)
+        
+        with self._lock:
+            
+            # get data path
+            digest = self._read_key(name)
+            if digest is None:
+                return None
+            
+            path = os.path.join(self._objects_dir, digest)
+            
+            # read data
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+            
+            # remove stale key
+            except FileNotFoundError:
+                with self._locked():
+                    if self._read_key(name) == digest and not os.path.exists(path):
+                        self._unlink(name, digest)
+                return None
+            
+            # mark as recently used
+            self._touch(digest, path)
+        
+        return self._decode(data)
+    
+    
+    def set(self, key, data):
+        """
+        Stores data under given key.
+        
+        Args:
+            key: str
+                Data key (e.g. URL).
+            
+            data: bytes
+                Data to store.
+        """
+        
+        name = self._get_key_name(key)
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self._objects_dir, digest)
+        
+        # compress outside lock
+        blob = None
+        if not self._is_readable(_read_header(path)):
+            blob = self._encode(data)
+        
+        with self._locked():
+            
+            # reuse stored data
+            header = _read_header(path)
+            if self._is_readable(header):
+                self._touch(digest, path)
+            
+            # store data
+            else:
+                blob = blob or self._encode(data)
+                _write_file(path, blob)
+                self._add_object(digest, len(blob), len(data))
+            
+            # store key
+            previous = self._read_key(name)
+            if previous == digest:
+                previous = None
+            
+            self._link(name, digest)
+            
+            if previous is not None:
+                self._remove_ref(name, previous)
+        
+        # check unused and old data
+        if previous is None and (self._max_size is None or self._size <= self._max_size):
+            return
+        
+        # remove unused and old data
+        with self._locked(exclusive=True):
+            
+            if previous is not None:
+                self._release(previous)
+            
+            self._evict()
+    
+    
+    def delete(self, key):
+        """
+        Removes given key. Stored data are removed as well unless shared by
+        other keys.
+        
+        Args:
+            key: str
+                Data key (e.g. URL).
+        """
+        
+        name = self._get_key_name(key)
+        
+        with self._locked():
+            
+            digest = self._read_key(name)
+            if digest is None:
+                return
+            
+            self._unlink(name, digest)
+        
+        with self._locked(exclusive=True):
+            self._release(digest)
+    
+    
+    def clear(self):
+        """Removes all stored data."""
+        
+        with self._locked(exclusive=True):
+            
+            for directory in (self._keys_dir, self._objects_dir):
+                for name in os.listdir(directory):
+                    _remove_file(os.path.join(directory, name))
+            
+            for digest in os.listdir(self._refs_dir):
+                self._remove_refs(digest)
+            
+            self._objects.clear()
+            self._size = 0
+            self._raw_size = 0
+    
+    
+    def _encode(self, data):
+        """Compresses data and adds object header."""
+        
+        method = _METHOD_RAW
+        payload = data
+        
+        # compress
+        if self._compression and len(data) >= self._compress_min:
+            
+            if self._compression == COMPRESS_ZSTD:
+                compressor = zstandard.ZstdCompressor(level=self._level or 3, dict_data=self._zstd_dict)
+                compressed = compressor.compress(data)
+            
+            else:
+                compressor = zlib.compressobj(self._level or 6, zlib.DEFLATED, 15, 9, zlib.Z_DEFAULT_STRATEGY, *([self._zdict] if self._zdict else []))
+                compressed = compressor.compress(data) + compressor.flush()
+            
+            # use if smaller
+            if len(compressed) < len(data):
+                method = _METHOD_ZSTD if self._compression == COMPRESS_ZSTD else _METHOD_ZLIB
+                payload = compressed
+        
+        return _OBJECT_STRUCT.pack(_OBJECT_MAGIC, method, self._zdict_id, len(data)) + payload
+    
+    
+    def _decode(self, blob):
+        """Removes object header and decompresses data."""
+        
+        # data stored without header
+        if blob[:len(_OBJECT_MAGIC)] != _OBJECT_MAGIC:
+            return blob
+        
+        magic, method, zdict_id, raw_size = _OBJECT_STRUCT.unpack_from(blob)
+        payload = blob[_OBJECT_SIZE:]
+        
+        if method == _METHOD_RAW:
+            return payload
+        
+        # check dictionary
+        if zdict_id != self._zdict_id:
+            return None
+        
+        # decompress
+        if method == _METHOD_ZLIB:
+            decompressor = zlib.decompressobj(zdict=self._zdict) if self._zdict else zlib.decompressobj()
+            return decompressor.decompress(payload) + decompressor.flush()
+        
+        if method == _METHOD_ZSTD and zstandard is not None:
+            decompressor = zstandard.ZstdDecompressor(dict_data=self._zstd_dict)
+            return decompressor.decompress(payload, max_output_size=raw_size)
+        
+        return None
+    
+    
+    def _is_readable(self, header):
+        """Checks whether stored data of given header can be decoded."""
+        
+        if header is None:
+            return False
+        
+        if header[0] == _METHOD_RAW:
+            return True
+        
+        if header[0] == _METHOD_ZSTD and zstandard is None:
+            return False
+        
+        return header[1] == self._zdict_id
+    
+    
+    def _get_key_name(self, key):
+        """Gets name of the file storing data hash for given key."""
+        
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+    
+    
+    def _read_key(self, name):
+        """Gets data hash stored in given key file."""
+        
+        try:
+            with open(os.path.join(self._keys_dir, name), 'rb') as f:
+                return f.read().decode('ascii')
+        except FileNotFoundError:
+            return None
+    
+    
+    @contextlib.contextmanager
+    def _locked(self, exclusive=False):
+        """Locks the cache for current thread and against other processes."""
+        
+        with self._lock:
+            
+            if fcntl is None:
+                yield
+                return
+            
+            # open own lock file in forked process
+            if self._lock_pid != os.getpid():
+                self._lock_file = open(os.path.join(self._path, "lock"), 'ab')
+                self._lock_pid = os.getpid()
+            
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+    
+    
+    def _load(self):
+        """Indexes stored data and removes unreferenced files."""
+        
+        # index objects by last use
+        items = []
+        for digest in os.listdir(self._objects_dir):
+            
+            if digest.endswith(".tmp"):
+                continue
+            
+            path = os.path.join(self._objects_dir, digest)
+            header = _read_header(path)
+            try:
+                mtime = os.path.getmtime(path)
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                continue
+            
+            if header is not None:
+                items.append((mtime, digest, size, header[2]))
+        
+        for mtime, digest, size, raw_size in sorted(items):
+            self._add_object(digest, size, raw_size)
+        
+        # index keys
+        refs = {}
+        for name in os.listdir(self._keys_dir):
+            
+            if name.endswith(".tmp"):
+                continue
+            
+            digest = self._read_key(name)
+            if digest in self._objects:
+                refs.setdefault(digest, set()).add(name)
+            else:
+                _remove_file(os.path.join(self._keys_dir, name))
+        
+        # sync references
+        for digest in os.listdir(self._refs_dir):
+            names = refs.get(digest, ())
+            for name in _list_dir(os.path.join(self._refs_dir, digest)):
+                if name not in names:
+                    self._remove_ref(name, digest)
+        
+        for digest, names in refs.items():
+            for name in names:
+                self._add_ref(name, digest)
+        
+        # remove unreferenced data
+        for digest in [d for d in self._objects if d not in refs]:
+            self._remove_object(digest)
+    
+    
+    def _link(self, name, digest):
+        """Stores key pointing to given data."""
+        
+        self._add_ref(name, digest)
+        _write_file(os.path.join(self._keys_dir, name), digest.encode('ascii'))
+    
+    
+    def _unlink(self, name, digest):
+        """Removes key and its reference of given data."""
+        
+        _remove_file(os.path.join(self._keys_dir, name))
+        self._remove_ref(name, digest)
+    
+    
+    def _add_ref(self, name, digest):
+        """Marks given data as used by given key."""
+        
+        directory = os.path.join(self._refs_dir, digest)
+        os.makedirs(directory, exist_ok=True)
+        
+        with open(os.path.join(directory, name), 'ab'):
+            pass
+    
+    
+    def _remove_ref(self, name, digest):
+        """Removes mark of given data used by given key."""
+        
+        _remove_file(os.path.join(self._refs_dir, digest, name))
+    
+    
+    def _remove_refs(self, digest):
+        """Removes all marks of given data."""
+        
+        directory = os.path.join(self._refs_dir, digest)
+        
+        for name in _list_dir(directory):
+            _remove_file(os.path.join(directory, name))
+        
+        try:
+            os.rmdir(directory)
+        except FileNotFoundError:
+            pass
+    
+    
+    def _add_object(self, digest, size, raw_size):
+        """Registers stored data as most recently used."""
+        
+        old = self._objects.pop(digest, None)
+        if old is not None:
+            self._size -= old[0]
+            self._raw_size -= old[1]
+        
+        self._objects[digest] = (size, raw_size)
+        self._size += size
+        self._raw_size += raw_size
+    
+    
+    def _touch(self, digest, path):
+        """Marks stored data as most recently used."""
+        
+        # register data stored by other process
+        if digest not in self._objects:
+            header = _read_header(path)
+            try:
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                return
+            if header is not None:
+                self._add_object(digest, size, header[2])
+            return
+        
+        self._objects.move_to_end(digest)
+        
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+    
+    
+    def _remove_object(self, digest):
+        """Removes stored data and all keys pointing to them."""
+        
+        # remove keys of all processes
+        for name in _list_dir(os.path.join(self._refs_dir, digest)):
+            if self._read_key(name) == digest:
+                _remove_file(os.path.join(self._keys_dir, name))
+        
+        self._remove_refs(digest)
+        _remove_file(os.path.join(self._objects_dir, digest))
+        
+        old = self._objects.pop(digest, None)
+        if old is not None:
+            self._size -= old[0]
+            self._raw_size -= old[1]
+    
+    
+    def _release(self, digest):
+        """Removes stored data no longer used by any key of any process."""
+        
+        if not _list_dir(os.path.join(self._refs_dir, digest)):
+            self._remove_object(digest)
+    
+    
+    def _evict(self):
+        """Removes least recently used data to fit size limit."""
+        
+        while self._max_size is not None and self._size > self._max_size and self._objects:
+            digest = next(iter(self._objects))
+            self._remove_object(digest)
+
+
+class MemoryCache(object):
+    """
+    Provides in-memory storage of binary data. If the total size exceeds the
+    limit, the least recently used data are evicted.
+    """
+    
+    
+    def __init__(self, max_size=None):
+        """
+        Initializes a new instance of rebrick.MemoryCache.
+        
+        Args:
+            max_size: int or None
+                Maximum total size of stored data in bytes. If set to None the
+                size is not limited.
+        """
+        
+        super().__init__()
+        
+        self._max_size = max_size
+        self._items = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+    
+    
+    def __contains__(self, key):
+        """Checks whether given key is stored."""
+        
+        return key in self._items
+    
+    
+    @property
+    def size(self):
+        """
+        Gets total size of stored data.
+        
+        Returns:
+            int
+                Size in bytes.
+        """
+        
+        return self._size
+    
+    
+    def get(self, key):
+        """
+        Gets data stored under given key.
+        
+        Args:
+            key: str
+                Data key (e.g. URL).
+        
+        Returns:
+            bytes or None
+                Stored data.
+        """
+        
+        with self._lock:
+            
+            data = self._items.get(key, None)
+            if data is not None:
+                self._items.move_to_end(key)
+            
+            return data
+    
+    
+    def set(self, key, data):
+        """
+        Stores data under given key.
+        
+        Args:
+            key: str
+                Data key (e.g. URL).
+            
+            data: bytes
+                Data to store.
+        """
+        
+        with self._lock:
+            
+            # store data
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            
+            self._items[key] = data
+            self._size += len(data)
+            
+            # remove old data
+            while self._max_size is not None and self._size > self._max_size and self._items:
+                key, old = self._items.popitem(last=False)
+                self._size -= len(old)
+    
+    
+    def delete(self, key):
+        """
+        Removes given key.
+        
+        Args:
+            key: str
+                Data key (e.g. URL).
+        """
+        
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+    
+    
+    def clear(self):
+        """Removes all stored data."""
+        
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+
+class ResponseCache(object):
+    """
+    Provides caching of server responses with expiration. Responses older
+    than the TTL are considered stale but they are still served while being
+    refreshed in background or while the upstream is unavailable, until the
+    stale TTL elapses. Responses are stored in given storage, so they can be
+    kept in memory, on disk or shared by several processes.
+    """
+    
+    
+    def __init__(self, storage=None, ttl=3600, stale_ttl=86400):
+        """
+        Initializes a new instance of rebrick.ResponseCache.
+        
+        Args:
+            storage: rebrick.MemoryCache, rebrick.DiskCache or None
+                Storage of the data. If set to None, new rebrick.MemoryCache
+                is used.
+            
+            ttl: float
+                Time in seconds for which the responses are fresh.
+            
+            stale_ttl: float
+                Additional time in seconds for which the stale responses can
+                be served.
+        """
+        
+        super().__init__()
+        
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        
+        self._storage = storage if storage is not None else MemoryCache()
+        
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+    
+    
+    def get(self, key):
+        """
+        Gets cached response data.
+        
+        Args:
+            key: str
+                Request key.
+        
+        Returns:
+            (bytes, float) or None
+                Response data and its age in seconds.
+        """
+        
+        # get data
+        data = self._storage.get(key)
+        if data is None or len(data) < _TIME_SIZE:
+            return None
+        
+        # check age
+        age = time.time() - _TIME_STRUCT.unpack_from(data)[0]
+        if age > self.ttl + self.stale_ttl:
+            self._storage.delete(key)
+            return None
+        
+        return data[_TIME_SIZE:], age
+    
+    
+    def set(self, key, data):
+        """
+        Stores response data.
+        
+        Args:
+            key: str
+                Request key.
+            
+            data: bytes
+                Response data.
+        """
+        
+        self._storage.set(key, _TIME_STRUCT.pack(time.time()) + data)
+    
+    
+    def delete(self, key):
+        """
+        Removes cached response.
+        
+        Args:
+            key: str
+                Request key.
+        """
+        
+        self._storage.delete(key)
+    
+    
+    def is_fresh(self, age):
+        """Checks whether response of given age is fresh."""
+        
+        return age <= self.ttl
+    
+    
+    @contextlib.contextmanager
+    def lock(self, key, timeout=30.):
+        """
+        Acquires lock for given key so that missing response is fetched only
+        once. If the storage provides distributed lock (e.g.
+        rebrick.RedisCache), it is used across all clients, otherwise the lock
+        is local to current process.
+        
+        Args:
+            key: str
+                Request key.
+            
+            timeout: float
+                Maximum time in seconds to hold or wait for the lock.
+        """
+        
+        # use storage lock
+        if hasattr(self._storage, 'lock'):
+            with self._storage.lock(key, timeout):
+                yield
+            return
+        
+        # get local lock
+        with self._locks_lock:
+            item = self._locks.get(key, None)
+            if item is None:
+                item = [threading.Lock(), 0]
+                self._locks[key] = item
+            item[1] += 1
+        
+        # run context
+        try:
+            acquired = item[0].acquire(timeout=timeout)
+            try:
+                yield
+            finally:
+                if acquired:
+                    item[0].release()
+        
+        # remove unused lock
+        finally:
+            with self._locks_lock:
+                item[1] -= 1
+                if not item[1]:
+                    del self._locks[key]
+
+
+class NegativeCache(object):
+    """
+    Remembers resources known to be missing (e.g. 404 responses) for limited
+    time, so that repeated lookups can be answered without any request.
+    """
+    
+    
+    def __init__(self, ttl=600, max_size=100000):
+        """
+        Initializes a new instance of rebrick.NegativeCache.
+        
+        Args:
+            ttl: float
+                Time in seconds for which the resource is considered missing.
+            
+            max_size: int
+                Maximum number of remembered keys.
+        """
+        
+        super().__init__()
+        
+        self.ttl = ttl
+        
+        self._max_size = max_size
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+    
+    
+    def __contains__(self, key):
+        """Checks whether given key is known to be missing."""
+        
+        with self._lock:
+            
+            expires = self._items.get(key, None)
+            if expires is None:
+                return False
+            
+            if expires < time.monotonic():
+                del self._items[key]
+                return False
+            
+            return True
+    
+    
+    def __len__(self):
+        """Gets number of remembered keys."""
+        
+        return len(self._items)
+    
+    
+    def check(self, key, url=None):
+        """
+        Checks whether given key is known to be missing.
+        
+        Args:
+            key: str
+                Resource key (e.g. URL).
+            
+            url: str or None
+                Request URL to be reported by the error. If set to None, the
+                key is used.
+        
+        Raises:
+            urllib.error.HTTPError
+                404 error if the key is known to be missing.
+        """
+        
+        if key in self:
+            raise urllib.error.HTTPError(url or key, 404, "Not Found (cached)", None, io.BytesIO())
+    
+    
+    def add(self, key):
+        """
+        Marks given key as missing.
+        
+        Args:
+            key: str
+                Resource key (e.g. URL).
+        """
+        
+        with self._lock:
+            
+            self._items.pop(key, None)
+            self._items[key] = time.monotonic() + self.ttl
+            
+            # remove oldest
+            while len(self._items) > self._max_size:
+                self._items.popitem(last=False)
+    
+    
+    def delete(self, key):
+        """
+        Removes given key.
+        
+        Args:
+            key: str
+                Resource key (e.g. URL).
+        """
+        
+        with self._lock:
+            self._items.pop(key, None)
+    
+    
+    def clear(self):
+        """Removes all keys."""
+        
+        with self._lock:
+            self._items.clear()
+
+
+def _read_header(path):
+    """Gets compression method, dictionary ID and raw size of stored data."""
+    
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(_OBJECT_SIZE)
+            size = os.fstat(f.fileno()).st_size
+    except FileNotFoundError:
+        return None
+    
+    if len(header) == _OBJECT_SIZE and header[:len(_OBJECT_MAGIC)] == _OBJECT_MAGIC:
+        return _OBJECT_STRUCT.unpack(header)[1:]
+    
+    return _METHOD_RAW, 0, size
+
+
+def _write_file(path, data):
+    """Writes file atomically."""
+    
+    temp = "%s.%s.%s.tmp" % (path, os.getpid(), threading.get_ident())
+    
+    with open(temp, 'wb') as f:
+        f.write(data)
+    
+    os.replace(temp, path)
+
+
+def _list_dir(path):
+    """Gets names of files in given directory or empty list if missing."""
+    
+    try:
+        return os.listdir(path)
+    except FileNotFoundError:
+        return []
+
+
+def _remove_file(path):
+    """Removes file if exists."""
+    
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -16,3 +16,15 @@ RB_SET_IMG_URL = "https://m.rebrickable.com/media/sets/{0}.jpg"
 
 # define minimum delay between requests in seconds
 REQUEST_DELAY = 1.1
+
+# define default timeout of connection and reading in seconds (None to wait forever)
+REQUEST_TIMEOUT = 60
+
+# define custom JSON decoder taking bytes (uses orjson, ujson or json if None)
+JSON_DECODER = None
+
+# define path of reference data file with colors, categories and themes (None to always request)
+REFERENCE_PATH = None
+
+# define age of reference data in seconds after which the file is refreshed in background (None to never refresh)
+REFERENCE_MAX_AGE = 7 * 24 * 3600
@@ -0,0 +1,214 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import csv
+import gzip
+
+
+class ElementIndex(object):
+    """
+    Provides in-memory bidirectional mapping between LEGO element IDs and
+    (part, color) combinations so that element IDs can be resolved in bulk
+    without any requests. The index can be filled from retrieved elements,
+    from raw part colors data or from the Rebrickable elements download and it
+    can be saved into a compact gzipped file.
+    """
+    
+    
+    def __init__(self):
+        """Initializes a new instance of rebrick.ElementIndex."""
+        
+        super().__init__()
+        
+        self._elements = {}
+        self._combinations = {}
+    
+    
+    def __contains__(self, element_id):
+        """Checks whether given element ID is known."""
+        
+        return str(element_id) in self._elements
+    
+    
+    def __len__(self):
+        """Gets number of known elements."""
+        
+        return len(self._elements)
+    
+    
+    def add(self, element_id, part_id, color_id, design_id=None):
+        """
+        Adds single element.
+        
+        Args:
+            element_id: str or int
+                LEGO element ID.
+            
+            part_id: str or int
+                Rebrickable part ID.
+            
+            color_id: str or int
+                Rebrickable color ID.
+            
+            design_id: str, int or None
+                LEGO design ID.
+        """
+        
+        element_id = str(element_id)
+        key = (str(part_id), str(color_id))
+        design_id = str(design_id) if design_id is not None else None
+        
+        # remove previous mapping
+        previous = self._elements.get(element_id, None)
+        if previous is not None and previous[:2] != key:
+            self._combinations[previous[:2]].remove(element_id)
+        
+        # keep known design ID
+        elif previous is not None and design_id is None:
+            design_id = previous[2]
+        
+        # add mapping
+        self._elements[element_id] = key + (design_id,)
+        
+        ids = self._combinations.setdefault(key, [])
+        if element_id not in ids:
+            ids.append(element_id)
+    
+    
+    def add_elements(self, elements):
+        """
+        Adds elements with known element ID.
+        
+        Args:
+            elements: (rebrick.Element,)
+                Elements, e.g. retrieved by
+                rebrick.Rebrick.get_set_elements().
+        """
+        
+        for element in elements:
+            if element.element_id:
+                self.add(element.element_id, element.part.part_id, element.color.color_id, element.design_id)
+    
+    
+    def add_part_colors(self, part_id, data):
+        """
+        Adds elements from raw part colors data.
+        
+        Args:
+            part_id: str or int
+                Rebrickable part ID.
+            
+            data: (dict,)
+                JSON results retrieved by rebrick.lego.get_part_colors().
+        """
+        
+        for item in data:
+            for element_id in item.get('elements', ()):
+                self.add(element_id, part_id, item['color_id'])
+    
+    
+    def load_csv(self, path):
+        """
+        Adds elements from the Rebrickable 'elements.csv' download. Gzipped
+        files are supported as well.
+        
+        Args:
+            path: str
+                Path to the CSV file.
+        """
+        
+        opener = gzip.open if path.endswith('.gz') else open
+        
+        with opener(path, 'rt', newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                self.add(row['element_id'], row['part_num'], row['color_id'], row.get('design_id', None) or None)
+    
+    
+    def load(self, path):
+        """
+        Adds elements from file previously created by
+        rebrick.ElementIndex.save().
+        
+        Args:
+            path: str
+                Path to the file.
+        """
+        
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                element_id, part_id, color_id, design_id = line.rstrip('\n').split('\t')
+                self.add(element_id, part_id, color_id, design_id or None)
+    
+    
+    def save(self, path):
+        """
+        Saves all elements into a gzipped tab-separated file.
+        
+        Args:
+            path: str
+                Path to the file.
+        """
+        
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            for element_id, (part_id, color_id, design_id) in self._elements.items():
+                f.write("%s\t%s\t%s\t%s\n" % (element_id, part_id, color_id, design_id or ""))
+    
+    
+    def get_element(self, element_id):
+        """
+        Gets part, color and design ID of given element.
+        
+        Args:
+            element_id: str or int
+                LEGO element ID.
+        
+        Returns:
+            (str, str, str or None) or None
+                Part ID, color ID and design ID.
+        """
+        
+        return self._elements.get(str(element_id), None)
+    
+    
+    def get_elements(self, element_ids):
+        """
+        Gets part, color and design ID for each of given elements.
+        
+        Args:
+            element_ids: (str,) or (int,)
+                LEGO element IDs.
+        
+        Returns:
+            {str: (str, str, str or None)}
+                Part ID, color ID and design ID by element ID. Unknown
+                elements are not included.
+        """
+        
+        lookup = self._elements
+        results = {}
+        
+        for element_id in element_ids:
+            element_id = str(element_id)
+            if element_id in lookup:
+                results[element_id] = lookup[element_id]
+        
+        return results
+    
+    
+    def get_element_ids(self, part_id, color_id):
+        """
+        Gets element IDs corresponding to given part and color.
+        
+        Args:
+            part_id: str or int
+                Rebrickable part ID.
+            
+            color_id: str or int
+                Rebrickable color ID.
+        
+        Returns:
+            (str,)
+                Element IDs.
+        """
+        
+        return tuple(self._combinations.get((str(part_id), str(color_id)), ()))
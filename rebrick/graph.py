@@ -0,0 +1,260 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import csv
+
+# define relation types
+REL_PRINT = 'print'
+REL_MOLD = 'mold'
+REL_ALTERNATE = 'alternate'
+
+RELATIONS = (REL_PRINT, REL_MOLD, REL_ALTERNATE)
+
+# define relation codes used by Rebrickable downloads
+_REL_CODES = {
+    'P': REL_PRINT,
+    'M': REL_MOLD,
+    'A': REL_ALTERNATE}
+
+
+class PartGraph(object):
+    """
+    Provides fast substitute lookups between parts connected by print, mold
+    and alternate relations. Equivalence classes are precomputed for each
+    relation type (and any requested combination of them) so that the lookups
+    themselves do not require any further requests.
+    """
+    
+    
+    def __init__(self, parts=()):
+        """
+        Initializes a new instance of rebrick.PartGraph.
+        
+        Args:
+            parts: (rebrick.Part,)
+                Parts to be added into the graph.
+        """
+        
+        super().__init__()
+        
+        self._edges = {rel: [] for rel in RELATIONS}
+        self._nodes = set()
+        self._classes = {}
+        
+        # add parts
+        for part in parts:
+            self.add_part(part)
+    
+    
+    def __contains__(self, part_id):
+        """Checks whether given part ID is known to the graph."""
+        
+        return str(part_id) in self._nodes
+    
+    
+    def __len__(self):
+        """Gets number of known parts."""
+        
+        return len(self._nodes)
+    
+    
+    def add_part(self, part):
+        """
+        Adds relations of given part into the graph.
+        
+        Args:
+            part: rebrick.Part
+                Part definition retrieved from Rebrickable.
+        """
+        
+        part_id = part.part_id
+        self._nodes.add(str(part_id))
+        
+        # add print parent
+        if part.print_of:
+            self.add_relation(part_id, part.print_of, REL_PRINT)
+        
+        # add related parts
+        for other_id in part.prints or ():
+            self.add_relation(part_id, other_id, REL_PRINT)
+        
+        for other_id in part.molds or ():
+            self.add_relation(part_id, other_id, REL_MOLD)
+        
+        for other_id in part.alternates or ():
+            self.add_relation(part_id, other_id, REL_ALTERNATE)
+    
+    
+    def add_relation(self, part_id, other_id, relation):
+        """
+        Adds single relation between two parts.
+        
+        Args:
+            part_id: str or int
+                Rebrickable part ID.
+            
+            other_id: str or int
+                Rebrickable ID of related part.
+            
+            relation: str
+                Relation type as rebrick.REL_PRINT, rebrick.REL_MOLD or
+                rebrick.REL_ALTERNATE.
+        """
+        
+        # check relation
+        if relation not in self._edges:
+            raise ValueError("Unknown relation type! --> %s" % relation)
+        
+        part_id = str(part_id)
+        other_id = str(other_id)
+        
+        # add edge
+        self._nodes.add(part_id)
+        self._nodes.add(other_id)
+        self._edges[relation].append((part_id, other_id))
+        
+        # reset precomputed classes
+        self._classes = {}
+    
+    
+    def load_relationships(self, path):
+        """
+        Adds relations from the Rebrickable 'part_relationships.csv' download.
+        Unsupported relation types are ignored.
+        
+        Args:
+            path: str
+                Path to the CSV file.
+        """
+        
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                relation = _REL_CODES.get(row['rel_type'], None)
+                if relation:
+                    self.add_relation(row['child_part_num'], row['parent_part_num'], relation)
+    
+    
+    def get_equivalents(self, part_id, relations=RELATIONS):
+        """
+        Gets all parts equivalent to given part by specified relations.
+        
+        Args:
+            part_id: str or int
+                Rebrickable part ID.
+            
+            relations: str or (str,)
+                Relation type or types to follow.
+        
+        Returns:
+            (str,)
+                IDs of equivalent parts excluding the given one.
+        """
+        
+        part_id = str(part_id)
+        members = self._get_classes(relations).get(part_id, ())
+        
+        return tuple(x for x in members if x != part_id)
+    
+    
+    def is_equivalent(self, part_id, other_id, relations=RELATIONS):
+        """
+        Checks whether two parts are equivalent by specified relations.
+        
+        Args:
+            part_id: str or int
+                Rebrickable part ID.
+            
+            other_id: str or int
+                Rebrickable ID of the other part.
+            
+            relations: str or (str,)
+                Relation type or types to follow.
+        
+        Returns:
+            bool
+                True if parts are equivalent, False otherwise.
+        """
+        
+        part_id = str(part_id)
+        other_id = str(other_id)
+        
+        if part_id == other_id:
+            return True
+        
+        classes = self._get_classes(relations)
+        members = classes.get(part_id, None)
+        
+        return members is not None and members is classes.get(other_id, None)
+    
+    
+    def get_classes(self, relations=RELATIONS):
+        """
+        Gets all equivalence classes by specified relations.
+        
+        Args:
+            relations: str or (str,)
+                Relation type or types to follow.
+        
+        Returns:
+            (frozenset,)
+                Equivalence classes containing at least two parts.
+        """
+        
+        unique = {id(x): x for x in self._get_classes(relations).values()}
+        return tuple(unique.values())
+    
+    
+    def _get_classes(self, relations):
+        """Gets precomputed equivalence classes for given relations."""
+        
+        # make key
+        if isinstance(relations, str):
+            relations = (relations,)
+        
+        key = frozenset(relations)
+        
+        # use precomputed
+        if key in self._classes:
+            return self._classes[key]
+        
+        # check relations
+        for relation in key:
+            if relation not in self._edges:
+                raise ValueError("Unknown relation type! --> %s" % relation)
+        
+        # init union-find
+        parents = {}
+        
+        def find(x):
+            root = x
+            while parents[root] != root:
+                root = parents[root]
+            while parents[x] != root:
+                parents[x], x = root, parents[x]
+            return root
+        
+        # join related parts
+        for relation in key:
+            for a, b in self._edges[relation]:
+                parents.setdefault(a, a)
+                parents.setdefault(b, b)
+                root_a = find(a)
+                root_b = find(b)
+                if root_a != root_b:
+                    parents[root_b] = root_a
+        
+        # collect members
+        groups = {}
+        for part_id in parents:
+            groups.setdefault(find(part_id), []).append(part_id)
+        
+        # share one class object by all members
+        classes = {}
+        for members in groups.values():
+            members = frozenset(members)
+            for part_id in members:
+                classes[part_id] = members
+        
+        self._classes[key] = classes
+        
+        return classes
@@ -0,0 +1,208 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import time
+import threading
+import urllib.error
+import concurrent.futures
+from . import metrics
+from .metrics import Histogram
+from .breaker import is_failure
+
+
+class HedgePolicy(object):
+    """
+    Defines hedging of idempotent GET requests. If the response does not
+    arrive within the delay given by the percentile of previous latencies of
+    the same endpoint, duplicate request is sent and whichever finishes first
+    is used. The duplicate is only sent if the API key has spare rate budget,
+    so that hedging never delays other requests. Set the policy by
+    rebrick.request.set_hedging() to enable it.
+    """
+    
+    
+    def __init__(self, percentile=95, delay=1., min_delay=0.05, min_samples=20, endpoints=None, workers=16):
+        """
+        Initializes a new instance of rebrick.HedgePolicy.
+        
+        Args:
+            percentile: float
+                Percentile of previous latencies used as hedging delay.
+            
+            delay: float
+                Delay in seconds used until enough latencies are known.
+            
+            min_delay: float
+                Minimum hedging delay in seconds.
+            
+            min_samples: int
+                Number of latencies required to use the percentile.
+            
+            endpoints: (str,) or None
+                Endpoint templates to hedge (e.g. 'lego/parts/{id}/'). If set
+                to None, all GET requests are hedged.
+            
+            workers: int
+                Maximum number of concurrent requests.
+        """
+        
+        super().__init__()
+        
+        self._percentile = percentile
+        self._delay = delay
+        self._min_delay = min_delay
+        self._min_samples = min_samples
+        self._endpoints = set(endpoints) if endpoints else None
+        
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rebrick-hedge")
+    
+    
+    def is_hedged(self, endpoint):
+        """
+        Checks whether given endpoint should be hedged.
+        
+        Args:
+            endpoint: str
+                Endpoint template.
+        
+        Returns:
+            bool
+                True if requests should be hedged.
+        """
+        
+        return self._endpoints is None or endpoint in self._endpoints
+    
+    
+    def get_delay(self, endpoint):
+        """
+        Gets current hedging delay for given endpoint.
+        
+        Args:
+            endpoint: str
+                Endpoint template.
+        
+        Returns:
+            float
+                Delay in seconds.
+        """
+        
+        with self._lock:
+            
+            hist = self._histograms.get(endpoint, None)
+            if hist is None or hist.count < self._min_samples:
+                return self._delay
+            
+            return max(self._min_delay, hist.percentile(self._percentile))
+    
+    
+    def send(self, send, endpoint, acquire):
+        """
+        Sends request and hedges it if necessary.
+        
+        Args:
+            send: callable
+                Function without arguments sending the request and returning
+                the response.
+            
+            endpoint: str
+                Endpoint template.
+            
+            acquire: callable
+                Function without arguments checking and consuming spare rate
+                budget for the duplicate request.
+        
+        Returns:
+            http.client.HTTPResponse
+                Server response.
+        """
+        
+        started = time.perf_counter()
+        
+        # send primary request
+        primary = self._executor.submit(send)
+        primary.add_done_callback(lambda f: self._add_result(endpoint, f, started))
+        
+        try:
+            return primary.result(timeout=self.get_delay(endpoint))
+        
+        except concurrent.futures.TimeoutError:
+            pass
+        
+        # wait for primary if no spare budget
+        if not acquire():
+            return primary.result()
+        
+        # send duplicate request
+        hedge = self._executor.submit(send)
+        pending = {primary, hedge}
+        finished = set()
+        
+        while True:
+            
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            finished |= done
+            
+            # use valid response or wait for the other
+            future = _select(finished, bool(pending))
+            if future is None:
+                continue
+            
+            # close unused responses
+            for other in finished | pending:
+                if other is not future:
+                    other.add_done_callback(_close_response)
+            
+            if metrics.is_enabled():
+                metrics.emit(metrics.EVT_HEDGE, endpoint=endpoint, won=future is hedge)
+            
+            return future.result()
+    
+    
+    def _add_result(self, endpoint, future, started):
+        """Adds latency of successful primary request."""
+        
+        if not future.cancelled() and future.exception() is None:
+            self._add(endpoint, time.perf_counter() - started)
+    
+    
+    def _add(self, endpoint, latency):
+        """Adds latency of given endpoint."""
+        
+        with self._lock:
+            
+            hist = self._histograms.get(endpoint, None)
+            if hist is None:
+                hist = Histogram()
+                self._histograms[endpoint] = hist
+            
+            hist.add(latency)
+
+
+def _select(done, waiting):
+    """Selects finished request to be used or None to wait for the other."""
+    
+    failed = []
+    
+    # use response or final error (e.g. 404)
+    for future in done:
+        error = future.exception()
+        if error is None or (isinstance(error, urllib.error.HTTPError) and not is_failure(error)):
+            return future
+        failed.append(future)
+    
+    # wait for the other if failed
+    if waiting or not failed:
+        return None
+    
+    # prefer server response
+    responses = [f for f in failed if isinstance(f.exception(), urllib.error.HTTPError)]
+    return (responses or failed)[0]
+
+
+def _close_response(future):
+    """Closes response of unused request."""
+    
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
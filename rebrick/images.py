@@ -0,0 +1,174 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from . import config
+from . import metrics
+from .request import get_transport, get_negative_cache
+
+
+class ImageFetcher(object):
+    """
+    Provides bulk download of element and set images. Images are downloaded
+    concurrently by a bounded pool of workers, alternative sources are tried
+    in order of priority and downloaded images can be stored in a cache so
+    that repeated requests are served without any download.
+    """
+    
+    
+    def __init__(self, cache=None, workers=8, timeout=30):
+        """
+        Initializes a new instance of rebrick.ImageFetcher.
+        
+        Args:
+            cache: rebrick.DiskCache or None
+                Cache to store downloaded images.
+            
+            workers: int
+                Maximum number of concurrent downloads.
+            
+            timeout: float or None
+                Timeout of a single download in seconds.
+        """
+        
+        super().__init__()
+        
+        self._cache = cache
+        self._workers = workers
+        self._timeout = timeout
+    
+    
+    def get_element_images(self, element_ids):
+        """
+        Gets images of specific elements. Rebrickable images are preferred
+        over LEGO images.
+        
+        Args:
+            element_ids: (str,) or (int,)
+                Rebrickable element IDs.
+        
+        Returns:
+            {str or int: bytes or None}
+                Image data by element ID.
+        """
+        
+        sources = {}
+        for element_id in element_ids:
+            sources[element_id] = (
+                config.RB_ELEMENT_IMG_URL.format(element_id),
+                config.LEGO_ELEMENT_IMG_URL.format(element_id))
+        
+        return self._fetch_all(sources)
+    
+    
+    def get_set_images(self, set_ids):
+        """
+        Gets images of specific sets.
+        
+        Args:
+            set_ids: (str,) or (int,)
+                Rebrickable set IDs.
+        
+        Returns:
+            {str or int: bytes or None}
+                Image data by set ID.
+        """
+        
+        sources = {}
+        for set_id in set_ids:
+            number = set_id if '-' in str(set_id) else "%s-1" % set_id
+            sources[set_id] = (config.RB_SET_IMG_URL.format(number),)
+        
+        return self._fetch_all(sources)
+    
+    
+    def get_files(self, urls):
+        """
+        Gets files from given URLs.
+        
+        Args:
+            urls: (str,)
+                URLs of the files to download.
+        
+        Returns:
+            {str: bytes or None}
+                File data by URL.
+        """
+        
+        return self._fetch_all({url: (url,) for url in urls})
+    
+    
+    def _fetch_all(self, sources):
+        """Downloads data for all items using the first available source."""
+        
+        results = {}
+        pending = {}
+        
+        # use cached data
+        for item, urls in sources.items():
+            
+            data = self._get_cached(urls)
+            if data is not None:
+                results[item] = data
+            
+            else:
+                pending.setdefault(urls, []).append(item)
+        
+        # download missing
+        if pending:
+            with ThreadPoolExecutor(max_workers=self._workers) as executor:
+                for urls, data in zip(pending, executor.map(self._fetch, pending)):
+                    for item in pending[urls]:
+                        results[item] = data
+        
+        return results
+    
+    
+    def _get_cached(self, urls):
+        """Gets data from the first cached URL."""
+        
+        if self._cache is None:
+            return None
+        
+        for url in urls:
+            data = self._cache.get(url)
+            if data is not None:
+                metrics.emit(metrics.EVT_CACHE, endpoint="images", hit=True)
+                return data
+        
+        metrics.emit(metrics.EVT_CACHE, endpoint="images", hit=False)
+        return None
+    
+    
+    def _fetch(self, urls):
+        """Downloads data from the first available URL."""
+        
+        missing = get_negative_cache()
+        
+        for url in urls:
+            
+            # skip known missing
+            if missing is not None and url in missing:
+                continue
+            
+            # download data
+            try:
+                with get_transport().open(url, headers={'User-Agent': 'Rebrick Tool'}, timeout=self._timeout) as response:
+                    data = response.read()
+            
+            except urllib.error.HTTPError as e:
+                if missing is not None and e.code == 404:
+                    missing.add(url)
+                continue
+            
+            except (urllib.error.URLError, OSError):
+                continue
+            
+            # store data
+            if self._cache is not None:
+                self._cache.set(url, data)
+            
+            return data
+        
+        return None
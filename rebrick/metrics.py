@@ -0,0 +1,405 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import math
+import time
+import threading
+import urllib.parse
+
+# define events
+EVT_REQUEST_START = 'request_start'
+EVT_REQUEST_END = 'request_end'
+EVT_RESPONSE_READ = 'response_read'
+EVT_DECODE = 'decode'
+EVT_RETRY = 'retry'
+EVT_HEDGE = 'hedge'
+EVT_CACHE = 'cache'
+
+# init registered hooks
+_hooks = []
+
+# define histogram resolution
+_HIST_BASE = 1.05
+_HIST_MIN = 1e-6
+
+
+def add_hook(callback):
+    """
+    Registers callback to be called for every instrumentation event. The
+    callback is called as callback(event, data), where event is one of the
+    rebrick.metrics.EVT_* constants and data is a dict always containing the
+    'endpoint' template (e.g. 'lego/sets/{id}/parts/'). Callbacks are called
+    synchronously within the requesting thread, so they should be fast.
+    
+    Args:
+        callback: callable
+            Callback to register.
+    """
+    
+    if callback not in _hooks:
+        _hooks.append(callback)
+
+
+def remove_hook(callback):
+    """
+    Removes previously registered callback.
+    
+    Args:
+        callback: callable
+            Callback to remove.
+    """
+    
+    if callback in _hooks:
+        _hooks.remove(callback)
+
+
+def is_enabled():
+    """
+    Checks whether any hook is registered.
+    
+    Returns:
+        bool
+            True if any hook is registered, False otherwise.
+    """
+    
+    return bool(_hooks)
+
+
+def emit(event, **data):
+    """
+    Sends event to all registered hooks.
+    
+    Args:
+        event: str
+            Event type as rebrick.metrics.EVT_* constant.
+        
+        data: dict
+            Event data.
+    """
+    
+    for callback in tuple(_hooks):
+        callback(event, data)
+
+
+def get_endpoint(url):
+    """
+    Gets endpoint template for given request URL by replacing IDs and user
+    token by placeholders.
+    
+    Args:
+        url: str
+            Request URL.
+    
+    Returns:
+        str
+            Endpoint template, e.g. 'lego/sets/{id}/parts/'.
+    """
+    
+    path = urllib.parse.urlsplit(url).path
+    
+    # remove base
+    idx = path.find("/api/v3/")
+    if idx != -1:
+        path = path[idx+8:]
+    
+    segments = [x for x in path.split("/") if x]
+    if not segments:
+        return path
+    
+    # get resources and IDs
+    if segments[0] == 'lego':
+        start = 1
+    
+    elif segments[0] == 'users' and len(segments) > 1 and segments[1] not in ('_token', 'badges'):
+        segments[1] = "{token}"
+        start = 2
+    
+    else:
+        start = 1
+    
+    for i in range(start + 1, len(segments), 2):
+        segments[i] = "{id}"
+    
+    return "/".join(segments) + "/"
+
+
+class MeteredResponse(object):
+    """
+    Wraps server response to measure received data. Event
+    rebrick.metrics.EVT_RESPONSE_READ is emitted once the whole body is read
+    or the response is closed.
+    """
+    
+    
+    def __init__(self, response, endpoint, started):
+        """
+        Initializes a new instance of rebrick.metrics.MeteredResponse.
+        
+        Args:
+            response: http.client.HTTPResponse
+                Server response.
+            
+            endpoint: str
+                Endpoint template.
+            
+            started: float
+                Time when the request was sent.
+        """
+        
+        super().__init__()
+        
+        self.endpoint = endpoint
+        
+        self._response = response
+        self._started = started
+        self._opened = time.perf_counter()
+        self._bytes = 0
+        self._done = False
+    
+    
+    def __getattr__(self, name):
+        """Gets attribute of the wrapped response."""
+        
+        return getattr(self._response, name)
+    
+    
+    def __enter__(self):
+        """Enters context."""
+        
+        return self
+    
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Closes response."""
+        
+        self.close()
+    
+    
+    def read(self, size=-1):
+        """Reads data from response."""
+        
+        data = self._response.read(size)
+        self._bytes += len(data)
+        
+        if size is None or size < 0 or not data:
+            self._finish()
+        
+        return data
+    
+    
+    def close(self):
+        """Closes response."""
+        
+        self._finish()
+        self._response.close()
+    
+    
+    def _finish(self):
+        """Emits read event."""
+        
+        if self._done:
+            return
+        
+        self._done = True
+        now = time.perf_counter()
+        
+        emit(EVT_RESPONSE_READ,
+            endpoint = self.endpoint,
+            bytes = self._bytes,
+            duration = now - self._opened,
+            total = now - self._started)
+
+
+class Histogram(object):
+    """
+    Provides memory-bounded histogram with logarithmic buckets, which allows
+    to estimate percentiles with ~5% relative error.
+    """
+    
+    
+    def __init__(self):
+        """Initializes a new instance of rebrick.metrics.Histogram."""
+        
+        super().__init__()
+        
+        self.count = 0
+        self.total = 0.
+        self.min = None
+        self.max = None
+        
+        self._buckets = {}
+    
+    
+    def add(self, value):
+        """
+        Adds value into histogram.
+        
+        Args:
+            value: float
+                Value to add.
+        """
+        
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        
+        idx = int(math.log(max(value, _HIST_MIN) / _HIST_MIN, _HIST_BASE))
+        self._buckets[idx] = self._buckets.get(idx, 0) + 1
+    
+    
+    def percentile(self, percent):
+        """
+        Estimates value at given percentile.
+        
+        Args:
+            percent: float
+                Percentile in range 0-100.
+        
+        Returns:
+            float or None
+                Estimated value.
+        """
+        
+        if not self.count:
+            return None
+        
+        rank = percent / 100. * self.count
+        seen = 0
+        
+        for idx in sorted(self._buckets):
+            seen += self._buckets[idx]
+            if seen >= rank:
+                value = _HIST_MIN * _HIST_BASE ** (idx + 0.5)
+                return min(max(value, self.min), self.max)
+        
+        return self.max
+    
+    
+    def summary(self):
+        """
+        Gets summary statistics.
+        
+        Returns:
+            dict
+                Count, mean, min, max and p50, p90, p99 percentiles.
+        """
+        
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99)}
+
+
+class MetricsCollector(object):
+    """
+    Provides in-memory aggregation of instrumentation events by endpoint.
+    Register the collector by rebrick.metrics.add_hook() and read aggregated
+    statistics by rebrick.metrics.MetricsCollector.summary().
+    """
+    
+    
+    def __init__(self):
+        """Initializes a new instance of rebrick.MetricsCollector."""
+        
+        super().__init__()
+        
+        self._lock = threading.Lock()
+        self._endpoints = {}
+    
+    
+    def __call__(self, event, data):
+        """Processes event."""
+        
+        with self._lock:
+            
+            stats = self._endpoints.get(data['endpoint'], None)
+            if stats is None:
+                stats = {'histograms': {}, 'counters': {}}
+                self._endpoints[data['endpoint']] = stats
+            
+            hists = stats['histograms']
+            counters = stats['counters']
+            
+            # request finished
+            if event == EVT_REQUEST_END:
+                self._add(hists, 'wait', data['wait'])
+                self._add(hists, 'latency', data['latency'])
+                self._count(counters, 'requests')
+                self._count(counters, "status_%s" % data['status'])
+            
+            # response read
+            elif event == EVT_RESPONSE_READ:
+                self._add(hists, 'read', data['duration'])
+                self._add(hists, 'total', data['total'])
+                self._add(hists, 'bytes', data['bytes'])
+            
+            # response decoded
+            elif event == EVT_DECODE:
+                self._add(hists, 'decode', data['duration'])
+            
+            # retry
+            elif event == EVT_RETRY:
+                self._count(counters, 'retries')
+            
+            # hedged request
+            elif event == EVT_HEDGE:
+                self._count(counters, 'hedges')
+                if data['won']:
+                    self._count(counters, 'hedges_won')
+            
+            # cache lookup
+            elif event == EVT_CACHE:
+                if data.get('negative', False):
+                    self._count(counters, 'negative_hits')
+                else:
+                    self._count(counters, 'cache_hits' if data['hit'] else 'cache_misses')
+    
+    
+    def summary(self):
+        """
+        Gets aggregated statistics for all endpoints. Durations are in seconds.
+        
+        Returns:
+            {str: dict}
+                Histogram summaries and counters by endpoint template.
+        """
+        
+        with self._lock:
+            
+            results = {}
+            for endpoint, stats in self._endpoints.items():
+                
+                results[endpoint] = dict(stats['counters'])
+                for name, hist in stats['histograms'].items():
+                    results[endpoint][name] = hist.summary()
+            
+            return results
+    
+    
+    def reset(self):
+        """Removes all collected data."""
+        
+        with self._lock:
+            self._endpoints = {}
+    
+    
+    def _add(self, hists, name, value):
+        """Adds value to histogram."""
+        
+        hist = hists.get(name, None)
+        if hist is None:
+            hist = Histogram()
+            hists[name] = hist
+        
+        hist.add(value)
+    
+    
+    def _count(self, counters, name):
+        """Increases counter."""
+        
+        counters[name] = counters.get(name, 0) + 1
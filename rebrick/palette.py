@@ -0,0 +1,252 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import math
+from array import array
+
+# try to import numpy
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# define D65 reference white
+_WHITE = (0.95047, 1.0, 1.08883)
+
+# define number of queries compared at once
+_CHUNK_SIZE = 4096
+
+
+class Palette(object):
+    """
+    Provides nearest color matching against a set of Rebrickable colors.
+    Palette colors are converted into CIE Lab space once and kept as a compact
+    array so that whole batches of query colors (e.g. image pixels) are matched
+    at once using the CIE76 color difference. If numpy is available the
+    matching is fully vectorized, otherwise pure Python is used.
+    """
+    
+    
+    def __init__(self, colors):
+        """
+        Initializes a new instance of rebrick.Palette.
+        
+        Args:
+            colors: (rebrick.Color,)
+                Colors to match against, typically retrieved by
+                rebrick.Rebrick.get_colors(). Colors without RGB value are
+                skipped.
+        """
+        
+        super().__init__()
+        
+        self._colors = tuple(c for c in colors if c.rgb)
+        
+        rgb = [_parse_rgb(c.rgb) for c in self._colors]
+        trans = [bool(c.is_trans) for c in self._colors]
+        
+        # init numpy arrays
+        if numpy is not None:
+            self._lab = _rgb_to_lab_numpy(numpy.array(rgb, dtype=numpy.float32).reshape(-1, 3))
+            self._trans = numpy.array(trans, dtype=bool)
+        
+        # init plain arrays
+        else:
+            self._lab = array('f', [v for c in rgb for v in _rgb_to_lab(c)])
+            self._trans = trans
+    
+    
+    def __len__(self):
+        """Gets number of palette colors."""
+        
+        return len(self._colors)
+    
+    
+    @property
+    def colors(self):
+        """
+        Gets palette colors.
+        
+        Returns:
+            (rebrick.Color,)
+                Palette colors.
+        """
+        
+        return self._colors
+    
+    
+    def match(self, values, is_trans=None):
+        """
+        Gets the closest palette color for each of given values.
+        
+        Args:
+            values: (str,), ((int, int, int),) or numpy.ndarray
+                Colors to match, specified as hex codes, RGB tuples or an
+                array of shape (..., 3) with channels in 0-255 range.
+            
+            is_trans: bool or None
+                If set to True or False only transparent or solid palette
+                colors are considered respectively. If set to None all colors
+                are used.
+        
+        Returns:
+            (rebrick.Color,)
+                Closest colors in the same order as given values.
+        """
+        
+        return tuple(self._colors[i] for i in self.match_indices(values, is_trans))
+    
+    
+    def match_indices(self, values, is_trans=None):
+        """
+        Gets the index of the closest palette color for each of given values.
+        
+        Args:
+            values: (str,), ((int, int, int),) or numpy.ndarray
+                Colors to match, specified as hex codes, RGB tuples or an
+                array of shape (..., 3) with channels in 0-255 range.
+            
+            is_trans: bool or None
+                If set to True or False only transparent or solid palette
+                colors are considered respectively. If set to None all colors
+                are used.
+        
+        Returns:
+            numpy.ndarray or (int,)
+                Indices into rebrick.Palette.colors. If numpy is available an
+                array of the same shape as given values (without the channels
+                axis) is returned.
+        """
+        
+        # get allowed colors
+        if is_trans is None:
+            allowed = list(range(len(self._colors)))
+        else:
+            allowed = [i for i, t in enumerate(self._trans) if bool(t) == is_trans]
+        
+        if not allowed:
+            raise ValueError("No palette colors available for given transparency!")
+        
+        # match by numpy
+        if numpy is not None:
+            return self._match_numpy(values, numpy.array(allowed))
+        
+        # match by Python
+        return self._match_python(values, allowed)
+    
+    
+    def _match_numpy(self, values, allowed):
+        """Matches given values using numpy."""
+        
+        # convert values
+        if isinstance(values, numpy.ndarray) and values.dtype.kind in 'iuf':
+            rgb = values
+        else:
+            rgb = numpy.array([_parse_rgb(v) for v in values], dtype=numpy.float32)
+        
+        # check empty
+        if rgb.size == 0:
+            return numpy.empty(rgb.shape[:-1] if rgb.ndim > 1 else (0,), dtype=numpy.intp)
+        
+        shape = rgb.shape[:-1]
+        rgb = rgb.reshape(-1, 3)
+        
+        # convert unique values only
+        rgb, inverse = numpy.unique(rgb, axis=0, return_inverse=True)
+        lab = _rgb_to_lab_numpy(rgb.astype(numpy.float32))
+        palette = self._lab[allowed]
+        
+        # find closest colors by chunks
+        closest = numpy.empty(len(lab), dtype=numpy.intp)
+        for i in range(0, len(lab), _CHUNK_SIZE):
+            chunk = lab[i:i+_CHUNK_SIZE]
+            dist = ((chunk[:, None, :] - palette[None, :, :]) ** 2).sum(axis=2)
+            closest[i:i+_CHUNK_SIZE] = dist.argmin(axis=1)
+        
+        return allowed[closest][inverse.reshape(-1)].reshape(shape)
+    
+    
+    def _match_python(self, values, allowed):
+        """Matches given values using pure Python."""
+        
+        palette = [(i, self._lab[3*i], self._lab[3*i+1], self._lab[3*i+2]) for i in allowed]
+        
+        indices = []
+        buff = {}
+        
+        for value in values:
+            
+            rgb = _parse_rgb(value)
+            
+            # use previous result
+            if rgb in buff:
+                indices.append(buff[rgb])
+                continue
+            
+            # find closest color
+            l, a, b = _rgb_to_lab(rgb)
+            dist, idx = min(((l-pl)**2 + (a-pa)**2 + (b-pb)**2, i) for i, pl, pa, pb in palette)
+            
+            buff[rgb] = idx
+            indices.append(idx)
+        
+        return tuple(indices)
+
+
+def _parse_rgb(value):
+    """Converts hex code or sequence into RGB tuple."""
+    
+    if isinstance(value, str):
+        value = value.lstrip('#')
+        return int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16)
+    
+    return tuple(int(v) for v in value[:3])
+
+
+def _rgb_to_lab(rgb):
+    """Converts single sRGB color into CIE Lab."""
+    
+    # linearize channels
+    lin = []
+    for v in rgb:
+        v = v / 255.
+        lin.append(((v + 0.055) / 1.055) ** 2.4 if v > 0.04045 else v / 12.92)
+    
+    r, g, b = lin
+    
+    # convert to XYZ
+    xyz = (
+        (0.4124564*r + 0.3575761*g + 0.1804375*b) / _WHITE[0],
+        (0.2126729*r + 0.7151522*g + 0.0721750*b) / _WHITE[1],
+        (0.0193339*r + 0.1191920*g + 0.9503041*b) / _WHITE[2])
+    
+    # convert to Lab
+    fx, fy, fz = (math.pow(t, 1/3.) if t > 0.008856 else 7.787*t + 16/116. for t in xyz)
+    
+    return 116*fy - 16, 500*(fx - fy), 200*(fy - fz)
+
+
+def _rgb_to_lab_numpy(rgb):
+    """Converts array of sRGB colors into CIE Lab."""
+    
+    # linearize channels
+    rgb = rgb / 255.
+    rgb = numpy.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    
+    # convert to XYZ
+    matrix = numpy.array((
+        (0.4124564, 0.3575761, 0.1804375),
+        (0.2126729, 0.7151522, 0.0721750),
+        (0.0193339, 0.1191920, 0.9503041)), dtype=numpy.float32)
+    
+    xyz = rgb @ matrix.T / numpy.array(_WHITE, dtype=numpy.float32)
+    
+    # convert to Lab
+    f = numpy.where(xyz > 0.008856, numpy.cbrt(xyz), 7.787*xyz + 16/116.)
+    
+    lab = numpy.empty_like(f)
+    lab[:, 0] = 116*f[:, 1] - 16
+    lab[:, 1] = 500*(f[:, 0] - f[:, 1])
+    lab[:, 2] = 200*(f[:, 1] - f[:, 2])
+    
+    return lab.astype(numpy.float32)
@@ -0,0 +1,459 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import os
+import json
+import time
+import random
+import argparse
+import threading
+import socketserver
+import urllib.parse
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from . import config
+from . import metrics
+from .cache import ResponseCache
+from .scheduler import Scheduler
+from .transport import UrllibTransport
+
+# define default upstream
+UPSTREAM_URL = "https://rebrickable.com/api/v3/"
+
+# define API prefix
+_API_PREFIX = "/api/v3/"
+
+
+class ProxyServer(object):
+    """
+    Provides local caching proxy of the Rebrickable v3 API shared by many
+    client processes. It exposes the same URL layout on localhost or Unix
+    socket, applies single rate limiter per API key for all clients, caches GET
+    responses and coalesces identical concurrent requests into one upstream
+    request. Throttled upstream requests are retried after the requested
+    delay, so that the clients never see 429 responses.
+    
+    Clients are pointed at the proxy by rebrick.config.API_LEGO_URL and
+    rebrick.config.API_USERS_URL (see configure()). For Unix socket use
+    rebrick.UnixSocketTransport as well.
+    """
+    
+    
+    def __init__(self, host="127.0.0.1", port=8079, socket_path=None, upstream=UPSTREAM_URL, api_key=None, cache=None, delay=None, retries=5, timeout=60):
+        """
+        Initializes a new instance of rebrick.proxy.ProxyServer.
+        
+        Args:
+            host: str
+                Host name to listen at.
+            
+            port: int
+                Port to listen at. If set to 0, any free port is used.
+            
+            socket_path: str or None
+                Path of Unix socket to listen at instead of TCP port.
+            
+            upstream: str
+                Base URL of the upstream API.
+            
+            api_key: str or None
+                API key used for requests without key.
+            
+            cache: rebrick.ResponseCache or None
+                Cache of GET responses. If set to None, new in-memory cache
+                is used.
+            
+            delay: float or None
+                Minimum delay between upstream requests with the same key in
+                seconds. If set to None, rebrick.config.REQUEST_DELAY is used.
+            
+            retries: int
+                Maximum number of retries of throttled requests.
+            
+            timeout: float
+                Timeout of upstream requests in seconds.
+        """
+        
+        super().__init__()
+        
+        self.requests = 0
+        self.hits = 0
+        self.coalesced = 0
+        self.upstream_requests = 0
+        
+        self._upstream = upstream.rstrip("/") + "/"
+        self._api_key = api_key
+        self._cache = cache if cache is not None else ResponseCache()
+        self._scheduler = Scheduler(delay=delay if delay is not None else config.REQUEST_DELAY)
+        self._transport = UrllibTransport()
+        self._retries = retries
+        self._timeout = timeout
+        
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._config = None
+        
+        # init server
+        if socket_path:
+            self._server = _UnixHTTPServer(socket_path, _ProxyHandler)
+        else:
+            self._server = ThreadingHTTPServer((host, port), _ProxyHandler)
+        
+        self._server.daemon_threads = True
+        self._server.proxy = self
+        self._socket_path = socket_path
+    
+    
+    def __enter__(self):
+        """Starts server and sets module URLs."""
+        
+        self.start()
+        self.configure()
+        
+        return self
+    
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Stops server and restores module URLs."""
+        
+        self.stop()
+    
+    
+    @property
+    def url(self):
+        """
+        Gets base URL of the API.
+        
+        Returns:
+            str
+                Base URL.
+        """
+        
+        if self._socket_path:
+            return "http://localhost" + _API_PREFIX
+        
+        host, port = self._server.server_address[:2]
+        return "http://%s:%s%s" % (host, port, _API_PREFIX)
+    
+    
+    def configure(self):
+        """
+        Sets rebrick.config API URLs to use this server and disables client
+        request delay, as the rate is limited by the proxy.
+        """
+        
+        self._config = (config.API_LEGO_URL, config.API_USERS_URL, config.REQUEST_DELAY)
+        
+        config.API_LEGO_URL = self.url + "lego/"
+        config.API_USERS_URL = self.url + "users/"
+        config.REQUEST_DELAY = 0
+    
+    
+    def start(self):
+        """Starts serving in background thread."""
+        
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+    
+    
+    def serve_forever(self):
+        """Starts serving in current thread."""
+        
+        self._server.serve_forever()
+    
+    
+    def stop(self):
+        """Stops serving and restores module configuration if changed."""
+        
+        self._server.shutdown()
+        self._server.server_close()
+        
+        if self._config:
+            config.API_LEGO_URL, config.API_USERS_URL, config.REQUEST_DELAY = self._config
+            self._config = None
+    
+    
+    def forward(self, path, data=None):
+        """
+        Gets response for given request path.
+        
+        Args:
+            path: str
+                Request path including query.
+            
+            data: bytes or None
+                POST data.
+        
+        Returns:
+            (int, str, bytes)
+                Status code, cache status and response body.
+        """
+        
+        with self._lock:
+            self.requests += 1
+        
+        # check path
+        if not path.startswith(_API_PREFIX):
+            return 404, "NONE", _make_error("Not found.")
+        
+        # get key
+        parts = urllib.parse.urlsplit(path[len(_API_PREFIX):])
+        parameters = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        key = dict(parameters).get('key', None)
+        
+        if not key and self._api_key:
+            key = self._api_key
+            parameters.append(('key', key))
+        
+        url = self._upstream + parts.path + "?" + urllib.parse.urlencode(parameters)
+        
+        # send POST directly
+        if data is not None:
+            return self._fetch(url, key, data)
+        
+        # use fresh cache
+        cache_key = parts.path + "?" + urllib.parse.urlencode(sorted(x for x in parameters if x[0] != 'key'))
+        cached = self._cache.get(cache_key)
+        
+        if cached is not None and self._cache.is_fresh(cached[1]):
+            with self._lock:
+                self.hits += 1
+            return 200, "HIT", cached[0]
+        
+        # join running request
+        with self._lock:
+            call = self._inflight.get(cache_key, None)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._inflight[cache_key] = call
+        
+        if not leader:
+            call.event.wait()
+            with self._lock:
+                self.coalesced += 1
+            return call.result[0], "COALESCED", call.result[2]
+        
+        # fetch data
+        try:
+            status, source, body = self._fetch(url, key, None)
+            
+            # use stale data if upstream unavailable
+            if status >= 500 and cached is not None:
+                status, source, body = 200, "STALE", cached[0]
+            
+            elif status == 200:
+                self._cache.set(cache_key, body)
+            
+            call.result = (status, source, body)
+        
+        except Exception as e:
+            call.result = (502, "ERROR", _make_error(str(e)))
+        
+        # release waiting
+        finally:
+            with self._lock:
+                del self._inflight[cache_key]
+            call.event.set()
+        
+        return call.result
+    
+    
+    def _fetch(self, url, key, data):
+        """Sends upstream request and retries if throttled."""
+        
+        attempt = 0
+        
+        while True:
+            
+            # wait for rate budget
+            self._scheduler.acquire(key)
+            
+            with self._lock:
+                self.upstream_requests += 1
+            
+            # send request
+            try:
+                with self._transport.open(url, data, headers={'User-Agent': 'Rebrick Proxy'}, timeout=self._timeout) as response:
+                    return response.status, "MISS", _strip_keys(response.read())
+            
+            except urllib.error.HTTPError as e:
+                
+                # retry throttled
+                if e.code == 429 and attempt < self._retries:
+                    attempt += 1
+                    delay = _get_retry_after(e, attempt)
+                    
+                    if metrics.is_enabled():
+                        metrics.emit(metrics.EVT_RETRY, endpoint=metrics.get_endpoint(url), status=e.code, attempt=attempt, delay=delay)
+                    
+                    time.sleep(delay)
+                    continue
+                
+                return e.code, "MISS", _strip_keys(e.read())
+            
+            except (urllib.error.URLError, OSError) as e:
+                return 502, "ERROR", _make_error(str(e))
+
+
+class _Call(object):
+    """Represents running upstream request."""
+    
+    
+    def __init__(self):
+        
+        super().__init__()
+        
+        self.event = threading.Event()
+        self.result = None
+
+
+class _UnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    """HTTP server listening at Unix socket."""
+    
+    
+    def server_bind(self):
+        """Removes stale socket file before binding."""
+        
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+        
+        super().server_bind()
+
+
+class _ProxyHandler(BaseHTTPRequestHandler):
+    """Handles proxy requests."""
+    
+    
+    def do_GET(self):
+        """Handles GET request."""
+        
+        self._handle(None)
+    
+    
+    def do_POST(self):
+        """Handles POST request."""
+        
+        size = int(self.headers.get('Content-Length', 0))
+        self._handle(self.rfile.read(size))
+    
+    
+    def address_string(self):
+        """Gets client address."""
+        
+        return self.client_address[0] if self.client_address else "unix"
+    
+    
+    def log_message(self, format, *args):
+        """Suppresses request logging."""
+        
+        pass
+    
+    
+    def _handle(self, data):
+        """Forwards request and sends response."""
+        
+        status, source, body = self.server.proxy.forward(self.path, data)
+        
+        self.send_response(status)
+        self.send_header('Content-Type', "application/json")
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Cache', source)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _get_retry_after(error, attempt):
+    """Gets delay before retrying throttled request."""
+    
+    try:
+        delay = float(error.headers.get('Retry-After'))
+    except (TypeError, ValueError, AttributeError):
+        delay = 0
+    
+    # spread retries of concurrent requests
+    delay = max(delay, 0.1 * 2 ** attempt) * random.uniform(1., 1.5)
+    
+    return min(60., delay)
+
+
+def _strip_keys(body):
+    """Removes API key from pagination URLs so that body can be shared."""
+    
+    if b"key=" not in body:
+        return body
+    
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return body
+    
+    if not isinstance(data, dict):
+        return body
+    
+    # remove key
+    for name in ('next', 'previous'):
+        url = data.get(name, None)
+        if isinstance(url, str):
+            parts = urllib.parse.urlsplit(url)
+            query = [x for x in urllib.parse.parse_qsl(parts.query, keep_blank_values=True) if x[0] != 'key']
+            data[name] = urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(query)))
+    
+    return json.dumps(data, separators=(',', ':')).encode('utf-8')
+
+
+def _make_error(message):
+    """Makes error response body."""
+    
+    return json.dumps({'detail': message}).encode('utf-8')
+
+
+def main():
+    """Runs proxy from command line."""
+    
+    parser = argparse.ArgumentParser(description="Local caching proxy of the Rebrickable v3 API.")
+    parser.add_argument('--host', default="127.0.0.1", help="host name to listen at")
+    parser.add_argument('--port', type=int, default=8079, help="port to listen at")
+    parser.add_argument('--socket', default=None, help="path of Unix socket to listen at instead of port")
+    parser.add_argument('--upstream', default=UPSTREAM_URL, help="base URL of the upstream API")
+    parser.add_argument('--api-key', default=None, help="API key for requests without key")
+    parser.add_argument('--delay', type=float, default=None, help="minimum delay between requests with the same key in seconds")
+    parser.add_argument('--ttl', type=float, default=3600, help="time for which responses are fresh in seconds")
+    parser.add_argument('--stale-ttl', type=float, default=86400, help="time for which stale responses are served if upstream fails")
+    parser.add_argument('--max-size', type=int, default=None, help="maximum size of cached data in bytes")
+    parser.add_argument('--cache-dir', default=None, help="directory of persistent cache")
+    args = parser.parse_args()
+    
+    # init cache
+    from .cache import DiskCache, MemoryCache
+    
+    if args.cache_dir:
+        storage = DiskCache(args.cache_dir, max_size=args.max_size)
+    else:
+        storage = MemoryCache(max_size=args.max_size)
+    
+    cache = ResponseCache(storage, ttl=args.ttl, stale_ttl=args.stale_ttl)
+    
+    # init server
+    server = ProxyServer(
+        host = args.host,
+        port = args.port,
+        socket_path = args.socket,
+        upstream = args.upstream,
+        api_key = args.api_key,
+        cache = cache,
+        delay = args.delay)
+    
+    print("Serving Rebrickable proxy at %s" % (args.socket or server.url))
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
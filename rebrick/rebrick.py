@@ -1,27 +1,75 @@
 # Created byMartin.cz
 # Copyright (c) Martin Strohalm. All rights reserved.
 
-import json
-import urllib.request
+import os
+import time
+import hashlib
+import threading
+import functools
 import urllib.error
 from . import config
 from . import api_lego as lego
 from . import api_users as users
+from .request import read_json, get_transport, get_negative_cache, tracking_stale
+from .reference import get_reference
+from .scheduler import scheduled, get_priority, get_timeout, check_cancelled
+from .stream import ResultsReader
 from .objects import *
+from .themes import ThemeTree
+
+
+def _scheduled(func):
+    """Runs method within scheduling context of the instance."""
+    
+    @functools.wraps(func)
+    def wrapper(self, *args, priority=None, timeout=None, cancel=None, **kwargs):
+        
+        # get deadline
+        timeout = timeout or self._timeout
+        deadline = time.monotonic() + timeout if timeout else None
+        
+        # run method
+        with scheduled(priority or get_priority() or self._priority, deadline, self._api_keys, cancel):
+            with tracking_stale() as stale:
+                try:
+                    return func(self, *args, **kwargs)
+                finally:
+                    self._local.stale = stale[0]
+    
+    return wrapper
 
 
 class Rebrick(object):
-    """Rebrick tool."""
+    """
+    Rebrick tool.
+    
+    All public methods accept optional keyword arguments to control the
+    requests sent by the call:
+        
+        priority: str or None
+            Priority as rebrick.PRIORITY_* constant.
+        
+        timeout: float or None
+            Maximum duration of the whole call in seconds including rate limit
+            waiting and all pages. TimeoutError is raised if exceeded.
+        
+        cancel: rebrick.CancelToken or None
+            Token to abort the call between requests or pages by raising
+            concurrent.futures.CancelledError.
+    """
     
     
-    def __init__(self, api_key=None, user_token=None, silent=False):
+    def __init__(self, api_key=None, user_token=None, silent=False, stream=False, priority=None, timeout=None):
         """
         Initializes a new instance of rebrick.Rebrick class.
         
         Args:
-            api_key: str or None
+            api_key: str, (str,) or None
                 Rebrickable API key. If set to None, module global API key is
-                used.
+                used. If multiple keys are given, each of them gets its own
+                rate budget and requests are sent by the key with the earliest
+                available budget. User-specific requests are always sent by
+                the same key.
             
             user_token:
                 Rebrickable user token. If set to None, you need to call login
@@ -31,15 +79,58 @@ class Rebrick(object):
                 If set to True, all HTTP errors will be silenced and methods
                 return None. If set to False, all HTTP errors are raised
                 normally.
+            
+            stream: bool
+                If set to True, items of large pages are parsed and created
+                incrementally as the data arrive instead of reading the whole
+                page first. This lowers memory use of large pages (see
+                rebrick.ResultsReader).
+            
+            priority: str or None
+                Default priority of requests as rebrick.PRIORITY_* constant.
+                If set to None, priority of current context or normal
+                priority is used.
+            
+            timeout: float or None
+                Default maximum duration of each method call in seconds. If
+                set to None, only rebrick.config.REQUEST_TIMEOUT applies to
+                individual requests.
         """
         
         super().__init__()
         
         self._api_key = api_key
+        self._api_keys = None
+        
+        # init key pool
+        if isinstance(api_key, (list, tuple)):
+            self._api_key = None
+            self._api_keys = tuple(api_key)
         self._user_token = user_token
         self._silent = silent
+        self._stream = stream
+        self._priority = priority
+        self._timeout = timeout
+        self._local = threading.local()
+        
+        self._theme_tree = None
     
     
+    @property
+    def stale(self):
+        """
+        Checks whether the last call by current thread returned data served
+        from stale cache (see rebrick.request.set_cache()).
+        
+        Returns:
+            bool
+                True if stale data were served.
+        """
+        
+        return getattr(self._local, 'stale', False)
+    
+    
+    @_scheduled
     def login(self, username, password):
         """
         Retrieves user login token, which is used to access user account
@@ -69,7 +160,7 @@ class Rebrick(object):
             return None
         
         # get response data
-        data = json.loads(response.read())
+        data = read_json(response)
         
         # set token
         self._user_token = data.get('user_token', None)
@@ -77,6 +168,7 @@ class Rebrick(object):
         return self._user_token
     
     
+    @_scheduled
     def get_categories(self):
         """
         Gets details for all available part categories.
@@ -86,6 +178,15 @@ class Rebrick(object):
                 Available part categories.
         """
         
+        # use reference data
+        reference = get_reference()
+        if reference is not None:
+            try:
+                return reference.get_categories(self._api_key)
+            except urllib.error.HTTPError as e:
+                self._on_error(e)
+                return None
+        
         categories = []
         page = None
         
@@ -102,7 +203,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # create categories
             for item in data['results']:
@@ -118,6 +219,7 @@ class Rebrick(object):
         return categories
     
     
+    @_scheduled
     def get_category(self, category_id):
         """
         Gets details about specific part category.
@@ -142,12 +244,13 @@ class Rebrick(object):
             return None
         
         # get response data
-        data = json.loads(response.read())
+        data = read_json(response)
         
         # create category
         return Category.create(data)
     
     
+    @_scheduled
     def get_colors(self):
         """
         Gets details for all available colors.
@@ -157,6 +260,15 @@ class Rebrick(object):
                 Available colors.
         """
         
+        # use reference data
+        reference = get_reference()
+        if reference is not None:
+            try:
+                return reference.get_colors(self._api_key)
+            except urllib.error.HTTPError as e:
+                self._on_error(e)
+                return None
+        
         colors = []
         page = None
         
@@ -173,7 +285,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # create colors
             for item in data['results']:
@@ -189,6 +301,7 @@ class Rebrick(object):
         return colors
     
     
+    @_scheduled
     def get_color(self, color_id):
         """
         Gets details about specific color.
@@ -213,12 +326,13 @@ class Rebrick(object):
             return None
         
         # get response data
-        data = json.loads(response.read())
+        data = read_json(response)
         
         # create color
         return Color.create(data)
     
     
+    @_scheduled
     def get_element(self, element_id):
         """
         Gets details about specific element.
@@ -243,12 +357,13 @@ class Rebrick(object):
             return None
         
         # get response data
-        data = json.loads(response.read())
+        data = read_json(response)
         
         # create element
         return Element.create(data)
     
     
+    @_scheduled
     def get_element_ids(self, part_id, color_id):
         """
         Gets element IDs corresponding to given part and color.
@@ -277,12 +392,13 @@ class Rebrick(object):
             return None
         
         # get response data
-        data = json.loads(response.read())
+        data = read_json(response)
         
         # get IDs
         return data.get('elements', [])
     
     
+    @_scheduled
     def get_element_image(self, element_id):
         """
         Gets image of specific element.
@@ -313,6 +429,7 @@ class Rebrick(object):
         return None
     
     
+    @_scheduled
     def get_minifigs(self, search=None, set_id=None, theme_id=None, min_pieces=None, max_pieces=None):
         """
         Gets a list of all minifigs with optional filters.
@@ -359,7 +476,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # create minifigs
             for item in data['results']:
@@ -375,6 +492,7 @@ class Rebrick(object):
         return minifigs
     
     
+    @_scheduled
     def get_minifig(self, minifig_id):
         """
         Gets details about specific minifig.
@@ -399,12 +517,13 @@ class Rebrick(object):
             return None
         
         # get response data
-        data = json.loads(response.read())
+        data = read_json(response)
         
         # create minifig
         return Minifig.create(data)
     
     
+    @_scheduled
     def get_minifig_elements(self, minifig_id, part_details=False):
         """
         Gets list of elements for a specific minifig.
@@ -439,7 +558,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # create elements
             for item in data['results']:
@@ -455,6 +574,7 @@ class Rebrick(object):
         return elements
     
     
+    @_scheduled
     def get_minifig_sets(self, minifig_id):
         """
         Gets details about available sets containing specific minifig.
@@ -485,7 +605,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # get sets
             for item in data['results']:
@@ -501,6 +621,7 @@ class Rebrick(object):
         return sets
     
     
+    @_scheduled
     def get_moc(self, moc_id):
         """
         Gets details about specific MOC.
@@ -525,12 +646,13 @@ class Rebrick(object):
             return None
         
         # get response data
-        data = json.loads(response.read())
+        data = read_json(response)
         
         # create set
         return Collection.create(data, COLL_MOC)
     
     
+    @_scheduled
     def get_moc_elements(self, moc_id, part_details=False):
         """
         Gets list of elements for a specific MOC.
@@ -565,7 +687,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # create elements
             for item in data['results']:
@@ -581,6 +703,7 @@ class Rebrick(object):
         return elements
     
     
+    @_scheduled
     def get_parts(self, search=None, part_id=None, part_ids=None, part_cat_id=None, color_id=None, bricklink_id=None, brickowl_id=None, lego_id=None, ldraw_id=None, part_details=False):
         """
         Gets details for all available parts with optional filters.
@@ -647,7 +770,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # create parts
             for item in data['results']:
@@ -663,6 +786,7 @@ class Rebrick(object):
         return parts
     
     
+    @_scheduled
     def get_part(self, part_id):
         """
         Gets details about specific part.
@@ -687,12 +811,13 @@ class Rebrick(object):
             return None
         
         # get response data
-        data = json.loads(response.read())
+        data = read_json(response)
         
         # create part
         return Part.create(data)
     
     
+    @_scheduled
     def get_part_colors(self, part_id):
         """
         Gets details about available colors for specific part.
@@ -726,7 +851,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # get colors
             for item in data['results']:
@@ -743,6 +868,7 @@ class Rebrick(object):
         return colors
     
     
+    @_scheduled
     def get_part_color_sets(self, part_id, color_id):
         """
         Gets details about available sets containing specific part/color
@@ -778,7 +904,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # get sets
             for item in data['results']:
@@ -794,6 +920,7 @@ class Rebrick(object):
         return sets
     
     
+    @_scheduled
     def get_sets(self, search=None, theme_id=None, min_year=None, max_year=None, min_pieces=None, max_pieces=None):
         """
         Gets a list of all sets with optional filters.
@@ -844,7 +971,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # create collections
             for item in data['results']:
@@ -860,6 +987,7 @@ class Rebrick(object):
         return sets
     
     
+    @_scheduled
     def get_set(self, set_id):
         """
         Gets details about specific set.
@@ -884,12 +1012,13 @@ class Rebrick(object):
             return None
         
         # get response data
-        data = json.loads(response.read())
+        data = read_json(response)
         
         # create set
         return Collection.create(data, COLL_SET)
     
     
+    @_scheduled
     def get_set_alternates(self, set_id):
         """
         Gets details about available alternate builds for specific set.
@@ -920,7 +1049,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # create elements
             for item in data['results']:
@@ -936,6 +1065,7 @@ class Rebrick(object):
         return sets
     
     
+    @_scheduled
     def get_set_elements(self, set_id, part_details=False, color_details=True, minifig_parts=False):
         """
         Gets list of elements for a specific set.
@@ -978,7 +1108,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # create elements
             for item in data['results']:
@@ -994,6 +1124,7 @@ class Rebrick(object):
         return elements
     
     
+    @_scheduled
     def get_set_minifigs(self, set_id):
         """
         Gets details about available minifigs for specific set.
@@ -1024,7 +1155,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # create minifigs
             for item in data['results']:
@@ -1040,6 +1171,7 @@ class Rebrick(object):
         return minifigs
     
     
+    @_scheduled
     def get_set_themes(self, set_id):
         """
         Gets hierarchy of themes for a specific set.
@@ -1053,8 +1185,6 @@ class Rebrick(object):
                 Set theme hierarchy.
         """
         
-        themes = []
-        
         # send request
         try:
             response = lego.get_set(
@@ -1066,37 +1196,34 @@ class Rebrick(object):
             return None
         
         # get response data
-        data = json.loads(response.read())
+        data = read_json(response)
         
         # get theme ID
         theme_id = data['theme_id']
+        if not theme_id:
+            return []
         
-        # retrieve theme hierarchy
-        while theme_id:
-            
-            # send request
-            try:
-                response = lego.get_theme(
-                    theme_id = theme_id,
-                    api_key = self._api_key)
-            
-            except urllib.error.HTTPError as e:
-                self._on_error(e)
+        # get theme tree (errors are already processed)
+        tree = self.get_theme_tree()
+        if tree is None:
+            return None
+        
+        # reload outdated tree
+        if theme_id not in tree:
+            tree = self.get_theme_tree(reload=True)
+            if tree is None:
                 return None
-            
-            # get response data
-            data = json.loads(response.read())
-            
-            # create theme
-            theme = Theme.create(data)
-            themes.insert(0, theme)
-            
-            # get parent ID
-            theme_id = theme.parent_id
         
-        return themes
+        # check theme
+        if theme_id not in tree:
+            self._on_error(KeyError("Unknown theme! --> %s" % theme_id))
+            return None
+        
+        # get theme hierarchy
+        return list(tree.get_ancestors(theme_id))
     
     
+    @_scheduled
     def get_set_image(self, set_id):
         """
         Gets image of specific set.
@@ -1113,7 +1240,7 @@ class Rebrick(object):
         if '-' not in str(set_id):
             set_id = "%s-1" % set_id
         
-        url = config.SET_IMG_URL.format(set_id)
+        url = config.RB_SET_IMG_URL.format(set_id)
         
         try:
             return self.get_file(url)
@@ -1121,6 +1248,7 @@ class Rebrick(object):
             return None
     
     
+    @_scheduled
     def get_themes(self):
         """
         Gets details for all available themes.
@@ -1130,6 +1258,15 @@ class Rebrick(object):
                 Available colors.
         """
         
+        # use reference data
+        reference = get_reference()
+        if reference is not None:
+            try:
+                return reference.get_themes(self._api_key)
+            except urllib.error.HTTPError as e:
+                self._on_error(e)
+                return None
+        
         themes = []
         page = None
         
@@ -1139,6 +1276,7 @@ class Rebrick(object):
             try:
                 response = lego.get_themes(
                     page = page,
+                    page_size = 1000,
                     api_key = self._api_key)
             
             except urllib.error.HTTPError as e:
@@ -1146,7 +1284,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # create themes
             for item in data['results']:
@@ -1162,6 +1300,7 @@ class Rebrick(object):
         return themes
     
     
+    @_scheduled
     def get_theme(self, theme_id):
         """
         Gets details about specific theme.
@@ -1186,12 +1325,41 @@ class Rebrick(object):
             return None
         
         # get response data
-        data = json.loads(response.read())
+        data = read_json(response)
         
         # create theme
         return Theme.create(data)
     
     
+    @_scheduled
+    def get_theme_tree(self, reload=False):
+        """
+        Gets hierarchy of all available themes. The tree is retrieved on first
+        call and kept for all subsequent calls so that theme hierarchy queries
+        do not require any further requests.
+        
+        Args:
+            reload: bool
+                If set to True, themes are retrieved again.
+        
+        Returns:
+            rebrick.ThemeTree or None
+                Theme tree.
+        """
+        
+        # retrieve themes
+        if self._theme_tree is None or reload:
+            
+            themes = self.get_themes()
+            if themes is None:
+                return None
+            
+            self._theme_tree = ThemeTree(themes)
+        
+        return self._theme_tree
+    
+    
+    @_scheduled
     def get_users_elements(self, part_id=None, part_cat_id=None, color_id=None, part_details=False):
         """
         Gets details for all user's elements in part lists and own sets with
@@ -1236,7 +1404,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # get results
             for item in data['results']:
@@ -1252,6 +1420,7 @@ class Rebrick(object):
         return elements
     
     
+    @_scheduled
     def get_users_lost_elements(self, part_details=False):
         """
         Gets details for all user's lost elements.
@@ -1283,7 +1452,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # get results
             for item in data['results']:
@@ -1299,6 +1468,7 @@ class Rebrick(object):
         return elements
     
     
+    @_scheduled
     def get_users_partlists(self):
         """
         Gets a list of all user's part lists.
@@ -1325,7 +1495,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # create partlists
             for item in data['results']:
@@ -1341,6 +1511,7 @@ class Rebrick(object):
         return partlists
     
     
+    @_scheduled
     def get_users_partlist(self, list_id):
         """
         Gets details about specific user's parts list.
@@ -1366,12 +1537,13 @@ class Rebrick(object):
             return None
         
         # get response data
-        data = json.loads(response.read())
+        data = read_json(response)
         
         # create partlist
         return Partlist.create(data)
     
     
+    @_scheduled
     def get_users_partlist_elements(self, list_id, part_details=False):
         """
         Gets list of elements for specific user's parts list.
@@ -1407,7 +1579,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # get results
             for item in data['results']:
@@ -1423,6 +1595,7 @@ class Rebrick(object):
         return elements
     
     
+    @_scheduled
     def get_users_sets(self, search=None, theme_id=None, min_year=None, max_year=None, min_pieces=None, max_pieces=None):
         """
         Gets details for all user's own sets with optional filters.
@@ -1474,7 +1647,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # create collections
             for item in data['results']:
@@ -1491,6 +1664,7 @@ class Rebrick(object):
         return sets
     
     
+    @_scheduled
     def get_users_setlists(self):
         """
         Gets a list of all user's set lists.
@@ -1517,7 +1691,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # create setlists
             for item in data['results']:
@@ -1533,6 +1707,7 @@ class Rebrick(object):
         return setlists
     
     
+    @_scheduled
     def get_users_setlist(self, list_id):
         """
         Gets details about specific user's set list.
@@ -1558,12 +1733,13 @@ class Rebrick(object):
             return None
         
         # get response data
-        data = json.loads(response.read())
+        data = read_json(response)
         
         # create setlist
         return Setlist.create(data)
     
     
+    @_scheduled
     def get_users_setlist_sets(self, list_id):
         """
         Gets a list of all user's sets within specific set list.
@@ -1595,7 +1771,7 @@ class Rebrick(object):
                 return None
             
             # get response data
-            data = json.loads(response.read())
+            data = self._read_page(response)
             
             # create collections
             for item in data['results']:
@@ -1612,6 +1788,7 @@ class Rebrick(object):
         return sets
     
     
+    @_scheduled
     def get_file(self, url):
         """
         Downloads a file from given URL.
@@ -1625,14 +1802,27 @@ class Rebrick(object):
                 File data.
         """
         
-        # make request
-        request = urllib.request.Request(url, headers={'User-Agent': 'Rebrick Tool'})
+        check_cancelled()
+        
+        # check known missing
+        missing = get_negative_cache()
+        if missing is not None:
+            try:
+                missing.check(url)
+            except urllib.error.HTTPError as e:
+                self._on_error(e)
+                return None
         
         # send request
         try:
-            response = urllib.request.urlopen(request)
+            response = get_transport().open(url, headers={'User-Agent': 'Rebrick Tool'}, timeout=get_timeout(config.REQUEST_TIMEOUT))
         
         except urllib.error.HTTPError as e:
+            
+            # remember missing file
+            if missing is not None and e.code == 404:
+                missing.add(url)
+            
             self._on_error(e)
             return None
         
@@ -1640,6 +1830,93 @@ class Rebrick(object):
         return response.read()
     
     
+    @_scheduled
+    def download_file(self, url, output, resume=False, checksum=None, chunk_size=65536):
+        """
+        Downloads a file from given URL directly into given file. The data are
+        copied by chunks so the memory use stays constant regardless of file
+        size.
+        
+        Args:
+            url: str
+                URL of the file to download.
+            
+            output: str or file
+                Path of the output file or binary file object to write to.
+            
+            resume: bool
+                If set to True and the output file already exists, only the
+                remaining part is requested and appended. Works for paths only.
+            
+            checksum: str or None
+                Name of the hash algorithm (e.g. 'sha256') to calculate the
+                checksum of the whole file on the fly.
+            
+            chunk_size: int
+                Size of chunks to copy in bytes.
+        
+        Returns:
+            str, bool or None
+                Hex digest of the file if checksum is requested, True if the
+                file was downloaded without checksum or None on error.
+        """
+        
+        digest = hashlib.new(checksum) if checksum else None
+        headers = {'User-Agent': 'Rebrick Tool'}
+        offset = 0
+        
+        # get current size
+        if resume and isinstance(output, str) and os.path.exists(output):
+            offset = os.path.getsize(output)
+            if offset:
+                headers['Range'] = "bytes=%d-" % offset
+        
+        # send request
+        try:
+            check_cancelled()
+            response = get_transport().open(url, headers=headers, timeout=get_timeout(config.REQUEST_TIMEOUT))
+        
+        except urllib.error.HTTPError as e:
+            
+            # already complete
+            if e.code == 416 and offset:
+                response = None
+            else:
+                self._on_error(e)
+                return None
+        
+        # check resumed download
+        if response is not None and response.status != 206:
+            offset = 0
+        
+        # hash existing data
+        if digest and offset:
+            with open(output, 'rb') as f:
+                for chunk in iter(lambda: f.read(chunk_size), b''):
+                    digest.update(chunk)
+        
+        # write data
+        if response is not None:
+            with response:
+                
+                if isinstance(output, str):
+                    with open(output, 'ab' if offset else 'wb') as f:
+                        _copy_stream(response, f, digest, chunk_size)
+                else:
+                    _copy_stream(response, output, digest, chunk_size)
+        
+        return digest.hexdigest() if digest else True
+    
+    
+    def _read_page(self, response):
+        """Reads paged response data."""
+        
+        if self._stream:
+            return ResultsReader(response)
+        
+        return read_json(response)
+    
+    
     def _on_error(self, error):
         """Process request error."""
         
@@ -1647,3 +1924,22 @@ class Rebrick(object):
             return
         
         raise error
+
+
+def _copy_stream(source, target, digest, chunk_size):
+    """Copies data by chunks while updating digest."""
+    
+    while True:
+        
+        # check cancellation and deadline
+        check_cancelled()
+        get_timeout()
+        
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        
+        if digest is not None:
+            digest.update(chunk)
+        
+        target.write(chunk)
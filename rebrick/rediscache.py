@@ -0,0 +1,472 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import os
+import time
+import zlib
+import socket
+import hashlib
+import threading
+import contextlib
+
+# define value flags
+_RAW = b"\x00"
+_ZLIB = b"\x01"
+
+# define lock release script
+_RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+
+class RedisCache(object):
+    """
+    Provides storage of binary data shared by several processes or hosts
+    using any server speaking the Redis protocol. Values are compressed and
+    expire after given time. The storage can be used wherever local caches are
+    accepted, e.g. by rebrick.ResponseCache. Additionally it provides a
+    distributed lock, which is used to fill missing responses only once across
+    all clients. Unavailable server is handled as cache miss and connecting
+    is not retried until given delay elapses.
+    """
+    
+    
+    def __init__(self, host="127.0.0.1", port=6379, db=0, password=None, prefix="rebrick:", ttl=None, compress_min=512, compress_level=6, timeout=5., pool_size=8, retry_delay=1.):
+        """
+        Initializes a new instance of rebrick.RedisCache.
+        
+        Args:
+            host: str
+                Server host name.
+            
+            port: int
+                Server port.
+            
+            db: int
+                Database index.
+            
+            password: str or None
+                Server password.
+            
+            prefix: str
+                Prefix of all stored keys.
+            
+            ttl: float or None
+                Time in seconds after which stored values expire. If set to
+                None, values do not expire.
+            
+            compress_min: int
+                Minimum size of values to be compressed in bytes.
+            
+            compress_level: int
+                Level of zlib compression.
+            
+            timeout: float
+                Connection and reading timeout in seconds.
+            
+            pool_size: int
+                Maximum number of idle connections kept.
+            
+            retry_delay: float
+                Time in seconds after failed connection during which the
+                server is considered unavailable without connecting again.
+        """
+        
+        super().__init__()
+        
+        self.ttl = ttl
+        
+        self._host = host
+        self._port = port
+        self._db = db
+        self._password = password
+        self._prefix = prefix
+        self._compress_min = compress_min
+        self._compress_level = compress_level
+        self._timeout = timeout
+        self._pool_size = pool_size
+        self._retry_delay = retry_delay
+        
+        self._pool = []
+        self._pool_lock = threading.Lock()
+        self._use_eval = True
+        self._retry_at = None
+    
+    
+    def __contains__(self, key):
+        """Checks whether given key is stored."""
+        
+        try:
+            return bool(self.execute("EXISTS", self._make_key(key)))
+        except OSError:
+            return False
+    
+    
+    def get(self, key):
+        """
+        Gets data stored under given key.
+        
+        Args:
+            key: str
+                Data key (e.g. URL).
+        
+        Returns:
+            bytes or None
+                Stored data.
+        """
+        
+        try:
+            value = self.execute("GET", self._make_key(key))
+        except OSError:
+            return None
+        
+        if not value:
+            return None
+        
+        # decompress
+        if value[:1] == _ZLIB:
+            return zlib.decompress(value[1:])
+        
+        return value[1:]
+    
+    
+    def set(self, key, data, ttl=None):
+        """
+        Stores data under given key.
+        
+        Args:
+            key: str
+                Data key (e.g. URL).
+            
+            data: bytes
+                Data to store.
+            
+            ttl: float or None
+                Time in seconds after which the data expire. If set to None,
+                default TTL is used.
+        """
+        
+        # compress
+        value = _RAW + data
+        if len(data) >= self._compress_min:
+            compressed = zlib.compress(data, self._compress_level)
+            if len(compressed) < len(data):
+                value = _ZLIB + compressed
+        
+        # store
+        args = ["SET", self._make_key(key), value]
+        
+        ttl = ttl or self.ttl
+        if ttl:
+            args += ["PX", int(ttl * 1000)]
+        
+        try:
+            self.execute(*args)
+        except OSError:
+            pass
+    
+    
+    def delete(self, key):
+        """
+        Removes given key.
+        
+        Args:
+            key: str
+                Data key (e.g. URL).
+        """
+        
+        try:
+            self.execute("DEL", self._make_key(key))
+        except OSError:
+            pass
+    
+    
+    def clear(self):
+        """Removes all keys with current prefix."""
+        
+        cursor = b"0"
+        while True:
+            
+            cursor, keys = self.execute("SCAN", cursor, "MATCH", self._prefix + "*", "COUNT", 1000)
+            if keys:
+                self.execute("DEL", *keys)
+            
+            if cursor in (b"0", 0):
+                break
+    
+    
+    @contextlib.contextmanager
+    def lock(self, key, timeout=30., wait=None):
+        """
+        Acquires distributed lock for given key. If the lock cannot be
+        acquired within waiting time, the context is entered anyway so that
+        stalled holder never blocks the caller forever.
+        
+        Args:
+            key: str
+                Lock key (e.g. URL).
+            
+            timeout: float
+                Time in seconds after which the lock expires.
+            
+            wait: float or None
+                Maximum time in seconds to wait for the lock. If set to None,
+                lock timeout is used.
+        
+        Yields:
+            bool
+                True if the lock was acquired, False otherwise.
+        """
+        
+        name = self._make_key(key) + ":lock"
+        token = os.urandom(16).hex()
+        deadline = time.monotonic() + (timeout if wait is None else wait)
+        delay = 0.01
+        acquired = False
+        
+        # acquire lock
+        while True:
+            
+            try:
+                acquired = self.execute("SET", name, token, "NX", "PX", int(timeout * 1000)) is not None
+            except OSError:
+                break
+            
+            if acquired or time.monotonic() >= deadline:
+                break
+            
+            time.sleep(delay)
+            delay = min(delay * 2, 0.2)
+        
+        # run context
+        try:
+            yield acquired
+        
+        # release lock
+        finally:
+            if acquired:
+                self._release(name, token)
+    
+    
+    def execute(self, *args):
+        """
+        Sends command to the server and gets its reply.
+        
+        Args:
+            args: (str, bytes or int,)
+                Command and its arguments.
+        
+        Returns:
+            any
+                Server reply.
+        
+        Raises:
+            OSError
+                If the server cannot be reached.
+            
+            ValueError
+                If the server replies by error.
+        """
+        
+        connection = self._get_connection()
+        
+        try:
+            reply = connection.execute(args)
+        
+        except ValueError:
+            self._put_connection(connection)
+            raise
+        
+        except OSError:
+            connection.close()
+            raise
+        
+        self._put_connection(connection)
+        
+        return reply
+    
+    
+    def _make_key(self, key):
+        """Gets stored key for given key."""
+        
+        return self._prefix + hashlib.sha1(key.encode('utf-8')).hexdigest()
+    
+    
+    def _release(self, name, token):
+        """Releases lock if still owned."""
+        
+        try:
+            
+            # release atomically
+            if self._use_eval:
+                try:
+                    self.execute("EVAL", _RELEASE_SCRIPT, 1, name, token)
+                    return
+                except ValueError:
+                    self._use_eval = False
+            
+            # release by comparison
+            if self.execute("GET", name) == token.encode('ascii'):
+                self.execute("DEL", name)
+        
+        except OSError:
+            pass
+    
+    
+    def _get_connection(self):
+        """Gets idle or new connection."""
+        
+        with self._pool_lock:
+            if self._pool:
+                return self._pool.pop()
+        
+        # skip connecting after recent failure
+        retry_at = self._retry_at
+        if retry_at is not None and time.monotonic() < retry_at:
+            raise ConnectionError("Server unavailable! --> %s:%s" % (self._host, self._port))
+        
+        connection = None
+        
+        try:
+            connection = _Connection(self._host, self._port, self._timeout)
+            if self._password:
+                connection.execute(("AUTH", self._password))
+            if self._db:
+                connection.execute(("SELECT", self._db))
+        
+        except Exception as e:
+            
+            # remember failure
+            if isinstance(e, OSError):
+                self._retry_at = time.monotonic() + self._retry_delay
+            
+            if connection is not None:
+                connection.close()
+            
+            raise
+        
+        self._retry_at = None
+        
+        return connection
+    
+    
+    def _put_connection(self, connection):
+        """Returns connection to the pool."""
+        
+        with self._pool_lock:
+            if len(self._pool) < self._pool_size:
+                self._pool.append(connection)
+                return
+        
+        connection.close()
+
+
+class _Connection(object):
+    """Represents single connection speaking the Redis protocol."""
+    
+    
+    def __init__(self, host, port, timeout):
+        
+        super().__init__()
+        
+        self._socket = socket.create_connection((host, port), timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._socket.makefile('rb')
+    
+    
+    def execute(self, args):
+        """Sends command and reads reply."""
+        
+        self._socket.sendall(encode_command(args))
+        return read_reply(self._file)
+    
+    
+    def close(self):
+        """Closes connection."""
+        
+        try:
+            self._file.close()
+            self._socket.close()
+        except OSError:
+            pass
+
+
+def encode_command(args):
+    """
+    Encodes command by the Redis protocol.
+    
+    Args:
+        args: (str, bytes or int,)
+            Command and its arguments.
+    
+    Returns:
+        bytes
+            Encoded command.
+    """
+    
+    buff = [b"*%d\r\n" % len(args)]
+    
+    for arg in args:
+        
+        if isinstance(arg, str):
+            arg = arg.encode('utf-8')
+        elif isinstance(arg, int):
+            arg = b"%d" % arg
+        
+        buff.append(b"$%d\r\n" % len(arg))
+        buff.append(arg)
+        buff.append(b"\r\n")
+    
+    return b"".join(buff)
+
+
+def read_reply(stream):
+    """
+    Reads single reply of the Redis protocol.
+    
+    Args:
+        stream: file
+            Binary stream to read from.
+    
+    Returns:
+        any
+            Decoded reply.
+    
+    Raises:
+        ValueError
+            If the reply is an error.
+    """
+    
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server!")
+    
+    kind = line[:1]
+    value = line[1:-2]
+    
+    # simple string
+    if kind == b"+":
+        return value
+    
+    # error
+    if kind == b"-":
+        raise ValueError("Redis error! --> %s" % value.decode('utf-8', 'replace'))
+    
+    # integer
+    if kind == b":":
+        return int(value)
+    
+    # bulk string
+    if kind == b"$":
+        size = int(value)
+        if size < 0:
+            return None
+        data = stream.read(size + 2)
+        return data[:-2]
+    
+    # array
+    if kind == b"*":
+        size = int(value)
+        if size < 0:
+            return None
+        return [read_reply(stream) for i in range(size)]
+    
+    raise ValueError("Unknown reply type! --> %s" % kind)
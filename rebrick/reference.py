@@ -0,0 +1,322 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import os
+import gzip
+import json
+import time
+import logging
+import threading
+import contextvars
+from . import config
+from . import api_lego as lego
+from .request import read_json
+from .scheduler import PRIORITY_BULK, scheduled, get_keys
+from .objects import Category, Color, Theme
+
+# define file version
+_VERSION = 1
+
+# define path of snapshot bundled with the package
+BUNDLED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "reference.json.gz")
+
+# init logger
+_log = logging.getLogger(__name__)
+
+# define shared instances
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+class ReferenceData(object):
+    """
+    Provides colors, part categories and themes from local snapshot file so
+    that these rarely changing lists are available without any request. The
+    file is loaded on first use. If missing, the snapshot bundled with the
+    package is used instead, or the file is created from the API if there is
+    none. Once the data get older than given age, the file is refreshed in
+    background while the current data are still served.
+    """
+    
+    
+    def __init__(self, path, max_age=None, retry_delay=600., seed=BUNDLED_PATH):
+        """
+        Initializes a new instance of rebrick.ReferenceData.
+        
+        Args:
+            path: str
+                Path to the snapshot file.
+            
+            max_age: float or None
+                Age in seconds after which the snapshot is refreshed. If set
+                to None, rebrick.config.REFERENCE_MAX_AGE is used.
+            
+            retry_delay: float
+                Minimum time in seconds between background refresh attempts,
+                so that failing refresh is not retried by every call.
+            
+            seed: str or None
+                Path to read-only snapshot used if the file does not exist.
+        """
+        
+        super().__init__()
+        
+        self._path = path
+        self._max_age = max_age
+        self._retry_delay = retry_delay
+        self._seed = seed
+        
+        self._data = None
+        self._lock = threading.Lock()
+        self._init_lock = threading.Lock()
+        self._thread = None
+        self._attempted = None
+    
+    
+    @property
+    def age(self):
+        """
+        Gets age of loaded snapshot.
+        
+        Returns:
+            float or None
+                Age in seconds or None if not loaded.
+        """
+        
+        data = self._data
+        if data is None:
+            return None
+        
+        return time.time() - data['created']
+    
+    
+    def get_categories(self, api_key=None):
+        """
+        Gets all part categories.
+        
+        Args:
+            api_key: str or None
+                API key used if the snapshot must be created.
+        
+        Returns:
+            (rebrick.Category,)
+                Available part categories.
+        """
+        
+        return [Category.create(x) for x in self._get('categories', api_key)]
+    
+    
+    def get_colors(self, api_key=None):
+        """
+        Gets all colors.
+        
+        Args:
+            api_key: str or None
+                API key used if the snapshot must be created.
+        
+        Returns:
+            (rebrick.Color,)
+                Available colors.
+        """
+        
+        return [Color.create(x) for x in self._get('colors', api_key)]
+    
+    
+    def get_themes(self, api_key=None):
+        """
+        Gets all themes.
+        
+        Args:
+            api_key: str or None
+                API key used if the snapshot must be created.
+        
+        Returns:
+            (rebrick.Theme,)
+                Available themes.
+        """
+        
+        return [Theme.create(x) for x in self._get('themes', api_key)]
+    
+    
+    def load(self):
+        """
+        Loads snapshot from file or from the seed snapshot if the file is
+        missing or invalid.
+        
+        Returns:
+            bool
+                True if loaded, False if no valid snapshot is available.
+        """
+        
+        for path in (self._path, self._seed):
+            
+            data = _read_snapshot(path) if path else None
+            if data is not None:
+                self._data = data
+                return True
+        
+        return False
+    
+    
+    def update(self, api_key=None):
+        """
+        Retrieves current data from the API and saves the snapshot.
+        
+        Args:
+            api_key: str or None
+                Rebrickable API key. If set to None, module global API key is
+                used.
+        
+        Raises:
+            urllib.error.HTTPError
+                If the data cannot be retrieved.
+        """
+        
+        data = {
+            'version': _VERSION,
+            'created': time.time(),
+            'colors': _get_results(lego.get_colors, api_key),
+            'categories': _get_results(lego.get_categories, api_key),
+            'themes': _get_results(lego.get_themes, api_key)}
+        
+        _write_snapshot(self._path, data)
+        
+        self._data = data
+    
+    
+    def _get(self, name, api_key):
+        """Gets raw items of given list."""
+        
+        # load or create snapshot
+        if self._data is None:
+            with self._init_lock:
+                if self._data is None and not self.load():
+                    self.update(api_key)
+        
+        # refresh old snapshot
+        max_age = self._max_age if self._max_age is not None else config.REFERENCE_MAX_AGE
+        if max_age is not None and self.age > max_age:
+            self._refresh(api_key)
+        
+        return self._data[name]
+    
+    
+    def _refresh(self, api_key):
+        """Starts background refresh if not running or attempted recently."""
+        
+        with self._lock:
+            
+            if self._thread is not None and self._thread.is_alive():
+                return
+            
+            # back off after previous attempt
+            now = time.monotonic()
+            if self._attempted is not None and now - self._attempted < self._retry_delay:
+                return
+            
+            self._attempted = now
+            keys = get_keys()
+            
+            def refresh():
+                with scheduled(PRIORITY_BULK, keys=keys):
+                    try:
+                        self.update(api_key)
+                    except Exception as e:
+                        _log.warning("Reference data refresh failed! --> %s", e)
+            
+            # run without caller's deadline and cancellation
+            context = contextvars.Context()
+            self._thread = threading.Thread(target=context.run, args=(refresh,), name="rebrick-reference", daemon=True)
+            self._thread.start()
+
+
+def get_reference():
+    """
+    Gets shared reference data of the rebrick.config.REFERENCE_PATH.
+    
+    Returns:
+        rebrick.ReferenceData or None
+            Reference data or None if the path is not set.
+    """
+    
+    path = config.REFERENCE_PATH
+    if not path:
+        return None
+    
+    with _instances_lock:
+        
+        reference = _instances.get(path, None)
+        if reference is None:
+            reference = ReferenceData(path)
+            _instances[path] = reference
+        
+        return reference
+
+
+def _write_snapshot(path, data):
+    """Writes snapshot file atomically."""
+    
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    
+    temp = "%s.%s.%s.tmp" % (path, os.getpid(), threading.get_ident())
+    
+    with gzip.open(temp, 'wt', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    
+    os.replace(temp, path)
+
+
+def _read_snapshot(path):
+    """Reads snapshot file or gets None if missing or invalid."""
+    
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+    
+    except (OSError, EOFError, ValueError):
+        return None
+    
+    if not isinstance(data, dict) or data.get('version', None) != _VERSION:
+        return None
+    
+    return data
+
+
+def _get_results(func, api_key):
+    """Retrieves all pages of given list."""
+    
+    results = []
+    page = None
+    
+    while True:
+        
+        data = read_json(func(page=page, page_size=1000, api_key=api_key))
+        results += data['results']
+        
+        if data['next'] is None:
+            break
+        
+        page = data['next']
+    
+    return results
+
+
+def main():
+    """Creates snapshot to be bundled with the package."""
+    
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Creates reference data snapshot from the Rebrickable API.")
+    parser.add_argument('--api-key', required=True, help="Rebrickable API key")
+    parser.add_argument('--output', default=BUNDLED_PATH, help="path of the snapshot file")
+    args = parser.parse_args()
+    
+    ReferenceData(args.output, seed=None).update(args.api_key)
+    
+    print("Reference data saved to %s" % args.output)
+
+
+if __name__ == '__main__':
+    main()
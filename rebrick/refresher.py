@@ -0,0 +1,230 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import threading
+import concurrent.futures
+from .request import get_cache, get_refresher, set_refresher, refresh_cached
+from .scheduler import PRIORITY_BULK, scheduled
+
+
+class Refresher(object):
+    """
+    Keeps popular cached responses fresh. Access of every response cached by
+    rebrick.request.set_cache() is tracked and the most frequently used ones
+    are refreshed in background shortly before their expiration. Refreshing
+    only uses idle rate budget, so it never delays regular requests.
+    """
+    
+    
+    def __init__(self, interval=5., lead=0.8, min_hits=2, half_life=3600., max_entries=10000, max_refresh=10):
+        """
+        Initializes a new instance of rebrick.Refresher.
+        
+        Args:
+            interval: float
+                Time between refresh rounds in seconds.
+            
+            lead: float
+                Fraction of cache TTL after which the response is refreshed.
+            
+            min_hits: float
+                Minimum (decayed) number of accesses to keep response fresh.
+            
+            half_life: float
+                Time in seconds after which the access count is halved.
+            
+            max_entries: int
+                Maximum number of tracked responses.
+            
+            max_refresh: int
+                Maximum number of responses refreshed per round.
+        """
+        
+        super().__init__()
+        
+        self._interval = interval
+        self._lead = lead
+        self._min_hits = min_hits
+        self._decay = 0.5 ** (interval / half_life)
+        self._max_entries = max_entries
+        self._max_refresh = max_refresh
+        
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    
+    def __enter__(self):
+        """Starts refreshing."""
+        
+        self.start()
+        return self
+    
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Stops refreshing."""
+        
+        self.stop()
+    
+    
+    def start(self):
+        """Starts tracking and background refreshing."""
+        
+        if self._thread is not None:
+            return
+        
+        set_refresher(self)
+        
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="rebrick-refresher", daemon=True)
+        self._thread.start()
+    
+    
+    def stop(self):
+        """Stops tracking and background refreshing."""
+        
+        if self._thread is None:
+            return
+        
+        if get_refresher() is self:
+            set_refresher(None)
+        
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+    
+    
+    def track(self, key, url, options, api_key):
+        """
+        Registers access of cached response.
+        
+        Args:
+            key: str
+                Cache key.
+            
+            url: str
+                Request URL.
+            
+            options: str
+                Encoded request parameters.
+            
+            api_key: str
+                API key used.
+        """
+        
+        with self._lock:
+            
+            entry = self._entries.get(key, None)
+            if entry is not None:
+                entry[0] += 1
+                return
+            
+            # prewarmed entries start as popular
+            hits = 1.
+            if getattr(self._local, 'prewarming', False):
+                hits = max(hits, self._min_hits)
+            
+            if len(self._entries) < self._max_entries:
+                self._entries[key] = [hits, url, options, api_key]
+    
+    
+    def refresh(self):
+        """
+        Refreshes popular responses close to expiration.
+        
+        Returns:
+            int
+                Number of refreshed responses.
+        """
+        
+        cache = get_cache()
+        if cache is None:
+            return 0
+        
+        # get popular entries
+        with self._lock:
+            
+            for key in list(self._entries):
+                entry = self._entries[key]
+                entry[0] *= self._decay
+                if entry[0] < 0.1:
+                    del self._entries[key]
+            
+            popular = [(e[0], k, e) for k, e in self._entries.items() if e[0] >= self._min_hits]
+        
+        popular.sort(key=lambda x: x[0], reverse=True)
+        
+        # refresh entries
+        count = 0
+        for hits, key, entry in popular:
+            
+            if count >= self._max_refresh:
+                break
+            
+            # check age
+            cached = cache.get(key)
+            if cached is not None and cached[1] < self._lead * cache.ttl:
+                continue
+            
+            # refresh by idle budget
+            try:
+                if not refresh_cached(key, entry[1], entry[2], entry[3]):
+                    break
+            except Exception:
+                continue
+            
+            count += 1
+        
+        return count
+    
+    
+    def prewarm(self, calls, workers=1):
+        """
+        Runs given calls with bulk priority to fill the cache, e.g. at
+        startup. Calls can be given as callables or tuples of callable and its
+        arguments, e.g. (rb.get_set_elements, "6608-1"). Responses loaded by
+        prewarming are considered popular until their access count decays.
+        Errors of individual calls are ignored.
+        
+        Args:
+            calls: (callable or tuple,)
+                Calls to run.
+            
+            workers: int
+                Number of concurrent calls.
+        
+        Returns:
+            int
+                Number of calls returning a result. Calls which raised an error
+                or returned None (e.g. failed calls of silent client) are not
+                counted.
+        """
+        
+        def run(call):
+            if not callable(call):
+                call, args = call[0], call[1:]
+            else:
+                args = ()
+            self._local.prewarming = True
+            try:
+                with scheduled(PRIORITY_BULK):
+                    return call(*args)
+            finally:
+                self._local.prewarming = False
+        
+        count = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(run, c) for c in calls]:
+                if future.exception() is None and future.result() is not None:
+                    count += 1
+        
+        return count
+    
+    
+    def _run(self):
+        """Runs refresh rounds."""
+        
+        while not self._stop.wait(self._interval):
+            self.refresh()
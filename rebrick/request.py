@@ -1,26 +1,63 @@
 # Created byMartin.cz
 # Copyright (c) Martin Strohalm. All rights reserved.
 
-import ssl
 import re
+import json
 import time
+import threading
+import contextlib
+import contextvars
 import urllib.parse
-import urllib.request
+import urllib.error
 from . import config
-
-# init last request time
-_last_request_time = 0
+from . import metrics
+from .transport import UrllibTransport, Response
+from .scheduler import Scheduler, PRIORITY_NORMAL, get_priority, get_deadline, get_keys, get_cancel, get_timeout, check_cancelled, scheduled
+from .breaker import CircuitOpenError, STATE_OPEN, get_group, is_failure
 
 # define page pattern
 _PAGE_PATTERN = re.compile("page=([0-9]+)")
 
-# handle SSL certificate
-_SSL_CONTEXT = ssl._create_unverified_context()
+# init default transport
+_transport = UrllibTransport()
+
+# init default scheduler
+_scheduler = Scheduler()
+
+# init hedging policy
+_hedging = None
+
+# init response caches and circuit breaker
+_cache = None
+_negative_cache = None
+_breaker = None
+
+# init background refreshes
+_refresher = None
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# init stale data tracking
+_stale = contextvars.ContextVar('rebrick_stale', default=None)
+
+# get fastest available JSON decoder
+try:
+    import orjson
+    _JSON_DECODER = orjson.loads
+except ImportError:
+    try:
+        import ujson
+        _JSON_DECODER = ujson.loads
+    except ImportError:
+        _JSON_DECODER = json.loads
 
 
 def request(url, parameters={}, post=False):
     """
-    Builds the final URL and opens handler.
+    Builds the final URL and opens handler. The request is dispatched by
+    current scheduler using the priority, deadline and cancellation token set
+    by rebrick.scheduled() context. Connection and reading are limited by
+    rebrick.config.REQUEST_TIMEOUT and by the deadline.
     
     Args:
         url: str
@@ -35,11 +72,26 @@ def request(url, parameters={}, post=False):
     Returns:
         http.client.HTTPResponse
             Server response.
+    
+    Raises:
+        TimeoutError
+            If the deadline is exceeded.
+        
+        concurrent.futures.CancelledError
+            If the request is cancelled.
     """
     
+    # check cancellation
+    check_cancelled()
+    
     # remove unset parameters
     parameters = {k: v for k, v in parameters.items() if v is not None}
     
+    # select key from pool
+    keys = get_keys()
+    if keys and not parameters.get('key', None):
+        parameters['key'] = _scheduler.select_key(keys, _get_sticky(url))
+    
     # set default API key
     parameters['key'] = assert_api_key(parameters.get('key', None))
     
@@ -50,24 +102,317 @@ def request(url, parameters={}, post=False):
     # prepare options
     options = urllib.parse.urlencode(parameters, doseq=True)
     
-    # assert time restrictions
-    global _last_request_time
-    while True:
-        delay = _last_request_time + config.REQUEST_DELAY - time.time()
-        if delay <= 0:
-            _last_request_time = time.time()
-            break
-        else:
-            time.sleep(delay)
+    # get endpoint
+    endpoint = None
+    if metrics.is_enabled():
+        endpoint = metrics.get_endpoint(url)
     
-    # send request
-    if post:
-        handle = urllib.request.urlopen(url, options.encode('utf8'), context=_SSL_CONTEXT)
-    else:
-        url = "%s?%s" % (url, options)
-        handle = urllib.request.urlopen(url, context=_SSL_CONTEXT)
+    # send without negative cache
+    if _negative_cache is None or post:
+        return _request_any(url, parameters, options, post, endpoint)
     
-    return handle
+    # check known missing
+    key = _get_cache_key(url, parameters)
+    if key in _negative_cache:
+        _emit_cache(endpoint, True, negative=True)
+        _negative_cache.check(key, url)
+    
+    # send request and remember missing
+    try:
+        return _request_any(url, parameters, options, post, endpoint)
+    
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            _negative_cache.add(key)
+        raise
+
+
+def get_transport():
+    """
+    Gets current transport used to send all requests.
+    
+    Returns:
+        rebrick.Transport
+            Current transport.
+    """
+    
+    return _transport
+
+
+def set_transport(transport):
+    """
+    Sets transport to be used to send all requests, e.g. to record or replay
+    server responses.
+    
+    Args:
+        transport: rebrick.Transport or None
+            Transport to use. If set to None, default urllib transport is used.
+    """
+    
+    global _transport
+    _transport = transport or UrllibTransport()
+
+
+def get_scheduler():
+    """
+    Gets current scheduler used to dispatch all requests.
+    
+    Returns:
+        rebrick.Scheduler
+            Current scheduler.
+    """
+    
+    return _scheduler
+
+
+def set_scheduler(scheduler):
+    """
+    Sets scheduler to be used to dispatch all requests, e.g. to change the
+    share of rate budget for individual priorities.
+    
+    Args:
+        scheduler: rebrick.Scheduler or None
+            Scheduler to use. If set to None, default scheduler is used.
+    """
+    
+    global _scheduler
+    _scheduler = scheduler or Scheduler()
+
+
+def get_hedging():
+    """
+    Gets current hedging policy of GET requests.
+    
+    Returns:
+        rebrick.HedgePolicy or None
+            Current policy.
+    """
+    
+    return _hedging
+
+
+def set_hedging(policy):
+    """
+    Sets hedging policy of idempotent GET requests. Hedging is disabled by
+    default.
+    
+    Args:
+        policy: rebrick.HedgePolicy or None
+            Policy to use. If set to None, hedging is disabled.
+    """
+    
+    global _hedging
+    _hedging = policy
+
+
+def get_cache():
+    """
+    Gets current cache of GET responses.
+    
+    Returns:
+        rebrick.ResponseCache or None
+            Current cache.
+    """
+    
+    return _cache
+
+
+def set_cache(cache):
+    """
+    Sets cache of GET responses. Caching is disabled by default.
+    
+    Args:
+        cache: rebrick.ResponseCache or None
+            Cache to use. If set to None, caching is disabled.
+    """
+    
+    global _cache
+    _cache = cache
+
+
+def get_negative_cache():
+    """
+    Gets current cache of missing resources.
+    
+    Returns:
+        rebrick.NegativeCache or None
+            Current cache.
+    """
+    
+    return _negative_cache
+
+
+def set_negative_cache(cache):
+    """
+    Sets cache of missing resources. If set, GET requests and file downloads
+    answered by 404 are remembered and repeated requests fail immediately
+    without network access. Negative caching is disabled by default.
+    
+    Args:
+        cache: rebrick.NegativeCache or None
+            Cache to use. If set to None, negative caching is disabled.
+    """
+    
+    global _negative_cache
+    _negative_cache = cache
+
+
+def get_breaker():
+    """
+    Gets current circuit breaker.
+    
+    Returns:
+        rebrick.CircuitBreaker or None
+            Current circuit breaker.
+    """
+    
+    return _breaker
+
+
+def set_breaker(breaker):
+    """
+    Sets circuit breaker to fail fast during upstream outages. While the
+    circuit is open, stale cached responses are served if available.
+    
+    Args:
+        breaker: rebrick.CircuitBreaker or None
+            Breaker to use. If set to None, circuit breaking is disabled.
+    """
+    
+    global _breaker
+    _breaker = breaker
+
+
+def get_refresher():
+    """
+    Gets current refresher of cached responses.
+    
+    Returns:
+        rebrick.Refresher or None
+            Current refresher.
+    """
+    
+    return _refresher
+
+
+def set_refresher(refresher):
+    """
+    Sets refresher to track access of cached responses.
+    
+    Args:
+        refresher: rebrick.Refresher or None
+            Refresher to use. If set to None, tracking is disabled.
+    """
+    
+    global _refresher
+    _refresher = refresher
+
+
+def refresh_cached(key, url, options, api_key):
+    """
+    Refreshes cached response using idle rate budget only. The request is not
+    sent if the budget of given API key is not available immediately.
+    
+    Args:
+        key: str
+            Cache key.
+        
+        url: str
+            Request URL.
+        
+        options: str
+            Encoded request parameters.
+        
+        api_key: str
+            API key to use.
+    
+    Returns:
+        bool
+            True if the request was sent, False otherwise.
+    """
+    
+    if _cache is None or not _scheduler.try_acquire(api_key):
+        return False
+    
+    with _request(url, options, False, api_key, None, wait=False) as handle:
+        data = handle.read()
+        if getattr(handle, 'status', 200) == 200:
+            _cache.set(key, data)
+    
+    return True
+
+
+@contextlib.contextmanager
+def tracking_stale():
+    """
+    Tracks whether any response within the context was served from stale
+    cached data.
+    
+    Yields:
+        [bool]
+            Single-item list set to True if stale data were served.
+    """
+    
+    flags = [False]
+    token = _stale.set(flags)
+    
+    try:
+        yield flags
+    
+    finally:
+        _stale.reset(token)
+        
+        # propagate to outer context
+        if flags[0]:
+            _mark_stale()
+
+
+def read_json(response):
+    """
+    Reads and decodes JSON data from given response. The data are decoded
+    directly from bytes using custom decoder set to rebrick.config.JSON_DECODER
+    or the fastest available one.
+    
+    Args:
+        response: http.client.HTTPResponse
+            Server response.
+    
+    Returns:
+        dict
+            Decoded data.
+    """
+    
+    # read without instrumentation
+    endpoint = getattr(response, 'endpoint', None)
+    if endpoint is None:
+        return decode_json(response.read())
+    
+    # read and measure decoding
+    data = response.read()
+    
+    started = time.perf_counter()
+    decoded = decode_json(data)
+    metrics.emit(metrics.EVT_DECODE, endpoint=endpoint, bytes=len(data), duration=time.perf_counter() - started)
+    
+    return decoded
+
+
+def decode_json(data):
+    """
+    Decodes JSON data using custom decoder set to rebrick.config.JSON_DECODER
+    or the fastest available one.
+    
+    Args:
+        data: bytes
+            Raw JSON data.
+    
+    Returns:
+        dict
+            Decoded data.
+    """
+    
+    decoder = config.JSON_DECODER or _JSON_DECODER
+    return decoder(data)
 
 
 def assert_api_key(api_key):
@@ -96,3 +441,216 @@ def assert_user_token(user_token):
         raise ValueError("User token must be specified. Run rebrick.init() to set your token for all functions.")
     
     return user_token
+
+
+def _send(url, options, post, timeout, key):
+    """Sends request by current transport."""
+    
+    if post:
+        return _transport.open(url, options.encode('utf8'), timeout=timeout)
+    
+    url = "%s?%s" % (url, options)
+    transport = _transport
+    
+    # send hedged request
+    if _hedging is not None:
+        endpoint = metrics.get_endpoint(url)
+        if _hedging.is_hedged(endpoint):
+            return _hedging.send(
+                send = lambda: transport.open(url, timeout=timeout),
+                endpoint = endpoint,
+                acquire = lambda: _scheduler.try_acquire(key))
+    
+    return transport.open(url, timeout=timeout)
+
+
+def _get_sticky(url):
+    """Gets routing value for user-specific requests."""
+    
+    if not url.startswith(config.API_USERS_URL):
+        return None
+    
+    return url[len(config.API_USERS_URL):].split("/")[0]
+
+
+def _request_any(url, parameters, options, post, endpoint):
+    """Sends request using cache if available."""
+    
+    if _cache is not None and not post:
+        return _request_cached(url, parameters, options, endpoint)
+    
+    return _request(url, options, post, parameters['key'], endpoint)
+
+
+def _request(url, options, post, key, endpoint, wait=True):
+    """Waits for rate budget and sends request."""
+    
+    # check circuit
+    group = None
+    if _breaker is not None:
+        group = get_group(endpoint or metrics.get_endpoint(url))
+        if not _breaker.allow(group):
+            raise CircuitOpenError(url, group)
+    
+    # wait for rate budget
+    waited = 0
+    try:
+        if wait:
+            waited = _scheduler.acquire(
+                key = key,
+                priority = get_priority() or PRIORITY_NORMAL,
+                deadline = get_deadline(),
+                cancel = get_cancel())
+    
+    except BaseException:
+        if group is not None:
+            _breaker.release(group)
+        raise
+    
+    started = time.perf_counter()
+    status = None
+    
+    # check whether timeout is limited by deadline
+    deadline = get_deadline()
+    limited = deadline is not None and (config.REQUEST_TIMEOUT is None or deadline - time.monotonic() < config.REQUEST_TIMEOUT)
+    
+    if endpoint is not None:
+        metrics.emit(metrics.EVT_REQUEST_START, endpoint=endpoint, method="POST" if post else "GET")
+    
+    # send request
+    try:
+        timeout = get_timeout(config.REQUEST_TIMEOUT)
+        handle = _send(url, options, post, timeout, key)
+        status = getattr(handle, 'status', None)
+    
+    except BaseException as e:
+        
+        if isinstance(e, urllib.error.HTTPError):
+            status = e.code
+        
+        # report server response or release unused probe
+        if group is not None:
+            if is_failure(e, limited):
+                _breaker.failure(group)
+            elif status is not None:
+                _breaker.success(group)
+            else:
+                _breaker.release(group)
+        
+        raise
+    
+    finally:
+        if endpoint is not None:
+            metrics.emit(metrics.EVT_REQUEST_END,
+                endpoint = endpoint,
+                method = "POST" if post else "GET",
+                status = status,
+                wait = waited,
+                latency = time.perf_counter() - started)
+    
+    if group is not None:
+        _breaker.success(group)
+    
+    # wrap response
+    if endpoint is not None:
+        handle = metrics.MeteredResponse(handle, endpoint, started)
+    
+    return handle
+
+
+def _request_cached(url, parameters, options, endpoint):
+    """Gets response from cache or sends request."""
+    
+    key = _get_cache_key(url, parameters)
+    cached = _cache.get(key)
+    
+    # track access
+    if _refresher is not None:
+        _refresher.track(key, url, options, parameters['key'])
+    
+    # use fresh data
+    if cached is not None and _cache.is_fresh(cached[1]):
+        _emit_cache(endpoint, True)
+        return Response(cached[0], url=url)
+    
+    _emit_cache(endpoint, False)
+    
+    # use stale data while refreshing
+    if cached is not None:
+        
+        group = get_group(endpoint or metrics.get_endpoint(url))
+        if _breaker is None or _breaker.get_state(group) != STATE_OPEN:
+            _refresh(key, url, options, parameters['key'], endpoint)
+        
+        _mark_stale()
+        return Response(cached[0], url=url, stale=True)
+    
+    # fetch missing data once
+    with _cache.lock(key, get_timeout(config.REQUEST_TIMEOUT) or 30.):
+        
+        # use data filled meanwhile
+        cached = _cache.get(key)
+        if cached is not None and _cache.is_fresh(cached[1]):
+            return Response(cached[0], url=url)
+        
+        # send request
+        with _request(url, options, False, parameters['key'], endpoint) as handle:
+            data = handle.read()
+            status = getattr(handle, 'status', 200)
+        
+        # store data
+        if status == 200:
+            _cache.set(key, data)
+    
+    return Response(data, status, url=url)
+
+
+def _refresh(key, url, options, api_key, endpoint):
+    """Refreshes cached data in background."""
+    
+    # check running
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    
+    priority = get_priority() or PRIORITY_NORMAL
+    
+    def refresh():
+        try:
+            with scheduled(priority):
+                with _request(url, options, False, api_key, endpoint) as handle:
+                    data = handle.read()
+                    if getattr(handle, 'status', 200) == 200:
+                        _cache.set(key, data)
+        except Exception:
+            pass
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+    
+    # run in clean context
+    thread = threading.Thread(target=contextvars.Context().run, args=(refresh,), daemon=True)
+    thread.start()
+
+
+def _get_cache_key(url, parameters):
+    """Gets cache key of request without API key."""
+    
+    parameters = sorted((k, v) for k, v in parameters.items() if k != 'key')
+    return "%s?%s" % (url, urllib.parse.urlencode(parameters, doseq=True))
+
+
+def _emit_cache(endpoint, hit, negative=False):
+    """Emits cache event."""
+    
+    if endpoint is not None:
+        metrics.emit(metrics.EVT_CACHE, endpoint=endpoint, hit=hit, negative=negative)
+
+
+def _mark_stale():
+    """Marks current call as served from stale data."""
+    
+    flags = _stale.get()
+    if flags is not None:
+        flags[0] = True
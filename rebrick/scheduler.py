@@ -0,0 +1,522 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import time
+import zlib
+import threading
+import itertools
+import contextlib
+import contextvars
+import concurrent.futures
+from . import config
+
+# define priorities
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_NORMAL = 'normal'
+PRIORITY_BULK = 'bulk'
+
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_NORMAL, PRIORITY_BULK)
+
+# define default share of request budget
+WEIGHTS = {
+    PRIORITY_INTERACTIVE: 16,
+    PRIORITY_NORMAL: 4,
+    PRIORITY_BULK: 1}
+
+# init current context
+_priority = contextvars.ContextVar('rebrick_priority', default=None)
+_deadline = contextvars.ContextVar('rebrick_deadline', default=None)
+_keys = contextvars.ContextVar('rebrick_keys', default=None)
+_cancel = contextvars.ContextVar('rebrick_cancel', default=())
+
+
+@contextlib.contextmanager
+def scheduled(priority=None, deadline=None, keys=None, cancel=None):
+    """
+    Sets priority, deadline, pool of API keys and cancellation token for all
+    requests sent within the context by current thread. Values which are not
+    set are inherited from outer context. Nested deadlines and cancellation
+    tokens are combined, so that the inner context cannot extend the outer.
+    
+    Args:
+        priority: str or None
+            Priority as rebrick.PRIORITY_* constant.
+        
+        deadline: float or None
+            Absolute deadline as time.monotonic() value. Requests which cannot
+            be dispatched before the deadline fail by TimeoutError.
+        
+        keys: (str,) or None
+            Pool of API keys to be used by requests without explicit key.
+        
+        cancel: rebrick.CancelToken or None
+            Token to abort all following requests.
+    """
+    
+    # check priority
+    if priority is not None and priority not in PRIORITIES:
+        raise ValueError("Unknown priority! --> %s" % priority)
+    
+    # set values
+    tokens = []
+    
+    if priority is not None:
+        tokens.append((_priority, _priority.set(priority)))
+    
+    if deadline is not None:
+        current = _deadline.get()
+        if current is not None:
+            deadline = min(deadline, current)
+        tokens.append((_deadline, _deadline.set(deadline)))
+    
+    if keys:
+        tokens.append((_keys, _keys.set(tuple(keys))))
+    
+    if cancel is not None:
+        tokens.append((_cancel, _cancel.set(_cancel.get() + (cancel,))))
+    
+    # run context
+    try:
+        yield
+    
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def get_priority():
+    """
+    Gets priority set for current context.
+    
+    Returns:
+        str or None
+            Current priority.
+    """
+    
+    return _priority.get()
+
+
+def get_deadline():
+    """
+    Gets deadline set for current context.
+    
+    Returns:
+        float or None
+            Current deadline as time.monotonic() value.
+    """
+    
+    return _deadline.get()
+
+
+def get_keys():
+    """
+    Gets pool of API keys set for current context.
+    
+    Returns:
+        (str,) or None
+            Current API keys.
+    """
+    
+    return _keys.get()
+
+
+def get_timeout(timeout=None):
+    """
+    Gets timeout for single network operation limited by the deadline set for
+    current context.
+    
+    Args:
+        timeout: float or None
+            Default timeout in seconds.
+    
+    Returns:
+        float or None
+            Timeout in seconds.
+    
+    Raises:
+        TimeoutError
+            If the deadline has already passed.
+    """
+    
+    deadline = _deadline.get()
+    if deadline is None:
+        return timeout
+    
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("Request deadline exceeded!")
+    
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def get_cancel():
+    """
+    Gets cancellation tokens set for current context.
+    
+    Returns:
+        (rebrick.CancelToken,)
+            Current tokens.
+    """
+    
+    return _cancel.get()
+
+
+def check_cancelled():
+    """
+    Checks whether any cancellation token of current context was cancelled.
+    
+    Raises:
+        concurrent.futures.CancelledError
+            If cancelled.
+    """
+    
+    for token in _cancel.get():
+        token.check()
+
+
+class CancelToken(object):
+    """
+    Represents cancellation token, which allows to abort running calls from
+    another thread. Cancelled calls are aborted before sending the next request
+    (e.g. between pages of paged results) or while waiting for rate budget by
+    raising concurrent.futures.CancelledError.
+    """
+    
+    
+    def __init__(self):
+        """Initializes a new instance of rebrick.CancelToken."""
+        
+        super().__init__()
+        
+        self._cancelled = False
+        self._callbacks = []
+        self._lock = threading.Lock()
+    
+    
+    @property
+    def cancelled(self):
+        """Checks whether the token was cancelled."""
+        
+        return self._cancelled
+    
+    
+    def cancel(self):
+        """Cancels all calls using the token."""
+        
+        with self._lock:
+            self._cancelled = True
+            callbacks = tuple(self._callbacks)
+        
+        for callback in callbacks:
+            callback()
+    
+    
+    def check(self):
+        """
+        Checks whether the token was cancelled.
+        
+        Raises:
+            concurrent.futures.CancelledError
+                If cancelled.
+        """
+        
+        if self._cancelled:
+            raise concurrent.futures.CancelledError("Request was cancelled!")
+    
+    
+    def add_callback(self, callback):
+        """
+        Registers callback to be called when the token is cancelled.
+        
+        Args:
+            callback: callable
+                Callback without arguments.
+        """
+        
+        with self._lock:
+            self._callbacks.append(callback)
+        
+        if self._cancelled:
+            callback()
+    
+    
+    def remove_callback(self, callback):
+        """
+        Removes previously registered callback.
+        
+        Args:
+            callback: callable
+                Callback to remove.
+        """
+        
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+class Scheduler(object):
+    """
+    Dispatches requests according to the rate budget of each API key. Waiting
+    requests are served by their priority class using weighted fair sharing of
+    the budget, so that bulk jobs cannot starve interactive lookups while
+    still progressing. Within the class requests are served by their deadline
+    and order of arrival. Requests which would miss their deadline by waiting
+    for another slot are served first.
+    """
+    
+    
+    def __init__(self, weights=None, delay=None):
+        """
+        Initializes a new instance of rebrick.Scheduler.
+        
+        Args:
+            weights: {str: float} or None
+                Relative share of budget for each priority class. If set to
+                None, default rebrick.scheduler.WEIGHTS are used.
+            
+            delay: float or None
+                Minimum delay between requests with the same key in seconds.
+                If set to None, rebrick.config.REQUEST_DELAY is used.
+        """
+        
+        super().__init__()
+        
+        self._weights = dict(WEIGHTS)
+        self._weights.update(weights or {})
+        self._delay = delay
+        
+        self._buckets = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+    
+    
+    @property
+    def delay(self):
+        """Gets current delay between requests."""
+        
+        return config.REQUEST_DELAY if self._delay is None else self._delay
+    
+    
+    def acquire(self, key=None, priority=PRIORITY_NORMAL, deadline=None, cancel=()):
+        """
+        Waits until a request can be sent with given key.
+        
+        Args:
+            key: str or None
+                API key whose budget is used.
+            
+            priority: str
+                Request priority as rebrick.PRIORITY_* constant.
+            
+            deadline: float or None
+                Absolute deadline as time.monotonic() value.
+            
+            cancel: (rebrick.CancelToken,)
+                Tokens to abort waiting.
+        
+        Returns:
+            float
+                Time spent waiting in seconds.
+        
+        Raises:
+            TimeoutError
+                If request cannot be dispatched before the deadline.
+            
+            concurrent.futures.CancelledError
+                If any of the tokens is cancelled.
+        """
+        
+        # check priority
+        if priority not in self._weights:
+            raise ValueError("Unknown priority! --> %s" % priority)
+        
+        started = time.monotonic()
+        
+        # wake up on cancel
+        def wake():
+            with self._cond:
+                self._cond.notify_all()
+        
+        for token in cancel:
+            token.add_callback(wake)
+        
+        try:
+            return self._wait(key, priority, deadline, cancel, started)
+        
+        finally:
+            for token in cancel:
+                token.remove_callback(wake)
+    
+    
+    def try_acquire(self, key=None):
+        """
+        Consumes rate budget of given key only if it is available immediately
+        and no other request is waiting for it.
+        
+        Args:
+            key: str or None
+                API key whose budget is used.
+        
+        Returns:
+            bool
+                True if budget was consumed, False otherwise.
+        """
+        
+        with self._cond:
+            
+            now = time.monotonic()
+            
+            bucket = self._buckets.get(key, None)
+            if bucket is None:
+                bucket = _Bucket()
+                self._buckets[key] = bucket
+            
+            if bucket.waiters or now < bucket.next_time:
+                return False
+            
+            bucket.next_time = now + self.delay
+            return True
+    
+    
+    def select_key(self, keys, sticky=None):
+        """
+        Selects API key from given pool to be used for next request. Unless
+        sticky value is given, the key with the earliest available budget is
+        used. Requests with the same sticky value (e.g. user token) are always
+        routed to the same key.
+        
+        Args:
+            keys: (str,)
+                Pool of API keys.
+            
+            sticky: str or None
+                Routing value.
+        
+        Returns:
+            str
+                Selected API key.
+        """
+        
+        # use sticky key
+        if sticky is not None:
+            return keys[zlib.crc32(sticky.encode('utf-8')) % len(keys)]
+        
+        # get key with earliest budget
+        with self._cond:
+            
+            now = time.monotonic()
+            delay = self.delay
+            
+            best = None
+            best_time = None
+            
+            for key in keys:
+                
+                bucket = self._buckets.get(key, None)
+                if bucket is None:
+                    return key
+                
+                available = max(now, bucket.next_time) + delay * len(bucket.waiters)
+                if best_time is None or available < best_time:
+                    best, best_time = key, available
+            
+            return best
+    
+    
+    def _wait(self, key, priority, deadline, cancel, started):
+        """Waits for dispatch."""
+        
+        with self._cond:
+            
+            # get bucket
+            bucket = self._buckets.get(key, None)
+            if bucket is None:
+                bucket = _Bucket()
+                self._buckets[key] = bucket
+            
+            # add waiter
+            waiter = (priority, deadline, next(self._counter))
+            bucket.waiters.append(waiter)
+            
+            while True:
+                
+                now = time.monotonic()
+                delay = self.delay
+                
+                # check cancellation
+                if any(t.cancelled for t in cancel):
+                    bucket.waiters.remove(waiter)
+                    self._cond.notify_all()
+                    raise concurrent.futures.CancelledError("Request was cancelled!")
+                
+                # check deadline
+                if deadline is not None and now >= deadline:
+                    bucket.waiters.remove(waiter)
+                    self._cond.notify_all()
+                    raise TimeoutError("Request deadline exceeded while waiting for rate limit!")
+                
+                # dispatch
+                selected = self._select(bucket, now, delay)
+                if selected is waiter and now >= bucket.next_time:
+                    self._dispatch(bucket, waiter, now, delay)
+                    self._cond.notify_all()
+                    return now - started
+                
+                # wait for slot or deadline
+                timeout = None
+                if selected is waiter:
+                    timeout = bucket.next_time - now
+                
+                if deadline is not None:
+                    timeout = deadline - now if timeout is None else min(timeout, deadline - now)
+                
+                self._cond.wait(timeout)
+    
+    
+    def _select(self, bucket, now, delay):
+        """Selects waiter to be served next."""
+        
+        # serve urgent first
+        horizon = max(now, bucket.next_time) + delay
+        urgent = [w for w in bucket.waiters if w[1] is not None and w[1] < horizon]
+        if urgent:
+            return min(urgent, key=lambda w: (w[1], w[2]))
+        
+        # select class by virtual finish time
+        best = None
+        best_finish = None
+        
+        for priority in set(w[0] for w in bucket.waiters):
+            finish = max(bucket.finish.get(priority, 0.), bucket.vtime) + 1. / self._weights[priority]
+            if best_finish is None or finish < best_finish:
+                best, best_finish = priority, finish
+        
+        # select waiter within class
+        waiters = [w for w in bucket.waiters if w[0] == best]
+        return min(waiters, key=lambda w: (w[1] is None, w[1] or 0, w[2]))
+    
+    
+    def _dispatch(self, bucket, waiter, now, delay):
+        """Removes waiter and consumes budget."""
+        
+        priority = waiter[0]
+        start = max(bucket.finish.get(priority, 0.), bucket.vtime)
+        
+        bucket.vtime = start
+        bucket.finish[priority] = start + 1. / self._weights[priority]
+        bucket.next_time = now + delay
+        bucket.waiters.remove(waiter)
+
+
+class _Bucket(object):
+    """Holds scheduling state of single API key."""
+    
+    
+    def __init__(self):
+        
+        super().__init__()
+        
+        self.next_time = 0.
+        self.vtime = 0.
+        self.finish = {}
+        self.waiters = []
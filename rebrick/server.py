@@ -0,0 +1,909 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import re
+import json
+import time
+import random
+import fnmatch
+import argparse
+import threading
+import socketserver
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from . import config
+
+# define defaults
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MOCK_USER_TOKEN = "0123456789abcdef0123456789abcdef0123456789abcdef0123456789abcdef"
+
+
+class Catalogue(object):
+    """
+    Provides synthetic Rebrickable catalogue of configurable size. All data
+    are generated deterministically from given seed in the shapes returned by
+    the Rebrickable v3 API.
+    """
+    
+    
+    def __init__(self, parts=1000, colors=50, sets=200, themes=30, categories=20, minifigs=50, set_size=100, seed=0):
+        """
+        Initializes a new instance of rebrick.server.Catalogue.
+        
+        Args:
+            parts: int
+                Number of parts.
+            
+            colors: int
+                Number of colors.
+            
+            sets: int
+                Number of sets.
+            
+            themes: int
+                Number of themes.
+            
+            categories: int
+                Number of part categories.
+            
+            minifigs: int
+                Number of minifigs.
+            
+            set_size: int
+                Maximum number of distinct elements in a set.
+            
+            seed: int
+                Random seed.
+        """
+        
+        super().__init__()
+        
+        rand = random.Random(seed)
+        
+        # make categories
+        self.categories = {}
+        for i in range(1, categories + 1):
+            self.categories[i] = {
+                'id': i,
+                'name': "Category %d" % i,
+                'part_count': 0}
+        
+        # make colors
+        self.colors = {}
+        for i in range(-1, colors - 1):
+            self.colors[i] = {
+                'id': i,
+                'name': "Color %d" % i,
+                'rgb': "%06X" % rand.randrange(0x1000000),
+                'is_trans': rand.random() < 0.15,
+                'external_ids': {}}
+        
+        # make themes
+        self.themes = {}
+        for i in range(1, themes + 1):
+            parent = rand.randrange(1, i) if i > 5 and rand.random() < 0.6 else None
+            self.themes[i] = {
+                'id': i,
+                'parent_id': parent,
+                'name': "Theme %d" % i}
+        
+        # make parts
+        self.parts = {}
+        color_ids = list(self.colors)
+        
+        for i in range(parts):
+            part_num = str(3000 + i)
+            category_id = rand.randrange(1, categories + 1)
+            self.categories[category_id]['part_count'] += 1
+            self.parts[part_num] = {
+                'part_num': part_num,
+                'name': "Part %s" % part_num,
+                'part_cat_id': category_id,
+                'year_from': rand.randrange(1960, 2020),
+                'year_to': 2024,
+                'part_url': "https://rebrickable.com/parts/%s/" % part_num,
+                'part_img_url': "https://cdn.rebrickable.com/media/parts/%s.png" % part_num,
+                'prints': [],
+                'molds': [],
+                'alternates': [],
+                'external_ids': {'BrickLink': [part_num], 'LEGO': [part_num]},
+                'print_of': None,
+                'colors': rand.sample(color_ids, min(len(color_ids), rand.randrange(1, 6)))}
+        
+        # make relations
+        part_nums = list(self.parts)
+        for part_num in part_nums[1::10]:
+            other = rand.choice(part_nums)
+            if other != part_num:
+                self.parts[part_num]['molds'].append(other)
+                self.parts[other]['molds'].append(part_num)
+        
+        # make elements
+        self.elements = {}
+        for part in self.parts.values():
+            for color_id in part['colors']:
+                element_id = str(300000 + len(self.elements))
+                self.elements[element_id] = (part['part_num'], color_id)
+        
+        self.element_ids = {v: k for k, v in self.elements.items()}
+        element_keys = list(self.elements.values())
+        
+        # make minifigs
+        self.minifigs = {}
+        for i in range(1, minifigs + 1):
+            fig_num = "fig-%06d" % i
+            self.minifigs[fig_num] = {
+                'set_num': fig_num,
+                'name': "Minifig %d" % i,
+                'num_parts': 0,
+                'set_img_url': "https://cdn.rebrickable.com/media/sets/%s.jpg" % fig_num,
+                'set_url': "https://rebrickable.com/minifigs/%s/" % fig_num,
+                'inventory': [(k, 1, False) for k in rand.sample(element_keys, min(len(element_keys), 4))]}
+            self.minifigs[fig_num]['num_parts'] = 4
+        
+        # make sets
+        self.sets = {}
+        fig_nums = list(self.minifigs)
+        
+        for i in range(sets):
+            set_num = "%d-1" % (10000 + i)
+            inventory = [(k, rand.randrange(1, 9), rand.random() < 0.05) for k in rand.sample(element_keys, min(len(element_keys), rand.randrange(1, set_size + 1)))]
+            self.sets[set_num] = {
+                'set_num': set_num,
+                'name': "Set %s" % set_num,
+                'year': rand.randrange(1970, 2024),
+                'theme_id': rand.randrange(1, themes + 1),
+                'num_parts': sum(q for k, q, s in inventory if not s),
+                'set_img_url': "https://cdn.rebrickable.com/media/sets/%s.jpg" % set_num,
+                'set_url': "https://rebrickable.com/sets/%s/" % set_num,
+                'last_modified_dt': "2020-01-01T00:00:00.000000Z",
+                'inventory': inventory,
+                'minifigs': rand.sample(fig_nums, min(len(fig_nums), rand.randrange(0, 3)))}
+    
+    
+    def get_set(self, set_num):
+        """Gets set data."""
+        
+        set_num = set_num if '-' in set_num else set_num + "-1"
+        data = self.sets.get(set_num, None)
+        
+        if data is None:
+            return None
+        
+        return {k: v for k, v in data.items() if k not in ('inventory', 'minifigs')}
+    
+    
+    def get_part(self, part_num, details=True):
+        """Gets part data."""
+        
+        data = self.parts.get(part_num, None)
+        
+        if data is None:
+            return None
+        
+        if details:
+            return {k: v for k, v in data.items() if k != 'colors'}
+        
+        return {k: data[k] for k in ('part_num', 'name', 'part_cat_id', 'part_url', 'part_img_url', 'print_of', 'external_ids')}
+    
+    
+    def get_minifig(self, fig_num):
+        """Gets minifig data."""
+        
+        data = self.minifigs.get(fig_num, None)
+        
+        if data is None:
+            return None
+        
+        return {k: v for k, v in data.items() if k != 'inventory'}
+    
+    
+    def get_element(self, key, quantity=None, is_spare=False, details=False):
+        """Gets inventory item data."""
+        
+        part_num, color_id = key
+        
+        data = {
+            'part': self.get_part(part_num, details),
+            'color': self.colors[color_id],
+            'element_id': self.element_ids[key],
+            'design_id': part_num,
+            'element_img_url': "https://cdn.rebrickable.com/media/parts/elements/%s.jpg" % self.element_ids[key]}
+        
+        if quantity is not None:
+            data['quantity'] = quantity
+            data['is_spare'] = is_spare
+        
+        return data
+
+
+class MockServer(object):
+    """
+    Provides local HTTP server imitating the Rebrickable v3 API over
+    synthetic catalogue. It serves paged results, set inventories and user
+    data and can enforce a rate limit by 429 responses, which allows to
+    exercise and load-test the client without accessing the real service.
+    """
+    
+    
+    def __init__(self, catalogue=None, host="127.0.0.1", port=0, rate_limit=None, burst=1, latency=0):
+        """
+        Initializes a new instance of rebrick.server.MockServer.
+        
+        Args:
+            catalogue: rebrick.server.Catalogue or None
+                Catalogue to serve. If set to None, default one is created.
+            
+            host: str
+                Host name to listen at.
+            
+            port: int
+                Port to listen at. If set to 0, any free port is used.
+            
+            rate_limit: float or None
+                Maximum number of requests per second for each API key. If
+                set to None, the rate is not limited.
+            
+            burst: int
+                Number of requests allowed at once within the rate limit.
+            
+            latency: float
+                Simulated latency of each response in seconds.
+        """
+        
+        super().__init__()
+        
+        self.catalogue = catalogue or Catalogue()
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.latency = latency
+        
+        self.requests = 0
+        self.throttled = 0
+        
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._urls = None
+        
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+    
+    
+    def __enter__(self):
+        """Starts server and sets module URLs."""
+        
+        self.start()
+        self.configure()
+        
+        return self
+    
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Stops server and restores module URLs."""
+        
+        self.stop()
+    
+    
+    @property
+    def url(self):
+        """
+        Gets base URL of the API.
+        
+        Returns:
+            str
+                Base URL.
+        """
+        
+        host, port = self._server.server_address[:2]
+        return "http://%s:%s/api/v3/" % (host, port)
+    
+    
+    def configure(self):
+        """Sets rebrick.config API URLs to use this server."""
+        
+        self._urls = (config.API_LEGO_URL, config.API_USERS_URL)
+        
+        config.API_LEGO_URL = self.url + "lego/"
+        config.API_USERS_URL = self.url + "users/"
+    
+    
+    def start(self):
+        """Starts serving in background thread."""
+        
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+    
+    
+    def serve_forever(self):
+        """Starts serving in current thread."""
+        
+        self._server.serve_forever()
+    
+    
+    def stop(self):
+        """Stops serving and restores module URLs if changed."""
+        
+        self._server.shutdown()
+        self._server.server_close()
+        
+        if self._urls:
+            config.API_LEGO_URL, config.API_USERS_URL = self._urls
+            self._urls = None
+    
+    
+    def acquire(self, key):
+        """Checks rate limit for given key and gets required wait time."""
+        
+        with self._lock:
+            
+            self.requests += 1
+            
+            if not self.rate_limit:
+                return 0
+            
+            # refill bucket
+            now = time.time()
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate_limit)
+            
+            # throttle
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self.throttled += 1
+                return (1 - tokens) / self.rate_limit
+            
+            self._buckets[key] = (tokens - 1, now)
+            
+            return 0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Handles mock server requests."""
+    
+    protocol_version = "HTTP/1.1"
+    
+    
+    def log_message(self, format, *args):
+        """Disables logging."""
+        
+        pass
+    
+    
+    def do_GET(self):
+        """Handles GET request."""
+        
+        self._handle(None)
+    
+    
+    def do_POST(self):
+        """Handles POST request."""
+        
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8')
+        
+        self._handle(dict(urllib.parse.parse_qsl(body)))
+    
+    
+    def _handle(self, form):
+        """Routes request."""
+        
+        mock = self.server.mock
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        
+        if form:
+            query.update(form)
+        
+        # check key
+        key = query.get('key', None)
+        if not key:
+            return self._send(401, {'detail': "Invalid token."})
+        
+        # check rate limit
+        wait = mock.acquire(key)
+        if wait:
+            seconds = max(1, int(wait + 0.999))
+            return self._send(429, {'detail': "Request was throttled. Expected available in %d second." % seconds}, {'Retry-After': str(seconds)})
+        
+        # simulate latency
+        if mock.latency:
+            time.sleep(mock.latency)
+        
+        # find route
+        for method, pattern, handler in _ROUTES:
+            
+            if method != self.command:
+                continue
+            
+            match = pattern.match(url.path)
+            if match:
+                break
+        else:
+            return self._send(404, {'detail': "Not found."})
+        
+        # get data
+        data = handler(mock.catalogue, query, *match.groups())
+        if data is None:
+            return self._send(404, {'detail': "Not found."})
+        
+        # make page
+        if isinstance(data, list):
+            data = self._make_page(url.path, query, data)
+        
+        self._send(201 if self.command == 'POST' else 200, data)
+    
+    
+    def _make_page(self, path, query, items):
+        """Makes paged results."""
+        
+        page = int(query.get('page', 1))
+        size = min(MAX_PAGE_SIZE, int(query.get('page_size', DEFAULT_PAGE_SIZE)))
+        start = (page - 1) * size
+        
+        def make_url(number):
+            params = dict(query, page=number)
+            host = self.headers.get('Host', "%s:%s" % self.server.server_address[:2])
+            return "http://%s%s?%s" % (host, path, urllib.parse.urlencode(params))
+        
+        return {
+            'count': len(items),
+            'next': make_url(page + 1) if start + size < len(items) else None,
+            'previous': make_url(page - 1) if page > 1 else None,
+            'results': items[start:start+size]}
+    
+    
+    def _send(self, status, data, headers=None):
+        """Sends JSON response."""
+        
+        body = json.dumps(data).encode('utf-8')
+        
+        self.send_response(status)
+        self.send_header('Content-Type', "application/json")
+        self.send_header('Content-Length', str(len(body)))
+        
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _filter_sets(sets, query):
+    """Applies set filters."""
+    
+    search = query.get('search', "").lower()
+    theme_id = query.get('theme_id', None)
+    
+    min_year = int(query.get('min_year', 0))
+    max_year = int(query.get('max_year', 9999))
+    min_parts = int(query.get('min_parts', 0))
+    max_parts = int(query.get('max_parts', 1 << 30))
+    
+    results = []
+    for data in sets:
+        if search and search not in data['name'].lower() and search not in data['set_num']:
+            continue
+        if theme_id and str(data['theme_id']) != theme_id:
+            continue
+        if min_year <= data['year'] <= max_year and min_parts <= data['num_parts'] <= max_parts:
+            results.append(data)
+    
+    return results
+
+
+def _get_parts(cat, query):
+    """Gets parts list."""
+    
+    details = query.get('inc_part_details', '0') == '1'
+    part_cat_id = query.get('part_cat_id', None)
+    search = query.get('search', "").lower()
+    
+    ids = query.get('part_nums', None)
+    ids = ids.split(",") if ids else cat.parts
+    
+    results = []
+    for part_num in ids:
+        data = cat.get_part(part_num, details)
+        if data is None:
+            continue
+        if part_cat_id and str(data['part_cat_id']) != part_cat_id:
+            continue
+        if search and search not in data['name'].lower():
+            continue
+        results.append(data)
+    
+    return results
+
+
+def _get_part_colors(cat, query, part_num):
+    """Gets part colors list."""
+    
+    part = cat.parts.get(part_num, None)
+    if part is None:
+        return None
+    
+    return [{
+        'color_id': c,
+        'color_name': cat.colors[c]['name'],
+        'num_sets': 1,
+        'num_set_parts': 1,
+        'part_img_url': part['part_img_url'],
+        'elements': [cat.element_ids[(part_num, c)]]} for c in part['colors']]
+
+
+def _get_part_color(cat, query, part_num, color_id):
+    """Gets part color details."""
+    
+    key = (part_num, int(color_id))
+    if key not in cat.element_ids:
+        return None
+    
+    return {
+        'part_img_url': cat.parts[part_num]['part_img_url'],
+        'year_from': cat.parts[part_num]['year_from'],
+        'year_to': cat.parts[part_num]['year_to'],
+        'num_sets': 1,
+        'num_set_parts': 1,
+        'elements': [cat.element_ids[key]]}
+
+
+def _get_part_color_sets(cat, query, part_num, color_id):
+    """Gets sets containing part color."""
+    
+    key = (part_num, int(color_id))
+    return [cat.get_set(s['set_num']) for s in cat.sets.values() if any(k == key for k, q, sp in s['inventory'])]
+
+
+def _get_inventory(cat, query, inventory):
+    """Gets inventory items."""
+    
+    details = query.get('inc_part_details', '0') == '1'
+    return [cat.get_element(k, q, s, details) for k, q, s in inventory]
+
+
+def _get_set_elements(cat, query, set_num):
+    """Gets set inventory."""
+    
+    set_num = set_num if '-' in set_num else set_num + "-1"
+    data = cat.sets.get(set_num, None)
+    
+    if data is None:
+        return None
+    
+    inventory = list(data['inventory'])
+    
+    # add minifig parts
+    if query.get('inc_minifig_parts', '0') == '1':
+        for fig_num in data['minifigs']:
+            inventory.extend(cat.minifigs[fig_num]['inventory'])
+    
+    return _get_inventory(cat, query, inventory)
+
+
+def _get_set_minifigs(cat, query, set_num):
+    """Gets set minifigs."""
+    
+    set_num = set_num if '-' in set_num else set_num + "-1"
+    data = cat.sets.get(set_num, None)
+    
+    if data is None:
+        return None
+    
+    results = []
+    for i, fig_num in enumerate(data['minifigs']):
+        fig = cat.minifigs[fig_num]
+        results.append({
+            'id': i + 1,
+            'set_num': fig_num,
+            'set_name': fig['name'],
+            'quantity': 1,
+            'num_parts': fig['num_parts'],
+            'set_img_url': fig['set_img_url']})
+    
+    return results
+
+
+def _get_minifig(cat, query, fig_num):
+    """Gets minifig details."""
+    
+    data = cat.get_minifig(fig_num)
+    if data is None:
+        return None
+    
+    return dict(data, set_name=data['name'])
+
+
+def _get_minifig_sets(cat, query, fig_num):
+    """Gets sets containing minifig."""
+    
+    return [cat.get_set(s['set_num']) for s in cat.sets.values() if fig_num in s['minifigs']]
+
+
+def _get_user_sets(cat, query, token):
+    """Gets user sets."""
+    
+    sets = _filter_sets([cat.get_set(s) for s in list(cat.sets)[:20]], query)
+    return [{'list_id': 1, 'quantity': 1, 'include_spares': True, 'set': s} for s in sets]
+
+
+def _get_user_elements(cat, query, token):
+    """Gets user elements."""
+    
+    inventory = [(k, 1, False) for k in list(cat.elements.values())[:200]]
+    return _get_inventory(cat, query, inventory)
+
+
+def _get_partlist_elements(cat, query, token, list_id):
+    """Gets user part list elements."""
+    
+    if list_id != "1":
+        return None
+    
+    results = _get_inventory(cat, query, [(k, 2, False) for k in list(cat.elements.values())[:50]])
+    for item in results:
+        item['list_id'] = 1
+    
+    return results
+
+
+def _route(method, pattern, handler):
+    """Registers route."""
+    
+    _ROUTES.append((method, re.compile("^/api/v3/" + pattern + "$"), handler))
+
+
+# define routes
+_ROUTES = []
+
+_route('GET', r"lego/colors/", lambda c, q: list(c.colors.values()))
+_route('GET', r"lego/colors/(-?\d+)/", lambda c, q, i: c.colors.get(int(i), None))
+_route('GET', r"lego/elements/([^/]+)/", lambda c, q, i: c.get_element(c.elements[i], details=True) if i in c.elements else None)
+_route('GET', r"lego/minifigs/", lambda c, q: [c.get_minifig(f) for f in c.minifigs])
+_route('GET', r"lego/minifigs/([^/]+)/", _get_minifig)
+_route('GET', r"lego/minifigs/([^/]+)/parts/", lambda c, q, f: _get_inventory(c, q, c.minifigs[f]['inventory']) if f in c.minifigs else None)
+_route('GET', r"lego/minifigs/([^/]+)/sets/", _get_minifig_sets)
+_route('GET', r"lego/part_categories/", lambda c, q: list(c.categories.values()))
+_route('GET', r"lego/part_categories/(\d+)/", lambda c, q, i: c.categories.get(int(i), None))
+_route('GET', r"lego/parts/", _get_parts)
+_route('GET', r"lego/parts/([^/]+)/", lambda c, q, p: c.get_part(p))
+_route('GET', r"lego/parts/([^/]+)/colors/", _get_part_colors)
+_route('GET', r"lego/parts/([^/]+)/colors/(-?\d+)/", _get_part_color)
+_route('GET', r"lego/parts/([^/]+)/colors/(-?\d+)/sets/", _get_part_color_sets)
+_route('GET', r"lego/sets/", lambda c, q: _filter_sets([c.get_set(s) for s in c.sets], q))
+_route('GET', r"lego/sets/([^/]+)/", lambda c, q, s: c.get_set(s))
+_route('GET', r"lego/sets/([^/]+)/alternates/", lambda c, q, s: [] if c.get_set(s) else None)
+_route('GET', r"lego/sets/([^/]+)/minifigs/", _get_set_minifigs)
+_route('GET', r"lego/sets/([^/]+)/parts/", _get_set_elements)
+_route('GET', r"lego/themes/", lambda c, q: list(c.themes.values()))
+_route('GET', r"lego/themes/(\d+)/", lambda c, q, i: c.themes.get(int(i), None))
+
+_route('POST', r"users/_token/", lambda c, q: {'user_token': MOCK_USER_TOKEN})
+_route('GET', r"users/([^/]+)/allparts/", _get_user_elements)
+_route('GET', r"users/([^/]+)/lost_parts/", lambda c, q, t: _get_user_elements(c, q, t)[:5])
+_route('GET', r"users/([^/]+)/parts/", _get_user_elements)
+_route('GET', r"users/([^/]+)/partlists/", lambda c, q, t: [{'id': 1, 'is_buildable': True, 'name': "Part List", 'num_parts': 100}])
+_route('GET', r"users/([^/]+)/partlists/(\d+)/", lambda c, q, t, i: {'id': 1, 'is_buildable': True, 'name': "Part List", 'num_parts': 100} if i == "1" else None)
+_route('GET', r"users/([^/]+)/partlists/(\d+)/parts/", _get_partlist_elements)
+_route('GET', r"users/([^/]+)/profile/", lambda c, q, t: {'user_id': 1, 'username': "mock", 'location': "", 'avatar_img': None})
+_route('GET', r"users/([^/]+)/sets/", _get_user_sets)
+_route('GET', r"users/([^/]+)/setlists/", lambda c, q, t: [{'id': 1, 'is_buildable': True, 'name': "Set List", 'num_sets': 20}])
+_route('GET', r"users/([^/]+)/setlists/(\d+)/", lambda c, q, t, i: {'id': 1, 'is_buildable': True, 'name': "Set List", 'num_sets': 20} if i == "1" else None)
+_route('GET', r"users/([^/]+)/setlists/(\d+)/sets/", lambda c, q, t, i: _get_user_sets(c, q, t) if i == "1" else None)
+
+
+class MockRedisServer(object):
+    """
+    Provides local in-memory server speaking basic subset of the Redis
+    protocol (GET, SET with expiration and NX, DEL, EXISTS, SCAN, FLUSHDB),
+    which allows to exercise rebrick.RedisCache without real Redis server.
+    """
+    
+    
+    def __init__(self, host="127.0.0.1", port=0):
+        """
+        Initializes a new instance of rebrick.server.MockRedisServer.
+        
+        Args:
+            host: str
+                Host name to listen at.
+            
+            port: int
+                Port to listen at. If set to 0, any free port is used.
+        """
+        
+        super().__init__()
+        
+        self.data = {}
+        self.commands = 0
+        
+        self._lock = threading.Lock()
+        self._thread = None
+        
+        self._server = socketserver.ThreadingTCPServer((host, port), _RedisHandler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+    
+    
+    def __enter__(self):
+        """Starts server."""
+        
+        self.start()
+        return self
+    
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Stops server."""
+        
+        self.stop()
+    
+    
+    @property
+    def host(self):
+        """Gets server host."""
+        
+        return self._server.server_address[0]
+    
+    
+    @property
+    def port(self):
+        """Gets server port."""
+        
+        return self._server.server_address[1]
+    
+    
+    def start(self):
+        """Starts serving in background thread."""
+        
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+    
+    
+    def stop(self):
+        """Stops serving."""
+        
+        self._server.shutdown()
+        self._server.server_close()
+    
+    
+    def execute(self, args):
+        """Executes command and gets reply."""
+        
+        command = args[0].upper()
+        now = time.time()
+        
+        with self._lock:
+            
+            self.commands += 1
+            
+            # remove expired
+            for key in [k for k, v in self.data.items() if v[1] is not None and v[1] <= now]:
+                del self.data[key]
+            
+            if command in (b"PING", b"AUTH", b"SELECT"):
+                return b"PONG" if command == b"PING" else b"OK"
+            
+            if command == b"GET":
+                item = self.data.get(args[1], None)
+                return item[0] if item else None
+            
+            if command == b"SET":
+                
+                options = [x.upper() for x in args[3:]]
+                if b"NX" in options and args[1] in self.data:
+                    return None
+                
+                expires = None
+                for name, scale in ((b"PX", 0.001), (b"EX", 1)):
+                    if name in options:
+                        expires = now + int(args[3 + options.index(name) + 1]) * scale
+                
+                self.data[args[1]] = (args[2], expires)
+                return b"OK"
+            
+            if command == b"DEL":
+                return sum(1 for k in args[1:] if self.data.pop(k, None) is not None)
+            
+            if command == b"EXISTS":
+                return sum(1 for k in args[1:] if k in self.data)
+            
+            if command == b"SCAN":
+                options = [x.upper() for x in args[2:]]
+                pattern = args[2 + options.index(b"MATCH") + 1] if b"MATCH" in options else b"*"
+                keys = [k for k in self.data if fnmatch.fnmatchcase(k, pattern)]
+                return [b"0", keys]
+            
+            if command == b"FLUSHDB":
+                self.data.clear()
+                return b"OK"
+        
+        return ValueError("unknown command '%s'" % command.decode('utf-8', 'replace'))
+
+
+class _RedisHandler(socketserver.StreamRequestHandler):
+    """Handles connection of the mock Redis server."""
+    
+    
+    def handle(self):
+        """Processes commands until disconnected."""
+        
+        while True:
+            
+            # read command
+            line = self.rfile.readline()
+            if not line:
+                return
+            
+            args = []
+            for i in range(int(line[1:-2])):
+                size = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(size + 2)[:-2])
+            
+            # execute
+            reply = self.server.mock.execute(args)
+            self.wfile.write(_encode_reply(reply))
+
+
+def _encode_reply(reply):
+    """Encodes reply by the Redis protocol."""
+    
+    if reply is None:
+        return b"$-1\r\n"
+    
+    if isinstance(reply, ValueError):
+        return b"-ERR %s\r\n" % str(reply).encode('utf-8')
+    
+    if isinstance(reply, int):
+        return b":%d\r\n" % reply
+    
+    if isinstance(reply, list):
+        return b"*%d\r\n" % len(reply) + b"".join(_encode_reply(x) for x in reply)
+    
+    return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+
+def main():
+    """Runs mock server from command line."""
+    
+    parser = argparse.ArgumentParser(description="Local mock of the Rebrickable v3 API.")
+    parser.add_argument('--host', default="127.0.0.1", help="host name to listen at")
+    parser.add_argument('--port', type=int, default=8000, help="port to listen at")
+    parser.add_argument('--parts', type=int, default=1000, help="number of parts")
+    parser.add_argument('--colors', type=int, default=50, help="number of colors")
+    parser.add_argument('--sets', type=int, default=200, help="number of sets")
+    parser.add_argument('--themes', type=int, default=30, help="number of themes")
+    parser.add_argument('--set-size', type=int, default=100, help="maximum number of elements in a set")
+    parser.add_argument('--rate', type=float, default=None, help="maximum requests per second for each key")
+    parser.add_argument('--burst', type=int, default=1, help="number of requests allowed at once")
+    parser.add_argument('--latency', type=float, default=0, help="simulated latency in seconds")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    args = parser.parse_args()
+    
+    catalogue = Catalogue(
+        parts = args.parts,
+        colors = args.colors,
+        sets = args.sets,
+        themes = args.themes,
+        set_size = args.set_size,
+        seed = args.seed)
+    
+    server = MockServer(
+        catalogue = catalogue,
+        host = args.host,
+        port = args.port,
+        rate_limit = args.rate,
+        burst = args.burst,
+        latency = args.latency)
+    
+    print("Serving Rebrickable mock API at %s" % server.url)
+    
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import random
+import zlib
+
+# define hashing constants
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+class SimilarityIndex(object):
+    """
+    Provides fast search for similar inventories using MinHash signatures of
+    (part, color) keys. Signatures are split into bands hashed into buckets
+    (locality-sensitive hashing) so that only inventories sharing at least one
+    bucket are compared by their Jaccard similarity.
+    """
+    
+    
+    def __init__(self, num_perm=128, bands=32, seed=1):
+        """
+        Initializes a new instance of rebrick.SimilarityIndex.
+        
+        Args:
+            num_perm: int
+                Number of MinHash permutations.
+            
+            bands: int
+                Number of LSH bands. The number of permutations must be
+                divisible by the number of bands. More bands find less similar
+                candidates at the cost of more comparisons.
+            
+            seed: int
+                Random seed for permutations.
+        """
+        
+        super().__init__()
+        
+        # check bands
+        if num_perm % bands:
+            raise ValueError("Number of permutations must be divisible by number of bands!")
+        
+        self._rows = num_perm // bands
+        self._bands = bands
+        
+        # init permutations
+        rand = random.Random(seed)
+        self._perms = [(rand.randrange(1, _PRIME), rand.randrange(0, _PRIME)) for i in range(num_perm)]
+        
+        self._keys = {}
+        self._signatures = {}
+        self._buckets = [{} for i in range(bands)]
+    
+    
+    def __contains__(self, set_id):
+        """Checks whether given set ID is indexed."""
+        
+        return set_id in self._keys
+    
+    
+    def __len__(self):
+        """Gets number of indexed inventories."""
+        
+        return len(self._keys)
+    
+    
+    def add(self, set_id, elements, spares=False):
+        """
+        Adds or replaces inventory of given set.
+        
+        Args:
+            set_id: str or int
+                Rebrickable set ID.
+            
+            elements: (rebrick.Element,) or ((str, str),)
+                Set inventory, typically retrieved by
+                rebrick.Rebrick.get_set_elements(), or (part ID, color ID)
+                keys directly.
+            
+            spares: bool
+                If set to True spare elements are included.
+        """
+        
+        # remove previous
+        if set_id in self._keys:
+            self.remove(set_id)
+        
+        # get keys
+        keys = make_keys(elements, spares)
+        signature = self.get_signature(keys)
+        
+        # store inventory
+        self._keys[set_id] = keys
+        self._signatures[set_id] = signature
+        
+        # add to buckets
+        for band, buckets in zip(self._get_bands(signature), self._buckets):
+            buckets.setdefault(band, set()).add(set_id)
+    
+    
+    def remove(self, set_id):
+        """
+        Removes inventory of given set.
+        
+        Args:
+            set_id: str or int
+                Rebrickable set ID.
+        """
+        
+        del self._keys[set_id]
+        signature = self._signatures.pop(set_id)
+        
+        # remove from buckets
+        for band, buckets in zip(self._get_bands(signature), self._buckets):
+            bucket = buckets[band]
+            bucket.discard(set_id)
+            if not bucket:
+                del buckets[band]
+    
+    
+    def query(self, elements, count=10, spares=False):
+        """
+        Gets the most similar indexed inventories to given one.
+        
+        Args:
+            elements: str, int, (rebrick.Element,) or ((str, str),)
+                Indexed set ID or inventory to compare.
+            
+            count: int or None
+                Maximum number of results. If set to None all candidates are
+                returned.
+            
+            spares: bool
+                If set to True spare elements of given inventory are included.
+        
+        Returns:
+            ((str or int, float),)
+                Set IDs with Jaccard similarity ordered from the most similar.
+        """
+        
+        # get indexed inventory
+        if isinstance(elements, (str, int)):
+            set_id = elements
+            keys = self._keys[set_id]
+            signature = self._signatures[set_id]
+        
+        # make new inventory
+        else:
+            set_id = None
+            keys = make_keys(elements, spares)
+            signature = self.get_signature(keys)
+        
+        # get candidates
+        candidates = set()
+        for band, buckets in zip(self._get_bands(signature), self._buckets):
+            candidates.update(buckets.get(band, ()))
+        
+        candidates.discard(set_id)
+        
+        # calc similarity
+        results = [(c, jaccard(keys, self._keys[c])) for c in candidates]
+        results.sort(key=lambda x: x[1], reverse=True)
+        
+        return tuple(results[:count] if count is not None else results)
+    
+    
+    def get_signature(self, keys):
+        """
+        Calculates MinHash signature for given keys.
+        
+        Args:
+            keys: {(str, str)}
+                Unique inventory keys.
+        
+        Returns:
+            (int,)
+                MinHash signature.
+        """
+        
+        hashes = [zlib.crc32(("%s|%s" % k).encode('utf-8')) for k in keys]
+        
+        # empty inventory
+        if not hashes:
+            return tuple(_MAX_HASH for x in self._perms)
+        
+        return tuple(min((a*h + b) % _PRIME for h in hashes) & _MAX_HASH for a, b in self._perms)
+    
+    
+    def _get_bands(self, signature):
+        """Splits signature into band keys."""
+        
+        rows = self._rows
+        return [hash(signature[i:i+rows]) for i in range(0, len(signature), rows)]
+
+
+def make_keys(elements, spares=False):
+    """
+    Converts inventory into a set of unique (part ID, color ID) keys.
+    
+    Args:
+        elements: (rebrick.Element,) or ((str, str),)
+            Set inventory or keys directly.
+        
+        spares: bool
+            If set to True spare elements are included.
+    
+    Returns:
+        frozenset
+            Unique inventory keys.
+    """
+    
+    keys = set()
+    
+    for item in elements:
+        
+        # use key directly
+        if isinstance(item, tuple):
+            keys.add((str(item[0]), str(item[1])))
+            continue
+        
+        # skip spares
+        if item.is_spare and not spares:
+            continue
+        
+        keys.add((str(item.part.part_id), str(item.color.color_id)))
+    
+    return frozenset(keys)
+
+
+def jaccard(keys1, keys2):
+    """
+    Calculates Jaccard similarity of two key sets.
+    
+    Args:
+        keys1: {(str, str)}
+            First inventory keys.
+        
+        keys2: {(str, str)}
+            Second inventory keys.
+    
+    Returns:
+        float
+            Jaccard similarity.
+    """
+    
+    union = len(keys1 | keys2)
+    return len(keys1 & keys2) / union if union else 0.
@@ -0,0 +1,607 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import os
+import sys
+import json
+import mmap
+import array
+import struct
+import threading
+from .objects import COLL_SET, Collection, Color, Part
+
+# define file format
+_MAGIC = b"RBSNAP\x00\x01"
+_HEADER = struct.Struct("<8sBxHQQ")
+_TABLE = struct.Struct("<16sQQ")
+_ALIGN = 8
+
+# define null values
+_NULL_INT = -2**31
+_NULL_BOOL = 255
+_NULL_STR = 2**32 - 1
+
+# define column types
+_INT = 'i'
+_BOOL = 'b'
+_STR = 's'
+_JSON = 'j'
+
+_ARRAY_TYPES = {_INT: 'i', _BOOL: 'B', _STR: 'I', _JSON: 'I'}
+
+# define tables (key column first)
+_SCHEMAS = {
+    'colors': (
+        ('color_id', _INT),
+        ('name', _STR),
+        ('rgb', _STR),
+        ('is_trans', _BOOL),
+        ('external_names', _JSON),
+        ('external_ids', _JSON)),
+    
+    'parts': (
+        ('part_id', _STR),
+        ('category_id', _INT),
+        ('name', _STR),
+        ('year_from', _INT),
+        ('year_to', _INT),
+        ('url', _STR),
+        ('img_url', _STR),
+        ('print_of', _STR),
+        ('external_ids', _JSON),
+        ('prints', _JSON),
+        ('molds', _JSON),
+        ('alternates', _JSON)),
+    
+    'sets': (
+        ('collection_id', _STR),
+        ('theme_id', _INT),
+        ('name', _STR),
+        ('year', _INT),
+        ('pieces', _INT),
+        ('url', _STR),
+        ('img_url', _STR))}
+
+_FACTORIES = {
+    'colors': Color,
+    'parts': Part,
+    'sets': lambda **attrs: Collection(type=COLL_SET, **attrs)}
+
+
+class Snapshot(object):
+    """
+    Provides read-only access to catalogue snapshot created by
+    rebrick.write_snapshot(). The file is memory-mapped, so opening is
+    immediate regardless of its size, field values are read directly from the
+    mapped columns and rebrick.Part, rebrick.Color or rebrick.Collection
+    objects are created only when requested. As the mapping is read-only, its
+    pages are shared by all processes (e.g. forked workers) using the same
+    file.
+    """
+    
+    
+    def __init__(self, path):
+        """
+        Initializes a new instance of rebrick.Snapshot.
+        
+        Args:
+            path: str
+                Path to the snapshot file.
+        
+        Raises:
+            ValueError
+                If the file is not a valid snapshot.
+        """
+        
+        super().__init__()
+        
+        self._tables = {}
+        self._views = []
+        
+        # map file
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        self._buffer = memoryview(self._mmap)
+        
+        try:
+            self._load()
+        except Exception:
+            self.close()
+            raise
+    
+    
+    def __enter__(self):
+        """Enters context."""
+        
+        return self
+    
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Closes snapshot when leaving context."""
+        
+        self.close()
+    
+    
+    @property
+    def colors(self):
+        """
+        Gets colors table.
+        
+        Returns:
+            rebrick.snapshot.SnapshotTable
+                Colors table.
+        """
+        
+        return self._tables['colors']
+    
+    
+    @property
+    def parts(self):
+        """
+        Gets parts table.
+        
+        Returns:
+            rebrick.snapshot.SnapshotTable
+                Parts table.
+        """
+        
+        return self._tables['parts']
+    
+    
+    @property
+    def sets(self):
+        """
+        Gets sets table.
+        
+        Returns:
+            rebrick.snapshot.SnapshotTable
+                Sets table.
+        """
+        
+        return self._tables['sets']
+    
+    
+    def get_color(self, color_id):
+        """
+        Gets color by its ID.
+        
+        Args:
+            color_id: int or str
+                Rebrickable color ID.
+        
+        Returns:
+            rebrick.Color or None
+                Color or None if not found.
+        """
+        
+        return self.colors.get(color_id)
+    
+    
+    def get_part(self, part_id):
+        """
+        Gets part by its ID.
+        
+        Args:
+            part_id: str
+                Rebrickable part ID.
+        
+        Returns:
+            rebrick.Part or None
+                Part or None if not found.
+        """
+        
+        return self.parts.get(part_id)
+    
+    
+    def get_set(self, set_id):
+        """
+        Gets set by its ID.
+        
+        Args:
+            set_id: str
+                Rebrickable set ID.
+        
+        Returns:
+            rebrick.Collection or None
+                Set or None if not found.
+        """
+        
+        return self.sets.get(set_id)
+    
+    
+    def close(self):
+        """Releases the mapped file."""
+        
+        for view in reversed(self._views):
+            view.release()
+        
+        self._views = []
+        self._tables = {}
+        
+        self._buffer.release()
+        
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+    
+    
+    def get_string(self, idx):
+        """Gets string from string table."""
+        
+        if idx == _NULL_STR:
+            return None
+        
+        return str(self._strings[self._offsets[idx]:self._offsets[idx+1]], 'utf-8')
+    
+    
+    def _load(self):
+        """Reads header and maps tables."""
+        
+        # read header
+        if len(self._buffer) < _HEADER.size:
+            raise ValueError("Invalid snapshot file!")
+        
+        magic, byteorder, count, strings_offset, strings_count = _HEADER.unpack_from(self._buffer)
+        
+        if magic != _MAGIC:
+            raise ValueError("Invalid snapshot file! --> %s" % magic)
+        
+        if byteorder != (sys.byteorder == 'big'):
+            raise ValueError("Snapshot created with different byte order!")
+        
+        # map string table
+        size = (strings_count + 1) * 4
+        self._offsets = self._map(strings_offset, size, 'I')
+        self._strings = self._map(strings_offset + size, len(self._buffer) - strings_offset - size, None)
+        
+        # map tables
+        for i in range(count):
+            
+            name, rows, offset = _TABLE.unpack_from(self._buffer, _HEADER.size + i * _TABLE.size)
+            name = name.rstrip(b"\x00").decode('ascii')
+            
+            schema = _SCHEMAS.get(name, None)
+            if schema is None:
+                continue
+            
+            columns = {}
+            for column, kind in schema:
+                size = rows * array.array(_ARRAY_TYPES[kind]).itemsize
+                columns[column] = self._map(offset, size, _ARRAY_TYPES[kind])
+                offset += _pad(size)
+            
+            index = self._map(offset, rows * 4, 'I')
+            
+            self._tables[name] = SnapshotTable(self, name, rows, columns, index)
+        
+        # add missing tables
+        for name in _SCHEMAS:
+            if name not in self._tables:
+                self._tables[name] = SnapshotTable(self, name, 0, {}, ())
+    
+    
+    def _map(self, offset, size, fmt):
+        """Gets view of given part of the file."""
+        
+        if offset + size > len(self._buffer):
+            raise ValueError("Truncated snapshot file!")
+        
+        view = self._buffer[offset:offset+size]
+        self._views.append(view)
+        
+        if fmt is not None:
+            view = view.cast(fmt)
+            self._views.append(view)
+        
+        return view
+
+
+class SnapshotTable(object):
+    """
+    Represents single table of rebrick.Snapshot. Rows are looked up by their
+    key (e.g. part ID) using the sorted index, field values are read directly
+    from the mapped columns.
+    """
+    
+    
+    def __init__(self, snapshot, name, rows, columns, index):
+        """Initializes a new instance of rebrick.snapshot.SnapshotTable."""
+        
+        super().__init__()
+        
+        self._snapshot = snapshot
+        self._name = name
+        self._rows = rows
+        self._columns = columns
+        self._index = index
+        self._schema = dict(_SCHEMAS[name])
+        self._key, self._key_type = _SCHEMAS[name][0]
+        self._factory = _FACTORIES[name]
+    
+    
+    def __len__(self):
+        """Gets number of rows."""
+        
+        return self._rows
+    
+    
+    def __contains__(self, key):
+        """Checks whether given key exists."""
+        
+        return self.find(key) is not None
+    
+    
+    def __iter__(self):
+        """Iterates through all objects in key order."""
+        
+        for row in self._index:
+            yield self.get_row(row)
+    
+    
+    def keys(self):
+        """
+        Gets all keys in sorted order.
+        
+        Returns:
+            (str or int,)
+                Table keys.
+        """
+        
+        return [self.get_field(r, self._key) for r in self._index]
+    
+    
+    def find(self, key):
+        """
+        Gets row of given key.
+        
+        Args:
+            key: str or int
+                Row key (e.g. part ID).
+        
+        Returns:
+            int or None
+                Row number or None if not found.
+        """
+        
+        # convert key
+        try:
+            key = int(key) if self._key_type == _INT else str(key)
+        except ValueError:
+            return None
+        
+        # search index
+        lo, hi = 0, self._rows
+        while lo < hi:
+            
+            mid = (lo + hi) // 2
+            row = self._index[mid]
+            value = self.get_field(row, self._key)
+            
+            if value == key:
+                return row
+            
+            if value < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        
+        return None
+    
+    
+    def get(self, key):
+        """
+        Gets object of given key.
+        
+        Args:
+            key: str or int
+                Row key (e.g. part ID).
+        
+        Returns:
+            rebrick.Part, rebrick.Color, rebrick.Collection or None
+                Object or None if not found.
+        """
+        
+        row = self.find(key)
+        if row is None:
+            return None
+        
+        return self.get_row(row)
+    
+    
+    def get_value(self, key, name):
+        """
+        Gets single field value of given key without creating the object.
+        
+        Args:
+            key: str or int
+                Row key (e.g. part ID).
+            
+            name: str
+                Field name (e.g. 'name').
+        
+        Returns:
+            any
+                Field value or None if not found.
+        """
+        
+        row = self.find(key)
+        if row is None:
+            return None
+        
+        return self.get_field(row, name)
+    
+    
+    def get_row(self, row):
+        """Creates object from given row."""
+        
+        attrs = {n: self.get_field(row, n) for n in self._columns}
+        return self._factory(**attrs)
+    
+    
+    def get_field(self, row, name):
+        """Gets field value from given row."""
+        
+        kind = self._schema.get(name, None)
+        if kind is None:
+            raise KeyError("Unknown field! --> %s" % name)
+        
+        value = self._columns[name][row]
+        
+        if kind == _INT:
+            return None if value == _NULL_INT else value
+        
+        if kind == _BOOL:
+            return None if value == _NULL_BOOL else bool(value)
+        
+        if kind == _STR:
+            return self._snapshot.get_string(value)
+        
+        value = self._snapshot.get_string(value)
+        return json.loads(value) if value is not None else None
+
+
+def write_snapshot(path, colors=(), parts=(), sets=()):
+    """
+    Writes catalogue snapshot to be opened by rebrick.Snapshot. The file is
+    replaced atomically so that processes using previous version keep
+    reading it until reopened.
+    
+    Args:
+        path: str
+            Path to the snapshot file.
+        
+        colors: (rebrick.Color,)
+            Colors, e.g. retrieved by rebrick.Rebrick.get_colors().
+        
+        parts: (rebrick.Part,)
+            Parts, e.g. retrieved by rebrick.Rebrick.get_parts().
+        
+        sets: (rebrick.Collection,)
+            Sets, e.g. retrieved by rebrick.Rebrick.get_sets().
+    """
+    
+    strings = _StringTable()
+    tables = []
+    
+    # encode tables
+    for name, items in (('colors', colors), ('parts', parts), ('sets', sets)):
+        
+        schema = _SCHEMAS[name]
+        key, key_type = schema[0]
+        convert = int if key_type == _INT else str
+        
+        # remove duplicates
+        items = {convert(getattr(x, key)): x for x in items if getattr(x, key) is not None}
+        keys = list(items.keys())
+        items = list(items.values())
+        
+        # encode columns
+        columns = []
+        for column, kind in schema:
+            values = [getattr(x, column) for x in items]
+            columns.append(_encode_column(kind, values, strings))
+        
+        # make index
+        index = array.array('I', sorted(range(len(items)), key=keys.__getitem__))
+        
+        tables.append((name, len(items), columns + [index]))
+    
+    # make layout
+    offset = _pad(_HEADER.size + len(tables) * _TABLE.size)
+    directory = []
+    
+    for name, rows, columns in tables:
+        directory.append(_TABLE.pack(name.encode('ascii'), rows, offset))
+        offset += sum(_pad(len(c) * c.itemsize) for c in columns)
+    
+    # write file
+    temp = "%s.%s.%s.tmp" % (path, os.getpid(), threading.get_ident())
+    
+    with open(temp, 'wb') as f:
+        
+        f.write(_HEADER.pack(_MAGIC, sys.byteorder == 'big', len(tables), offset, len(strings)))
+        f.write(b"".join(directory))
+        _write_padding(f)
+        
+        for name, rows, columns in tables:
+            for column in columns:
+                column.tofile(f)
+                _write_padding(f)
+        
+        strings.write(f)
+    
+    os.replace(temp, path)
+
+
+class _StringTable(object):
+    """Collects unique strings."""
+    
+    
+    def __init__(self):
+        
+        super().__init__()
+        
+        self._ids = {}
+        self._data = []
+    
+    
+    def __len__(self):
+        """Gets number of strings."""
+        
+        return len(self._data)
+    
+    
+    def add(self, value):
+        """Adds string and gets its ID."""
+        
+        if value is None:
+            return _NULL_STR
+        
+        idx = self._ids.get(value, None)
+        if idx is None:
+            idx = len(self._data)
+            self._ids[value] = idx
+            self._data.append(value.encode('utf-8'))
+        
+        return idx
+    
+    
+    def write(self, stream):
+        """Writes offsets and data."""
+        
+        offsets = array.array('I', [0])
+        for data in self._data:
+            offsets.append(offsets[-1] + len(data))
+        
+        offsets.tofile(stream)
+        stream.write(b"".join(self._data))
+
+
+def _encode_column(kind, values, strings):
+    """Converts values into column array."""
+    
+    if kind == _INT:
+        return array.array('i', (_NULL_INT if v is None else int(v) for v in values))
+    
+    if kind == _BOOL:
+        return array.array('B', (_NULL_BOOL if v is None else int(bool(v)) for v in values))
+    
+    if kind == _STR:
+        return array.array('I', (strings.add(None if v is None else str(v)) for v in values))
+    
+    return array.array('I', (strings.add(None if v is None else json.dumps(v, separators=(',', ':'))) for v in values))
+
+
+def _pad(size):
+    """Gets size aligned to column boundary."""
+    
+    return (size + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _write_padding(stream):
+    """Aligns stream position to column boundary."""
+    
+    position = stream.tell()
+    stream.write(b"\x00" * (_pad(position) - position))
@@ -0,0 +1,265 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import re
+import json
+import codecs
+from . import config
+from .request import decode_json
+
+# define patterns
+_RESULTS_PATTERN = re.compile(r'"results"\s*:\s*\[')
+_SPACE_PATTERN = re.compile(r'[\s,]*')
+
+# init decoder of single items
+_DECODER = json.JSONDecoder()
+
+# define default chunk size
+CHUNK_SIZE = 65536
+
+# define default maximum size of page decoded at once
+BUFFER_SIZE = 262144
+
+
+class ResultsReader(object):
+    """
+    Provides incremental parsing of paged server response. Items of the
+    'results' array are decoded one by one as soon as their data arrive, so
+    they can be processed before the whole page is received and the full page
+    is never kept in memory. Remaining values (e.g. 'next' or 'count') are
+    available by key once the results are consumed, so the reader can be used
+    in place of the decoded page.
+    
+    Items are decoded directly from growing text buffer by the standard json
+    decoder, unless custom decoder is set to rebrick.config.JSON_DECODER.
+    Pages whose Content-Length does not exceed the buffer size are read and
+    decoded at once and only larger pages are parsed incrementally.
+    """
+    
+    
+    def __init__(self, response, chunk_size=CHUNK_SIZE, buffer_size=BUFFER_SIZE):
+        """
+        Initializes a new instance of rebrick.ResultsReader.
+        
+        Args:
+            response: http.client.HTTPResponse
+                Server response.
+            
+            chunk_size: int
+                Size of data chunks to read in bytes.
+            
+            buffer_size: int
+                Maximum known size of page to be decoded at once in bytes.
+                If set to 0, pages are always parsed incrementally.
+        """
+        
+        super().__init__()
+        
+        self._response = response
+        self._chunk_size = chunk_size
+        self._buffer_size = buffer_size
+        
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        
+        self._head = None
+        self._data = None
+        self._started = False
+    
+    
+    def __getitem__(self, key):
+        """Gets results iterator or other page value."""
+        
+        if key == 'results':
+            return self.results()
+        
+        return self.data[key]
+    
+    
+    def get(self, key, default=None):
+        """Gets page value or default."""
+        
+        if key == 'results':
+            return self.results()
+        
+        return self.data.get(key, default)
+    
+    
+    @property
+    def data(self):
+        """
+        Gets page values except results. Unread results are skipped.
+        
+        Returns:
+            dict
+                Page values.
+        """
+        
+        # skip remaining results
+        if self._data is None:
+            for item in self._iter_items(decode=False):
+                pass
+        
+        return self._data
+    
+    
+    def results(self):
+        """
+        Iterates over decoded results. Results can only be read once.
+        
+        Yields:
+            dict
+                Decoded result item.
+        """
+        
+        if self._started:
+            raise ValueError("Results have already been read!")
+        
+        return self._iter_items(decode=True)
+    
+    
+    def _iter_items(self, decode):
+        """Reads items from the results array."""
+        
+        self._started = True
+        
+        # decode small page at once
+        if self._is_small():
+            
+            data = decode_json(self._response.read())
+            results = data.get('results', None) if isinstance(data, dict) else None
+            
+            if results is not None:
+                data['results'] = []
+            
+            self._data = data
+            self._eof = True
+            
+            if decode and results:
+                yield from results
+            
+            return
+        
+        # read head
+        if not self._read_head():
+            return
+        
+        while True:
+            
+            # skip separators
+            while True:
+                self._pos = _SPACE_PATTERN.match(self._buffer, self._pos).end()
+                if self._pos < len(self._buffer) or not self._read():
+                    break
+            
+            # end of results
+            if self._buffer[self._pos:self._pos+1] == "]":
+                self._pos += 1
+                self._read_tail()
+                return
+            
+            # read item
+            item, end = self._decode_item(decode)
+            
+            if decode:
+                yield item
+            
+            self._pos = end
+    
+    
+    def _is_small(self):
+        """Checks whether whole page fits into buffer."""
+        
+        if not self._buffer_size:
+            return False
+        
+        headers = getattr(self._response, 'headers', None)
+        if headers is None:
+            return False
+        
+        try:
+            return int(headers.get('Content-Length')) <= self._buffer_size
+        except (TypeError, ValueError):
+            return False
+    
+    
+    def _read(self):
+        """Reads next chunk of data."""
+        
+        if self._eof:
+            return False
+        
+        chunk = self._response.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            self._buffer += self._decoder.decode(b"", True)
+            return False
+        
+        # drop consumed data
+        if self._pos:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        
+        self._buffer += self._decoder.decode(chunk)
+        
+        return True
+    
+    
+    def _read_head(self):
+        """Reads data up to the results array."""
+        
+        while True:
+            
+            # find results
+            match = _RESULTS_PATTERN.search(self._buffer)
+            if match:
+                self._head = self._buffer[:match.end()]
+                self._pos = match.end()
+                return True
+            
+            # read all data if no results
+            if not self._read():
+                self._data = decode_json(self._buffer.encode('utf-8'))
+                self._buffer = ""
+                return False
+    
+    
+    def _read_tail(self):
+        """Reads data after the results array."""
+        
+        while self._read():
+            pass
+        
+        self._data = decode_json((self._head + "]" + self._buffer[self._pos:]).encode('utf-8'))
+        self._buffer = ""
+        self._pos = 0
+    
+    
+    def _decode_item(self, decode):
+        """Decodes current item and gets its end position."""
+        
+        while True:
+            
+            # decode from available data
+            try:
+                item, end = _DECODER.raw_decode(self._buffer, self._pos)
+            
+            # read more of incomplete item
+            except ValueError:
+                if self._read():
+                    continue
+                raise
+            
+            # make sure number is not truncated
+            if end == len(self._buffer) and self._read():
+                continue
+            
+            break
+        
+        # use custom decoder
+        if decode and config.JSON_DECODER is not None:
+            item = config.JSON_DECODER(self._buffer[self._pos:end].encode('utf-8'))
+        
+        return item, end
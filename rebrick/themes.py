@@ -0,0 +1,254 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+
+class ThemeTree(object):
+    """
+    Provides local hierarchy queries over all Rebrickable themes so that
+    ancestors, descendants and theme-based set filtering can be resolved
+    without any further requests.
+    """
+    
+    
+    def __init__(self, themes):
+        """
+        Initializes a new instance of rebrick.ThemeTree.
+        
+        Args:
+            themes: (rebrick.Theme,)
+                All available themes, typically retrieved by
+                rebrick.Rebrick.get_themes().
+        """
+        
+        super().__init__()
+        
+        self._themes = {}
+        self._children = {}
+        self._roots = []
+        
+        self._ancestors = {}
+        self._subtrees = {}
+        
+        # add themes
+        for theme in themes:
+            self._themes[theme.theme_id] = theme
+            self._children.setdefault(theme.theme_id, [])
+        
+        # link children
+        for theme in self._themes.values():
+            if theme.parent_id in self._themes:
+                self._children[theme.parent_id].append(theme)
+            else:
+                self._roots.append(theme)
+    
+    
+    def __contains__(self, theme_id):
+        """Checks whether given theme ID is known."""
+        
+        return _make_id(theme_id) in self._themes
+    
+    
+    def __len__(self):
+        """Gets number of themes."""
+        
+        return len(self._themes)
+    
+    
+    def get_theme(self, theme_id):
+        """
+        Gets theme by its ID.
+        
+        Args:
+            theme_id: str or int
+                Rebrickable theme ID.
+        
+        Returns:
+            rebrick.Theme or None
+                Theme details.
+        """
+        
+        return self._themes.get(_make_id(theme_id), None)
+    
+    
+    def get_roots(self):
+        """
+        Gets all top-level themes.
+        
+        Returns:
+            (rebrick.Theme,)
+                Top-level themes.
+        """
+        
+        return tuple(self._roots)
+    
+    
+    def get_parent(self, theme_id):
+        """
+        Gets parent of given theme.
+        
+        Args:
+            theme_id: str or int
+                Rebrickable theme ID.
+        
+        Returns:
+            rebrick.Theme or None
+                Parent theme.
+        """
+        
+        theme = self._themes[_make_id(theme_id)]
+        return self._themes.get(theme.parent_id, None)
+    
+    
+    def get_children(self, theme_id):
+        """
+        Gets direct children of given theme.
+        
+        Args:
+            theme_id: str or int
+                Rebrickable theme ID.
+        
+        Returns:
+            (rebrick.Theme,)
+                Child themes.
+        """
+        
+        return tuple(self._children[_make_id(theme_id)])
+    
+    
+    def get_ancestors(self, theme_id, include_self=True):
+        """
+        Gets hierarchy of themes from the top-level theme down to given one.
+        
+        Args:
+            theme_id: str or int
+                Rebrickable theme ID.
+            
+            include_self: bool
+                If set to True given theme is included as last item.
+        
+        Returns:
+            (rebrick.Theme,)
+                Theme hierarchy.
+        """
+        
+        theme_id = _make_id(theme_id)
+        
+        # get from cache
+        ancestors = self._ancestors.get(theme_id, None)
+        
+        # walk up the tree
+        if ancestors is None:
+            
+            ancestors = []
+            current = self._themes[theme_id]
+            
+            while current is not None:
+                ancestors.insert(0, current)
+                current = self._themes.get(current.parent_id, None)
+            
+            ancestors = tuple(ancestors)
+            self._ancestors[theme_id] = ancestors
+        
+        return ancestors if include_self else ancestors[:-1]
+    
+    
+    def get_descendants(self, theme_id, include_self=False):
+        """
+        Gets all themes below given theme.
+        
+        Args:
+            theme_id: str or int
+                Rebrickable theme ID.
+            
+            include_self: bool
+                If set to True given theme is included as first item.
+        
+        Returns:
+            (rebrick.Theme,)
+                Descendant themes.
+        """
+        
+        theme_id = _make_id(theme_id)
+        
+        themes = [self._themes[theme_id]]
+        i = 0
+        
+        while i < len(themes):
+            themes.extend(self._children[themes[i].theme_id])
+            i += 1
+        
+        return tuple(themes if include_self else themes[1:])
+    
+    
+    def get_subtree_ids(self, theme_id):
+        """
+        Gets IDs of given theme and all its descendants.
+        
+        Args:
+            theme_id: str or int
+                Rebrickable theme ID.
+        
+        Returns:
+            frozenset
+                Theme IDs.
+        """
+        
+        theme_id = _make_id(theme_id)
+        
+        # get from cache
+        ids = self._subtrees.get(theme_id, None)
+        
+        # collect IDs
+        if ids is None:
+            ids = frozenset(t.theme_id for t in self.get_descendants(theme_id, True))
+            self._subtrees[theme_id] = ids
+        
+        return ids
+    
+    
+    def is_descendant(self, theme_id, parent_id):
+        """
+        Checks whether given theme lies within the subtree of another theme.
+        
+        Args:
+            theme_id: str or int
+                Rebrickable theme ID.
+            
+            parent_id: str or int
+                Rebrickable ID of the potential ancestor theme.
+        
+        Returns:
+            bool
+                True if theme is within the subtree, False otherwise.
+        """
+        
+        return _make_id(theme_id) in self.get_subtree_ids(parent_id)
+    
+    
+    def filter_sets(self, sets, theme_id):
+        """
+        Gets sets belonging to given theme or any of its descendants.
+        
+        Args:
+            sets: (rebrick.Collection,)
+                Sets to filter.
+            
+            theme_id: str or int
+                Rebrickable theme ID.
+        
+        Returns:
+            (rebrick.Collection,)
+                Filtered sets.
+        """
+        
+        ids = self.get_subtree_ids(theme_id)
+        return tuple(s for s in sets if s.theme_id in ids)
+
+
+def _make_id(theme_id):
+    """Converts theme ID into int."""
+    
+    try:
+        return int(theme_id)
+    except (TypeError, ValueError):
+        return theme_id
@@ -0,0 +1,489 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import io
+import re
+import ssl
+import time
+import gzip
+import json
+import base64
+import random
+import socket
+import threading
+import http.client
+import urllib.parse
+import urllib.request
+import urllib.error
+
+# handle SSL certificate
+_SSL_CONTEXT = ssl._create_unverified_context()
+
+# define redaction
+_REDACTED = "REDACTED"
+_SECRET_PARAMETERS = ('key', 'username', 'password')
+_SECRET_FIELDS = ('key', 'user_token', 'password')
+_USER_TOKEN_PATTERN = re.compile(r"(/users/)(?!_token/)([^/?]+)(/)")
+_MIN_SECRET_SIZE = 8
+
+
+class Transport(object):
+    """
+    Defines the interface of transports used to send requests. Custom
+    transport can be set by rebrick.request.set_transport().
+    """
+    
+    
+    def open(self, url, data=None, headers=None, timeout=None):
+        """
+        Sends request and gets server response.
+        
+        Args:
+            url: str
+                Full request URL.
+            
+            data: bytes or None
+                POST data. If set to None GET request is sent.
+            
+            headers: {str: str} or None
+                Additional request headers.
+            
+            timeout: float or None
+                Timeout in seconds.
+        
+        Returns:
+            http.client.HTTPResponse or rebrick.transport.Response
+                Server response.
+        
+        Raises:
+            urllib.error.HTTPError
+                For error status codes.
+        """
+        
+        raise NotImplementedError()
+
+
+class UrllibTransport(Transport):
+    """Sends requests by urllib."""
+    
+    
+    def open(self, url, data=None, headers=None, timeout=None):
+        """Sends request and gets server response."""
+        
+        request = urllib.request.Request(url, data=data, headers=headers or {})
+        
+        if timeout is None:
+            return urllib.request.urlopen(request, context=_SSL_CONTEXT)
+        
+        return urllib.request.urlopen(request, timeout=timeout, context=_SSL_CONTEXT)
+
+
+class UnixSocketTransport(Transport):
+    """
+    Sends requests over Unix socket, e.g. to local rebrick.proxy.ProxyServer.
+    Host of the request URL is ignored.
+    """
+    
+    
+    def __init__(self, path):
+        """
+        Initializes a new instance of rebrick.UnixSocketTransport.
+        
+        Args:
+            path: str
+                Path of the socket.
+        """
+        
+        super().__init__()
+        
+        self._path = path
+    
+    
+    def open(self, url, data=None, headers=None, timeout=None):
+        """Sends request and gets server response."""
+        
+        parts = urllib.parse.urlsplit(url)
+        target = urllib.parse.urlunsplit(("", "", parts.path, parts.query, ""))
+        
+        headers = dict(headers or {})
+        if data is not None:
+            headers.setdefault('Content-Type', "application/x-www-form-urlencoded")
+        
+        # send request
+        connection = _UnixConnection(self._path, timeout)
+        connection.request("GET" if data is None else "POST", target, body=data, headers=headers)
+        response = connection.getresponse()
+        
+        # check status
+        if response.status >= 400:
+            body = response.read()
+            connection.close()
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(body))
+        
+        return response
+
+
+class Response(io.BytesIO):
+    """
+    Represents in-memory server response. Responses served from cache after
+    their expiration are marked as stale.
+    """
+    
+    
+    def __init__(self, body, status=200, headers=None, url=None, stale=False):
+        """
+        Initializes a new instance of rebrick.transport.Response.
+        
+        Args:
+            body: bytes
+                Response data.
+            
+            status: int
+                HTTP status code.
+            
+            headers: {str: str} or None
+                Response headers.
+            
+            url: str or None
+                Request URL.
+            
+            stale: bool
+                Specifies whether the data are stale.
+        """
+        
+        super().__init__(body)
+        
+        self.status = status
+        self.url = url
+        self.stale = stale
+        self.headers = _make_headers(headers)
+    
+    
+    def getcode(self):
+        """Gets HTTP status code."""
+        
+        return self.status
+    
+    
+    def geturl(self):
+        """Gets request URL."""
+        
+        return self.url
+
+
+class RecordingTransport(Transport):
+    """
+    Sends requests by another transport and records all responses so that
+    they can be replayed later by rebrick.ReplayTransport. API keys, user
+    tokens and credentials are redacted from recorded requests.
+    """
+    
+    
+    def __init__(self, path, transport=None):
+        """
+        Initializes a new instance of rebrick.RecordingTransport.
+        
+        Args:
+            path: str
+                Path of the archive file to create.
+            
+            transport: rebrick.Transport or None
+                Transport to send requests. If set to None urllib is used.
+        """
+        
+        super().__init__()
+        
+        self._path = path
+        self._transport = transport or UrllibTransport()
+        self._records = []
+        self._lock = threading.Lock()
+    
+    
+    def __enter__(self):
+        """Enters context."""
+        
+        return self
+    
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Saves archive when leaving context."""
+        
+        self.save()
+    
+    
+    def open(self, url, data=None, headers=None, timeout=None):
+        """Sends request and records server response."""
+        
+        # send request
+        try:
+            response = self._transport.open(url, data, headers, timeout)
+            status = response.status
+            body = response.read()
+            response_headers = dict(response.headers.items())
+            response.close()
+        
+        except urllib.error.HTTPError as e:
+            status = e.code
+            body = e.read()
+            response_headers = dict(e.headers.items()) if e.headers else {}
+        
+        # redact secrets in body (e.g. key within next page URL)
+        recorded = redact_body(body, _get_secrets(url, data))
+        
+        recorded_headers = response_headers
+        if recorded != body:
+            recorded_headers = {k: v for k, v in response_headers.items() if k.lower() != 'content-length'}
+        
+        # store record
+        with self._lock:
+            self._records.append({
+                'url': redact(url),
+                'data': redact_data(data),
+                'status': status,
+                'headers': recorded_headers,
+                'body': base64.b64encode(recorded).decode('ascii')})
+        
+        # make response
+        if status >= 400:
+            raise urllib.error.HTTPError(url, status, http.client.responses.get(status, ""), _make_headers(response_headers), io.BytesIO(body))
+        
+        return Response(body, status, response_headers, url)
+    
+    
+    def save(self):
+        """Saves all recorded responses into the archive."""
+        
+        with self._lock:
+            with gzip.open(self._path, 'wt', encoding='utf-8') as f:
+                for record in self._records:
+                    f.write(json.dumps(record, separators=(',', ':')))
+                    f.write("\n")
+
+
+class ReplayTransport(Transport):
+    """
+    Serves responses previously recorded by rebrick.RecordingTransport
+    without any network access. Repeated requests are answered by recorded
+    responses in the original order, the last one being reused.
+    """
+    
+    
+    def __init__(self, path, latency=0, jitter=0):
+        """
+        Initializes a new instance of rebrick.ReplayTransport.
+        
+        Args:
+            path: str
+                Path of the archive file.
+            
+            latency: float
+                Simulated latency of each request in seconds.
+            
+            jitter: float
+                Maximum random latency added to each request in seconds.
+        """
+        
+        super().__init__()
+        
+        self._latency = latency
+        self._jitter = jitter
+        self._records = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+        
+        # load records
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                key = (record['url'], record['data'])
+                self._records.setdefault(key, []).append(record)
+    
+    
+    def open(self, url, data=None, headers=None, timeout=None):
+        """Gets recorded server response."""
+        
+        key = (redact(url), redact_data(data))
+        
+        # get record
+        with self._lock:
+            
+            records = self._records.get(key, None)
+            if not records:
+                raise urllib.error.URLError("No recorded response! --> %s" % key[0])
+            
+            idx = self._counts.get(key, 0)
+            self._counts[key] = idx + 1
+            record = records[min(idx, len(records) - 1)]
+        
+        # simulate latency
+        delay = self._latency + random.uniform(0, self._jitter)
+        if delay > 0:
+            time.sleep(delay)
+        
+        # make response
+        body = base64.b64decode(record['body'])
+        status = record['status']
+        
+        if status >= 400:
+            raise urllib.error.HTTPError(url, status, http.client.responses.get(status, ""), _make_headers(record['headers']), io.BytesIO(body))
+        
+        return Response(body, status, record['headers'], url)
+
+
+def redact(url):
+    """
+    Removes API key, user token and credentials from given URL.
+    
+    Args:
+        url: str
+            Request URL.
+    
+    Returns:
+        str
+            Redacted URL.
+    """
+    
+    url = _USER_TOKEN_PATTERN.sub(r"\1%s\3" % _REDACTED, url)
+    
+    # redact query
+    parts = urllib.parse.urlsplit(url)
+    if not parts.query:
+        return url
+    
+    query = urllib.parse.urlencode(_redact_parameters(parts.query), doseq=True)
+    return urllib.parse.urlunsplit(parts._replace(query=query))
+
+
+def redact_data(data):
+    """
+    Removes API key and credentials from given POST data.
+    
+    Args:
+        data: bytes or None
+            POST data.
+    
+    Returns:
+        str or None
+            Redacted data.
+    """
+    
+    if data is None:
+        return None
+    
+    return urllib.parse.urlencode(_redact_parameters(data.decode('utf-8')), doseq=True)
+
+
+def redact_body(body, secrets=()):
+    """
+    Removes secrets from given response body. JSON bodies are redacted
+    structurally, i.e. values of secret fields (e.g. 'user_token') are
+    replaced and known secrets are removed from all strings. Other bodies are
+    redacted by replacing known secrets long enough not to match by chance.
+    
+    Args:
+        body: bytes
+            Response body.
+        
+        secrets: (str,)
+            Known secret values (e.g. API key).
+    
+    Returns:
+        bytes
+            Redacted body.
+    """
+    
+    secrets = [s for s in secrets if len(s) >= _MIN_SECRET_SIZE]
+    
+    # redact JSON
+    try:
+        data = json.loads(body)
+    except ValueError:
+        data = None
+    
+    if isinstance(data, (dict, list)):
+        data = _redact_json(data, secrets)
+        return json.dumps(data, separators=(',', ':')).encode('utf-8')
+    
+    # redact raw data
+    for secret in secrets:
+        body = body.replace(secret.encode('utf-8'), _REDACTED.encode('utf-8'))
+    
+    return body
+
+
+def _redact_json(data, secrets):
+    """Redacts secrets in parsed JSON data."""
+    
+    if isinstance(data, dict):
+        return {k: _REDACTED if k in _SECRET_FIELDS and isinstance(v, str) else _redact_json(v, secrets) for k, v in data.items()}
+    
+    if isinstance(data, list):
+        return [_redact_json(v, secrets) for v in data]
+    
+    if isinstance(data, str):
+        for secret in secrets:
+            data = data.replace(secret, _REDACTED)
+    
+    return data
+
+
+def _get_secrets(url, data):
+    """Gets secret values from given request."""
+    
+    secrets = set()
+    
+    # get user token
+    match = _USER_TOKEN_PATTERN.search(url)
+    if match:
+        secrets.add(match.group(2))
+    
+    # get parameters
+    query = urllib.parse.urlsplit(url).query
+    if data is not None:
+        query += "&" + data.decode('utf-8')
+    
+    for name, value in urllib.parse.parse_qsl(query):
+        if name in _SECRET_PARAMETERS and value:
+            secrets.add(value)
+    
+    return secrets
+
+
+def _redact_parameters(query):
+    """Parses query and redacts secret values."""
+    
+    parameters = urllib.parse.parse_qsl(query, keep_blank_values=True)
+    return [(k, _REDACTED if k in _SECRET_PARAMETERS else v) for k, v in parameters]
+
+
+def _make_headers(headers):
+    """Converts dict into headers message."""
+    
+    message = http.client.HTTPMessage()
+    
+    for name, value in (headers or {}).items():
+        message[name] = value
+    
+    return message
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    """HTTP connection over Unix socket."""
+    
+    
+    def __init__(self, path, timeout=None):
+        
+        super().__init__("localhost", timeout=timeout)
+        
+        self._path = path
+    
+    
+    def connect(self):
+        """Connects to the socket."""
+        
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        
+        self.sock.connect(self._path)
@@ -10,7 +10,8 @@ with open("README.md", "r") as fh:
     long_description = fh.read()
 
 # include additional files
-package_data = {}
+package_data = {
+    'rebrick': ['data/*.json.gz']}
 
 # set classifiers
 classifiers = [
@@ -20,6 +21,10 @@ classifiers = [
     'Topic :: Utilities',
     'Intended Audience :: Other Audience']
 
+# set scripts
+entry_points = {
+    'console_scripts': ['rebrick-proxy = rebrick.proxy:main']}
+
 # main setup
 setup(
     name = 'rebrick',
@@ -31,8 +36,9 @@ setup(
     author = 'Martin Strohalm',
     author_email = '',
     license = 'MIT',
-    packages = find_packages(),
+    packages = find_packages(exclude=["tests"]),
     package_data = package_data,
     classifiers = classifiers,
     install_requires = [],
+    entry_points = entry_points,
     zip_safe = False)
@@ -0,0 +1,217 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import io
+import time
+import unittest
+import urllib.error
+import concurrent.futures
+import rebrick
+from rebrick import config
+from rebrick import request
+from rebrick.breaker import STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN
+from rebrick.breaker import CircuitBreaker, CircuitOpenError, get_group, is_failure
+from .utils import ClientTestCase
+
+GROUP = "lego/colors"
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    
+    
+    def test_open(self):
+        
+        breaker = CircuitBreaker(threshold=2)
+        
+        breaker.failure(GROUP)
+        self.assertEqual(breaker.get_state(GROUP), STATE_CLOSED)
+        self.assertTrue(breaker.allow(GROUP))
+        
+        breaker.failure(GROUP)
+        self.assertEqual(breaker.get_state(GROUP), STATE_OPEN)
+        self.assertFalse(breaker.allow(GROUP))
+        self.assertTrue(breaker.allow("lego/sets"))
+    
+    
+    def test_success_resets(self):
+        
+        breaker = CircuitBreaker(threshold=2)
+        
+        breaker.failure(GROUP)
+        breaker.success(GROUP)
+        breaker.failure(GROUP)
+        
+        self.assertEqual(breaker.get_state(GROUP), STATE_CLOSED)
+    
+    
+    def test_probe(self):
+        
+        breaker = CircuitBreaker(threshold=1, reset_timeout=0.01)
+        breaker.failure(GROUP)
+        time.sleep(0.02)
+        
+        self.assertEqual(breaker.get_state(GROUP), STATE_HALF_OPEN)
+        self.assertTrue(breaker.allow(GROUP))
+        self.assertFalse(breaker.allow(GROUP))
+        
+        # failed probe reopens
+        breaker.failure(GROUP)
+        self.assertEqual(breaker.get_state(GROUP), STATE_OPEN)
+        
+        # successful probe closes
+        time.sleep(0.02)
+        self.assertTrue(breaker.allow(GROUP))
+        breaker.success(GROUP)
+        self.assertEqual(breaker.get_state(GROUP), STATE_CLOSED)
+    
+    
+    def test_release(self):
+        
+        breaker = CircuitBreaker(threshold=1, reset_timeout=0.01)
+        breaker.failure(GROUP)
+        time.sleep(0.02)
+        
+        self.assertTrue(breaker.allow(GROUP))
+        breaker.release(GROUP)
+        
+        self.assertEqual(breaker.get_state(GROUP), STATE_HALF_OPEN)
+        self.assertTrue(breaker.allow(GROUP))
+    
+    
+    def test_is_failure(self):
+        
+        def error(code):
+            return urllib.error.HTTPError("", code, "", None, io.BytesIO())
+        
+        self.assertTrue(is_failure(error(500)))
+        self.assertTrue(is_failure(error(429)))
+        self.assertTrue(is_failure(urllib.error.URLError("Failed")))
+        self.assertTrue(is_failure(TimeoutError()))
+        self.assertTrue(is_failure(urllib.error.URLError(TimeoutError())))
+        self.assertFalse(is_failure(error(404)))
+        self.assertFalse(is_failure(concurrent.futures.CancelledError()))
+    
+    
+    def test_is_failure_expired(self):
+        
+        self.assertFalse(is_failure(TimeoutError(), expired=True))
+        self.assertFalse(is_failure(urllib.error.URLError(TimeoutError()), expired=True))
+        self.assertTrue(is_failure(urllib.error.URLError("Failed"), expired=True))
+    
+    
+    def test_get_group(self):
+        
+        self.assertEqual(get_group("lego/sets/{id}/parts/"), "lego/sets")
+        self.assertEqual(get_group("users/{token}/sets/"), "users/{token}")
+
+
+class ClientBreakerTest(ClientTestCase):
+    
+    
+    def setUp(self):
+        
+        super().setUp()
+        
+        self.breaker = CircuitBreaker(threshold=2, reset_timeout=0.05)
+        request.set_breaker(self.breaker)
+        
+        self.error = None
+        self.transport.callback = self.fail
+    
+    
+    def fail(self, url):
+        
+        if self.error is not None:
+            raise self.error
+    
+    
+    def open_circuit(self):
+        
+        self.error = urllib.error.URLError("Failed")
+        
+        for i in range(2):
+            with self.assertRaises(urllib.error.URLError):
+                rebrick.Rebrick().get_color(0)
+        
+        self.assertEqual(self.breaker.get_state(GROUP), STATE_OPEN)
+    
+    
+    def test_fail_fast(self):
+        
+        self.open_circuit()
+        
+        with self.assertRaises(CircuitOpenError):
+            rebrick.Rebrick().get_color(0)
+        
+        self.assertEqual(len(self.transport.keys), 2)
+        self.assertIsNone(rebrick.Rebrick(silent=True).get_color(0))
+    
+    
+    def test_recover(self):
+        
+        self.open_circuit()
+        time.sleep(0.06)
+        
+        self.error = None
+        self.assertEqual(rebrick.Rebrick().get_color(0).color_id, 0)
+        self.assertEqual(self.breaker.get_state(GROUP), STATE_CLOSED)
+    
+    
+    def test_not_found_probe(self):
+        
+        self.open_circuit()
+        time.sleep(0.06)
+        
+        self.error = None
+        with self.assertRaises(urllib.error.HTTPError):
+            rebrick.Rebrick().get_color(999999)
+        
+        self.assertEqual(self.breaker.get_state(GROUP), STATE_CLOSED)
+    
+    
+    def test_cancelled_probe(self):
+        
+        self.open_circuit()
+        time.sleep(0.06)
+        
+        # cancelled probe keeps circuit half-open
+        self.error = concurrent.futures.CancelledError()
+        with self.assertRaises(concurrent.futures.CancelledError):
+            rebrick.Rebrick().get_color(0)
+        
+        self.assertEqual(self.breaker.get_state(GROUP), STATE_HALF_OPEN)
+        
+        # probe slot is released
+        self.error = None
+        self.assertEqual(rebrick.Rebrick().get_color(0).color_id, 0)
+        self.assertEqual(self.breaker.get_state(GROUP), STATE_CLOSED)
+    
+    
+    def test_deadline(self):
+        
+        self.server.latency = 0.5
+        
+        # caller's deadline is not upstream failure
+        for i in range(3):
+            with self.assertRaises(TimeoutError):
+                rebrick.Rebrick().get_color(0, timeout=0.05)
+        
+        self.assertEqual(self.breaker.get_state(GROUP), STATE_CLOSED)
+    
+    
+    def test_timeout(self):
+        
+        self.server.latency = 0.5
+        
+        timeout = config.REQUEST_TIMEOUT
+        config.REQUEST_TIMEOUT = 0.05
+        
+        try:
+            for i in range(2):
+                with self.assertRaises(TimeoutError):
+                    rebrick.Rebrick().get_color(0)
+        
+        finally:
+            config.REQUEST_TIMEOUT = timeout
+        
+        self.assertEqual(self.breaker.get_state(GROUP), STATE_OPEN)
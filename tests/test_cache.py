@@ -0,0 +1,269 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import os
+import json
+import unittest
+import tempfile
+import rebrick
+from rebrick import request
+from rebrick.cache import COMPRESS_ZLIB, COMPRESS_ZSTD, DiskCache, ResponseCache, zstandard
+from .utils import ClientTestCase
+
+# define sample page
+DATA = json.dumps({
+    'count': 100,
+    'next': "https://rebrickable.com/api/v3/lego/parts/?page=2&page_size=100",
+    'previous': None,
+    'results': [{'part_num': "300%d" % i, 'name': "Brick 1 x %d" % i, 'part_cat_id': 11} for i in range(100)]}).encode('utf-8')
+
+
+class DiskCacheTest(unittest.TestCase):
+    
+    
+    def setUp(self):
+        
+        self._temp = tempfile.TemporaryDirectory()
+        self.path = self._temp.name
+    
+    
+    def tearDown(self):
+        
+        self._temp.cleanup()
+    
+    
+    def count_objects(self):
+        
+        return len(os.listdir(os.path.join(self.path, "objects")))
+    
+    
+    def test_zlib(self):
+        
+        cache = DiskCache(self.path, compression=COMPRESS_ZLIB)
+        cache.set("key", DATA)
+        
+        self.assertEqual(cache.get("key"), DATA)
+        self.assertEqual(cache.raw_size, len(DATA))
+        self.assertLess(cache.size, len(DATA) / 4)
+    
+    
+    @unittest.skipIf(zstandard is None, "zstandard not available")
+    def test_zstd(self):
+        
+        cache = DiskCache(self.path, compression=COMPRESS_ZSTD)
+        cache.set("key", DATA)
+        
+        self.assertEqual(cache.get("key"), DATA)
+        self.assertLess(cache.size, len(DATA) / 4)
+    
+    
+    def test_uncompressed(self):
+        
+        cache = DiskCache(self.path, compression=None)
+        cache.set("key", DATA)
+        cache.set("small", b"{}")
+        
+        self.assertEqual(cache.get("key"), DATA)
+        self.assertEqual(cache.get("small"), b"{}")
+    
+    
+    def test_small(self):
+        
+        cache = DiskCache(self.path, compression=COMPRESS_ZLIB, compress_min=64)
+        cache.set("key", b"{}")
+        
+        self.assertEqual(cache.get("key"), b"{}")
+    
+    
+    def test_reopen(self):
+        
+        cache = DiskCache(self.path)
+        cache.set("key", DATA)
+        size = cache.size
+        
+        cache = DiskCache(self.path)
+        
+        self.assertEqual(cache.get("key"), DATA)
+        self.assertEqual(cache.size, size)
+        self.assertEqual(cache.raw_size, len(DATA))
+    
+    
+    def test_dictionary(self):
+        
+        cache = DiskCache(self.path, compression=COMPRESS_ZLIB)
+        cache.set("key", DATA)
+        
+        # data stored with other dictionary are ignored
+        cache = DiskCache(self.path, compression=COMPRESS_ZLIB, zdict=b"other dictionary")
+        self.assertIsNone(cache.get("key"))
+        
+        cache.set("key", DATA)
+        self.assertEqual(cache.get("key"), DATA)
+        self.assertEqual(self.count_objects(), 1)
+    
+    
+    def test_shared(self):
+        
+        cache = DiskCache(self.path)
+        cache.set("key1", DATA)
+        cache.set("key2", DATA)
+        
+        self.assertEqual(self.count_objects(), 1)
+        
+        cache.delete("key1")
+        self.assertEqual(cache.get("key2"), DATA)
+        
+        cache.delete("key2")
+        self.assertEqual(self.count_objects(), 0)
+        self.assertEqual(cache.size, 0)
+    
+    
+    def test_overwrite(self):
+        
+        cache = DiskCache(self.path)
+        
+        for i in range(5):
+            cache.set("key", DATA + b" " * i)
+        
+        self.assertEqual(cache.get("key"), DATA + b" " * 4)
+        self.assertEqual(self.count_objects(), 1)
+    
+    
+    def test_evict(self):
+        
+        cache = DiskCache(self.path, compression=None, max_size=3 * (len(DATA) + 64))
+        
+        for i in range(3):
+            cache.set("key%d" % i, DATA + b" " * i)
+        
+        cache.get("key0")
+        cache.set("key3", DATA + b" " * 3)
+        
+        self.assertIsNone(cache.get("key1"))
+        self.assertIsNotNone(cache.get("key0"))
+        self.assertEqual(self.count_objects(), 3)
+    
+    
+    def test_clear(self):
+        
+        cache = DiskCache(self.path)
+        cache.set("key", DATA)
+        cache.clear()
+        
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(self.count_objects(), 0)
+        self.assertEqual(cache.size, 0)
+
+
+class SharedDiskCacheTest(unittest.TestCase):
+    
+    
+    def setUp(self):
+        
+        self._temp = tempfile.TemporaryDirectory()
+        self.path = self._temp.name
+    
+    
+    def tearDown(self):
+        
+        self._temp.cleanup()
+    
+    
+    def test_shared_data(self):
+        
+        cache1 = DiskCache(self.path)
+        cache2 = DiskCache(self.path)
+        
+        cache1.set("key1", DATA)
+        cache2.set("key2", DATA)
+        
+        # data used by other instance are kept
+        cache1.delete("key1")
+        self.assertEqual(cache2.get("key2"), DATA)
+        
+        cache1.set("key1", DATA)
+        cache1.set("key1", DATA + b" ")
+        self.assertEqual(cache2.get("key2"), DATA)
+        
+        cache2.delete("key2")
+        self.assertEqual(cache1.get("key1"), DATA + b" ")
+        self.assertEqual(len(os.listdir(os.path.join(self.path, "objects"))), 1)
+    
+    
+    def test_evict_other(self):
+        
+        cache1 = DiskCache(self.path, compression=None, max_size=2 * (len(DATA) + 64))
+        cache2 = DiskCache(self.path)
+        
+        cache2.set("key", DATA)
+        cache1.get("key")
+        
+        for i in range(3):
+            cache1.set("key%d" % i, DATA + b" " * (i + 1))
+        
+        self.assertIsNone(cache2.get("key"))
+        self.assertEqual(cache1.get("key2"), DATA + b" " * 3)
+    
+    
+    @unittest.skipUnless(hasattr(os, 'fork'), "fork not available")
+    def test_processes(self):
+        
+        cache = DiskCache(self.path, max_size=20000)
+        
+        # overwrite and delete shared data from several processes
+        pids = []
+        for p in range(4):
+            
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    for i in range(200):
+                        key = "key%d" % (i % 7)
+                        if i % 5 == 0:
+                            cache.delete(key)
+                        else:
+                            cache.set(key, DATA + b" " * (i % 3))
+                finally:
+                    os._exit(0)
+            
+            pids.append(pid)
+        
+        for pid in pids:
+            os.waitpid(pid, 0)
+        
+        # check all keys readable
+        cache = DiskCache(self.path)
+        for i in range(7):
+            data = cache.get("key%d" % i)
+            self.assertIn(data, (None, DATA, DATA + b" ", DATA + b"  "))
+        
+        keys = os.listdir(os.path.join(self.path, "keys"))
+        objects = os.listdir(os.path.join(self.path, "objects"))
+        self.assertLessEqual(len(objects), len(keys))
+
+
+class ClientDiskCacheTest(ClientTestCase):
+    
+    
+    def setUp(self):
+        
+        super().setUp()
+        
+        self._temp = tempfile.TemporaryDirectory()
+        request.set_cache(ResponseCache(DiskCache(self._temp.name)))
+    
+    
+    def tearDown(self):
+        
+        super().tearDown()
+        
+        self._temp.cleanup()
+    
+    
+    def test_cached(self):
+        
+        client = rebrick.Rebrick()
+        colors = client.get_colors()
+        
+        self.assertEqual(len(client.get_colors()), len(colors))
+        self.assertEqual(len(self.transport.keys), 1)
@@ -0,0 +1,117 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import time
+import unittest
+import threading
+import urllib.error
+import concurrent.futures
+import rebrick
+from rebrick import request
+from rebrick.scheduler import Scheduler, CancelToken, scheduled, get_deadline, get_timeout
+from .utils import ClientTestCase
+
+
+class CancelTokenTest(unittest.TestCase):
+    
+    
+    def test_waiting(self):
+        
+        scheduler = Scheduler(delay=5)
+        scheduler.acquire("key")
+        
+        token = CancelToken()
+        threading.Timer(0.05, token.cancel).start()
+        
+        started = time.monotonic()
+        with self.assertRaises(concurrent.futures.CancelledError):
+            scheduler.acquire("key", cancel=(token,))
+        
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertFalse(scheduler._buckets["key"].waiters)
+    
+    
+    def test_callback(self):
+        
+        token = CancelToken()
+        token.cancel()
+        
+        called = []
+        token.add_callback(lambda: called.append(True))
+        
+        self.assertEqual(called, [True])
+        self.assertRaises(concurrent.futures.CancelledError, token.check)
+
+
+class DeadlineTest(unittest.TestCase):
+    
+    
+    def test_nested(self):
+        
+        deadline = time.monotonic() + 1
+        
+        with scheduled(deadline=deadline):
+            with scheduled(deadline=deadline + 10):
+                self.assertEqual(get_deadline(), deadline)
+            
+            with scheduled(deadline=deadline - 0.5):
+                self.assertEqual(get_deadline(), deadline - 0.5)
+        
+        self.assertIsNone(get_deadline())
+    
+    
+    def test_timeout(self):
+        
+        self.assertEqual(get_timeout(30), 30)
+        
+        with scheduled(deadline=time.monotonic() + 1):
+            self.assertLessEqual(get_timeout(30), 1)
+        
+        with scheduled(deadline=time.monotonic() - 1):
+            self.assertRaises(TimeoutError, get_timeout, 30)
+
+
+class ClientCancellationTest(ClientTestCase):
+    
+    
+    def test_cancelled(self):
+        
+        token = CancelToken()
+        token.cancel()
+        
+        with self.assertRaises(concurrent.futures.CancelledError):
+            rebrick.Rebrick().get_colors(cancel=token)
+        
+        self.assertEqual(self.transport.keys, [])
+    
+    
+    def test_between_pages(self):
+        
+        token = CancelToken()
+        self.transport.callback = lambda url: token.cancel()
+        
+        with self.assertRaises(concurrent.futures.CancelledError):
+            rebrick.Rebrick().get_parts(cancel=token)
+        
+        self.assertEqual(len(self.transport.keys), 1)
+    
+    
+    def test_timeout(self):
+        
+        self.server.latency = 1
+        
+        started = time.monotonic()
+        with self.assertRaises((TimeoutError, urllib.error.URLError)):
+            rebrick.Rebrick().get_color(0, timeout=0.1)
+        
+        self.assertLess(time.monotonic() - started, 0.8)
+    
+    
+    def test_instance_timeout(self):
+        
+        scheduler = Scheduler(delay=5)
+        scheduler.acquire("key")
+        request.set_scheduler(scheduler)
+        
+        with self.assertRaises(TimeoutError):
+            rebrick.Rebrick(timeout=0.1).get_color(0)
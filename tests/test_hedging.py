@@ -0,0 +1,215 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import io
+import time
+import unittest
+import threading
+import urllib.error
+import rebrick
+from rebrick import request
+from rebrick.hedging import HedgePolicy
+from rebrick.transport import Response
+from .utils import ClientTestCase
+
+
+class HedgePolicyTest(unittest.TestCase):
+    
+    
+    def test_fast(self):
+        
+        calls = []
+        
+        def send():
+            calls.append(True)
+            return Response(b"data")
+        
+        policy = HedgePolicy(delay=1)
+        
+        self.assertEqual(policy.send(send, "lego/sets/{id}/", lambda: True).read(), b"data")
+        self.assertEqual(len(calls), 1)
+    
+    
+    def test_slow(self):
+        
+        calls = []
+        
+        def send():
+            calls.append(True)
+            if len(calls) == 1:
+                time.sleep(1)
+            return Response(b"%d" % len(calls))
+        
+        policy = HedgePolicy(delay=0.05)
+        
+        started = time.monotonic()
+        self.assertEqual(policy.send(send, "lego/sets/{id}/", lambda: True).read(), b"2")
+        self.assertLess(time.monotonic() - started, 0.5)
+    
+    
+    def test_no_budget(self):
+        
+        calls = []
+        
+        def send():
+            calls.append(True)
+            time.sleep(0.1)
+            return Response(b"data")
+        
+        policy = HedgePolicy(delay=0.01)
+        
+        self.assertEqual(policy.send(send, "lego/sets/{id}/", lambda: False).read(), b"data")
+        self.assertEqual(len(calls), 1)
+    
+    
+    def test_prefer_success(self):
+        
+        barrier = threading.Barrier(2)
+        calls = []
+        
+        # finish both at once, primary fails
+        def send():
+            calls.append(True)
+            first = len(calls) == 1
+            barrier.wait()
+            if first:
+                raise urllib.error.URLError("Failed")
+            return Response(b"data")
+        
+        policy = HedgePolicy(delay=0.01)
+        
+        for i in range(5):
+            calls.clear()
+            self.assertEqual(policy.send(send, "lego/sets/{id}/", lambda: True).read(), b"data")
+    
+    
+    def test_close_unused(self):
+        
+        barrier = threading.Barrier(2)
+        responses = []
+        
+        def send():
+            response = Response(b"data")
+            responses.append(response)
+            barrier.wait()
+            return response
+        
+        policy = HedgePolicy(delay=0.01)
+        used = policy.send(send, "lego/sets/{id}/", lambda: True)
+        time.sleep(0.05)
+        
+        self.assertEqual(len(responses), 2)
+        self.assertFalse(used.closed)
+        self.assertTrue(all(r.closed for r in responses if r is not used))
+    
+    
+    def test_wait_after_failure(self):
+        
+        calls = []
+        
+        # hedge fails fast by server error
+        def send():
+            calls.append(True)
+            if len(calls) == 1:
+                time.sleep(0.2)
+                return Response(b"data")
+            raise urllib.error.HTTPError("", 503, "Unavailable", None, io.BytesIO())
+        
+        policy = HedgePolicy(delay=0.01)
+        
+        self.assertEqual(policy.send(send, "lego/sets/{id}/", lambda: True).read(), b"data")
+    
+    
+    def test_final_error(self):
+        
+        calls = []
+        
+        # hedge gets final error
+        def send():
+            calls.append(True)
+            if len(calls) == 1:
+                time.sleep(1)
+                return Response(b"data")
+            raise urllib.error.HTTPError("", 404, "Not Found", None, io.BytesIO())
+        
+        policy = HedgePolicy(delay=0.01)
+        
+        started = time.monotonic()
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            policy.send(send, "lego/sets/{id}/", lambda: True)
+        
+        self.assertEqual(context.exception.code, 404)
+        self.assertLess(time.monotonic() - started, 0.5)
+    
+    
+    def test_both_failed(self):
+        
+        def send():
+            time.sleep(0.02)
+            raise urllib.error.URLError("Failed")
+        
+        policy = HedgePolicy(delay=0.01)
+        
+        with self.assertRaises(urllib.error.URLError):
+            policy.send(send, "lego/sets/{id}/", lambda: True)
+    
+    
+    def test_delay(self):
+        
+        policy = HedgePolicy(percentile=50, delay=1, min_delay=0.001, min_samples=5)
+        
+        for i in range(5):
+            policy.send(lambda: Response(b""), "lego/sets/{id}/", lambda: True)
+        
+        self.assertLess(policy.get_delay("lego/sets/{id}/"), 1)
+        self.assertEqual(policy.get_delay("lego/parts/{id}/"), 1)
+    
+    
+    def test_primary_latency(self):
+        
+        calls = []
+        
+        def send():
+            calls.append(True)
+            if len(calls) % 2:
+                time.sleep(0.2)
+            return Response(b"data")
+        
+        policy = HedgePolicy(percentile=50, delay=0.01, min_delay=0.001, min_samples=3)
+        
+        # hedged wins are not recorded
+        for i in range(3):
+            policy.send(send, "lego/sets/{id}/", lambda: True)
+            time.sleep(0.25)
+        
+        self.assertGreater(policy.get_delay("lego/sets/{id}/"), 0.15)
+    
+    
+    def test_endpoints(self):
+        
+        policy = HedgePolicy(endpoints=["lego/sets/{id}/"])
+        
+        self.assertTrue(policy.is_hedged("lego/sets/{id}/"))
+        self.assertFalse(policy.is_hedged("lego/parts/{id}/"))
+
+
+class ClientHedgingTest(ClientTestCase):
+    
+    
+    def test_hedged(self):
+        
+        request.set_hedging(HedgePolicy(delay=0.05))
+        
+        # slow down primary request
+        def delay(url):
+            if len(self.transport.keys) == 1:
+                time.sleep(1)
+        
+        self.transport.callback = delay
+        
+        started = time.monotonic()
+        color = rebrick.Rebrick().get_color(0)
+        
+        self.assertEqual(color.color_id, 0)
+        self.assertEqual(len(self.transport.keys), 2)
+        self.assertLess(time.monotonic() - started, 0.5)
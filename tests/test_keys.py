@@ -0,0 +1,89 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import time
+import unittest
+import threading
+import rebrick
+from rebrick import request
+from rebrick.scheduler import Scheduler
+from .utils import ClientTestCase
+
+
+class SelectKeyTest(unittest.TestCase):
+    
+    
+    def test_unused(self):
+        
+        scheduler = Scheduler(delay=1)
+        scheduler.acquire("key1")
+        
+        self.assertEqual(scheduler.select_key(("key1", "key2")), "key2")
+    
+    
+    def test_earliest(self):
+        
+        scheduler = Scheduler(delay=1)
+        scheduler.acquire("key2")
+        time.sleep(0.01)
+        scheduler.acquire("key1")
+        
+        self.assertEqual(scheduler.select_key(("key1", "key2")), "key2")
+    
+    
+    def test_sticky(self):
+        
+        scheduler = Scheduler(delay=1)
+        keys = ("key1", "key2", "key3")
+        
+        selected = scheduler.select_key(keys, "token")
+        scheduler.acquire(selected)
+        
+        self.assertEqual(scheduler.select_key(keys, "token"), selected)
+
+
+class ClientKeysTest(ClientTestCase):
+    
+    
+    def setUp(self):
+        
+        super().setUp()
+        
+        request.set_scheduler(Scheduler(delay=0.2))
+    
+    
+    def test_pool(self):
+        
+        client = rebrick.Rebrick(api_key=("key1", "key2", "key3"))
+        
+        # send in parallel
+        threads = [threading.Thread(target=client.get_color, args=(0,)) for i in range(3)]
+        
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(sorted(self.transport.keys), ["key1", "key2", "key3"])
+        self.assertLess(time.monotonic() - started, 0.4)
+    
+    
+    def test_single(self):
+        
+        client = rebrick.Rebrick(api_key="key1")
+        client.get_color(0)
+        client.get_color(0)
+        
+        self.assertEqual(self.transport.keys, ["key1", "key1"])
+    
+    
+    def test_sticky(self):
+        
+        client = rebrick.Rebrick(api_key=("key1", "key2", "key3"), user_token="token")
+        
+        for i in range(3):
+            client.get_users_partlists()
+        
+        self.assertEqual(len(set(self.transport.keys)), 1)
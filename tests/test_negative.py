@@ -0,0 +1,72 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import time
+import unittest
+import urllib.error
+import rebrick
+from rebrick import request
+from rebrick.cache import NegativeCache
+from .utils import ClientTestCase
+
+
+class NegativeCacheTest(unittest.TestCase):
+    
+    
+    def test_check(self):
+        
+        cache = NegativeCache(ttl=0.1)
+        cache.add("key")
+        
+        self.assertRaises(urllib.error.HTTPError, cache.check, "key")
+        
+        time.sleep(0.15)
+        cache.check("key")
+        self.assertNotIn("key", cache)
+
+
+class ClientNegativeCacheTest(ClientTestCase):
+    
+    
+    def setUp(self):
+        
+        super().setUp()
+        
+        request.set_negative_cache(NegativeCache(ttl=0.3))
+    
+    
+    def test_request(self):
+        
+        client = rebrick.Rebrick()
+        
+        for i in range(3):
+            with self.assertRaises(urllib.error.HTTPError):
+                client.get_color(999999)
+        
+        self.assertEqual(len(self.transport.keys), 1)
+    
+    
+    def test_file_expiry(self):
+        
+        client = rebrick.Rebrick(silent=True)
+        url = self.server.url + "missing.png?key=key"
+        
+        # repeated hits must not extend the expiry
+        for i in range(8):
+            self.assertIsNone(client.get_file(url))
+            time.sleep(0.1)
+        
+        self.assertGreaterEqual(len(self.transport.keys), 2)
+        self.assertLessEqual(len(self.transport.keys), 4)
+    
+    
+    def test_file_error(self):
+        
+        client = rebrick.Rebrick()
+        url = self.server.url + "missing.png?key=key"
+        
+        for i in range(2):
+            with self.assertRaises(urllib.error.HTTPError):
+                client.get_file(url)
+        
+        self.assertEqual(len(self.transport.keys), 1)
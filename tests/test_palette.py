@@ -0,0 +1,80 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import random
+import unittest
+import unittest.mock
+from rebrick import palette
+from rebrick.objects import Color
+from rebrick.palette import Palette
+
+
+def make_colors(count=60, seed=0):
+    """Creates random palette colors."""
+    
+    rand = random.Random(seed)
+    colors = []
+    
+    for i in range(count):
+        colors.append(Color(
+            color_id = i,
+            rgb = "%02X%02X%02X" % (rand.randrange(256), rand.randrange(256), rand.randrange(256)),
+            is_trans = rand.random() < 0.2))
+    
+    return colors
+
+
+def make_values(count=2000, seed=1):
+    """Creates random query colors including duplicates."""
+    
+    rand = random.Random(seed)
+    values = [(rand.randrange(256), rand.randrange(256), rand.randrange(256)) for i in range(count)]
+    
+    return values + values[:100]
+
+
+class PaletteTest(unittest.TestCase):
+    
+    
+    def test_python(self):
+        
+        colors = make_colors()
+        
+        with unittest.mock.patch.object(palette, 'numpy', None):
+            pal = Palette(colors)
+            
+            for color in pal.colors:
+                self.assertEqual(pal.match([color.rgb])[0].rgb, color.rgb)
+            
+            solid = pal.match(make_values(100), is_trans=False)
+            self.assertFalse(any(c.is_trans for c in solid))
+    
+    
+    @unittest.skipUnless(palette.numpy, "numpy not available")
+    def test_numpy_python(self):
+        
+        colors = make_colors()
+        values = make_values()
+        
+        pal_numpy = Palette(colors)
+        with unittest.mock.patch.object(palette, 'numpy', None):
+            pal_python = Palette(colors)
+        
+        for is_trans in (None, True, False):
+            
+            indices_numpy = pal_numpy.match_indices(values, is_trans).tolist()
+            indices_array = pal_numpy.match_indices(palette.numpy.array(values, dtype=palette.numpy.uint8), is_trans).tolist()
+            
+            with unittest.mock.patch.object(palette, 'numpy', None):
+                indices_python = list(pal_python.match_indices(values, is_trans))
+            
+            self.assertEqual(indices_numpy, indices_array)
+            self.assertEqual(len(indices_numpy), len(indices_python))
+            
+            # allow different choice of equally close colors
+            for value, i, j in zip(values, indices_numpy, indices_python):
+                if i != j:
+                    lab = palette._rgb_to_lab(value)
+                    dist_numpy = sum((x - y) ** 2 for x, y in zip(lab, pal_python._lab[3*i:3*i+3]))
+                    dist_python = sum((x - y) ** 2 for x, y in zip(lab, pal_python._lab[3*j:3*j+3]))
+                    self.assertAlmostEqual(dist_numpy, dist_python, places=2)
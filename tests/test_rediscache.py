@@ -0,0 +1,122 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import time
+import unittest
+import unittest.mock
+from rebrick import rediscache
+from rebrick.rediscache import RedisCache
+from rebrick.server import MockRedisServer
+
+
+class RedisCacheTest(unittest.TestCase):
+    
+    
+    def setUp(self):
+        
+        self.server = MockRedisServer()
+        self.server.start()
+        
+        self.cache = RedisCache(host=self.server.host, port=self.server.port, compress_min=64)
+    
+    
+    def tearDown(self):
+        
+        self.server.stop()
+    
+    
+    def test_hit_miss(self):
+        
+        self.assertIsNone(self.cache.get("key"))
+        self.assertNotIn("key", self.cache)
+        
+        self.cache.set("key", b"data")
+        self.assertEqual(self.cache.get("key"), b"data")
+        self.assertIn("key", self.cache)
+        
+        self.cache.delete("key")
+        self.assertIsNone(self.cache.get("key"))
+    
+    
+    def test_compress(self):
+        
+        data = b"data" * 100
+        self.cache.set("key", data)
+        
+        value = list(self.server.data.values())[0][0]
+        self.assertLess(len(value), len(data))
+        self.assertEqual(self.cache.get("key"), data)
+    
+    
+    def test_ttl(self):
+        
+        self.cache.set("key", b"data", ttl=0.05)
+        self.assertEqual(self.cache.get("key"), b"data")
+        
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get("key"))
+    
+    
+    def test_lock(self):
+        
+        with self.cache.lock("key", wait=0.05) as acquired:
+            self.assertTrue(acquired)
+            
+            with self.cache.lock("key", wait=0.05) as acquired:
+                self.assertFalse(acquired)
+        
+        self.assertEqual(self.server.data, {})
+        
+        with self.cache.lock("key", wait=0.05) as acquired:
+            self.assertTrue(acquired)
+    
+    
+    def test_lock_expired(self):
+        
+        first = self.cache.lock("key", timeout=0.05)
+        self.assertTrue(first.__enter__())
+        time.sleep(0.1)
+        
+        second = self.cache.lock("key", wait=0.05)
+        self.assertTrue(second.__enter__())
+        
+        # keep lock of other holder
+        first.__exit__(None, None, None)
+        self.assertEqual(len(self.server.data), 1)
+        
+        second.__exit__(None, None, None)
+        self.assertEqual(self.server.data, {})
+    
+    
+    def test_release_fallback(self):
+        
+        with self.cache.lock("key") as acquired:
+            self.assertTrue(acquired)
+            self.assertTrue(self.cache._use_eval)
+        
+        self.assertFalse(self.cache._use_eval)
+        self.assertEqual(self.server.data, {})
+        
+        # keep lock taken over by other holder
+        with self.cache.lock("key") as acquired:
+            name = list(self.server.data)[0]
+            self.server.data[name] = (b"other", None)
+        
+        self.assertEqual(self.server.data[name][0], b"other")
+    
+    
+    def test_unavailable(self):
+        
+        self.server.stop()
+        cache = RedisCache(host=self.server.host, port=self.server.port, retry_delay=0.1)
+        
+        with unittest.mock.patch.object(rediscache, '_Connection', wraps=rediscache._Connection) as connection:
+            
+            self.assertIsNone(cache.get("key"))
+            self.assertIsNone(cache.get("key"))
+            cache.set("key", b"data")
+            self.assertEqual(connection.call_count, 1)
+            
+            time.sleep(0.15)
+            self.assertIsNone(cache.get("key"))
+            self.assertEqual(connection.call_count, 2)
@@ -0,0 +1,90 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import os
+import sys
+import tempfile
+import unittest.mock
+from rebrick import reference
+from rebrick.reference import ReferenceData
+from .utils import ClientTestCase
+
+
+class ReferenceDataTest(ClientTestCase):
+    
+    
+    def setUp(self):
+        
+        super().setUp()
+        
+        self._temp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._temp.name, "reference.json.gz")
+        self.seed = os.path.join(self._temp.name, "seed.json.gz")
+    
+    
+    def tearDown(self):
+        
+        super().tearDown()
+        
+        self._temp.cleanup()
+    
+    
+    def test_create(self):
+        
+        data = ReferenceData(self.path, seed=None)
+        colors = data.get_colors()
+        
+        self.assertTrue(colors)
+        self.assertTrue(os.path.exists(self.path))
+        self.assertEqual(len(ReferenceData(self.path, seed=None).get_colors()), len(colors))
+    
+    
+    def test_seed(self):
+        
+        ReferenceData(self.seed, seed=None).update()
+        count = len(self.transport.keys)
+        
+        # use seed without any request
+        data = ReferenceData(self.path, max_age=3600, seed=self.seed)
+        
+        self.assertTrue(data.get_themes())
+        self.assertTrue(data.get_categories())
+        self.assertEqual(len(self.transport.keys), count)
+        self.assertFalse(os.path.exists(self.path))
+    
+    
+    def test_refresh(self):
+        
+        ReferenceData(self.seed, seed=None).update()
+        count = len(self.transport.keys)
+        
+        # refresh old seed into file
+        data = ReferenceData(self.path, max_age=0, seed=self.seed)
+        data.get_colors()
+        data._thread.join()
+        
+        self.assertTrue(os.path.exists(self.path))
+        self.assertGreater(len(self.transport.keys), count)
+    
+    
+    def test_retry_delay(self):
+        
+        data = ReferenceData(self.path, max_age=0, retry_delay=60, seed=None)
+        
+        # create and refresh once
+        for i in range(20):
+            data.get_colors()
+        
+        data._thread.join()
+        self.assertEqual(len(self.transport.keys), 6)
+    
+    
+    def test_main(self):
+        
+        argv = ["rebrick.reference", "--api-key", "key", "--output", self.seed]
+        
+        with unittest.mock.patch.object(sys, 'argv', argv):
+            with unittest.mock.patch('builtins.print'):
+                reference.main()
+        
+        self.assertTrue(ReferenceData(self.path, seed=self.seed).load())
@@ -0,0 +1,27 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import rebrick
+from rebrick.refresher import Refresher
+from .utils import ClientTestCase
+
+
+class PrewarmTest(ClientTestCase):
+    
+    
+    def test_count(self):
+        
+        client = rebrick.Rebrick()
+        refresher = Refresher()
+        
+        calls = [(client.get_set, "10000-1"), (client.get_set, "10001-1"), (client.get_set, "missing-1")]
+        self.assertEqual(refresher.prewarm(calls, workers=2), 2)
+    
+    
+    def test_count_silent(self):
+        
+        client = rebrick.Rebrick(silent=True)
+        refresher = Refresher()
+        
+        calls = [(client.get_set, "10000-1"), (client.get_set, "missing-1")]
+        self.assertEqual(refresher.prewarm(calls), 1)
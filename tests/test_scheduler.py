@@ -0,0 +1,153 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import time
+import unittest
+import threading
+import rebrick
+from rebrick import request
+from rebrick.scheduler import PRIORITY_INTERACTIVE, PRIORITY_BULK, Scheduler
+from .utils import ClientTestCase
+
+
+class RecordingScheduler(Scheduler):
+    """Scheduler remembering priorities of dispatched requests."""
+    
+    
+    def __init__(self, **kwargs):
+        
+        super().__init__(**kwargs)
+        
+        self.priorities = []
+    
+    
+    def acquire(self, key=None, priority=rebrick.PRIORITY_NORMAL, deadline=None, cancel=()):
+        
+        waited = super().acquire(key, priority, deadline, cancel)
+        self.priorities.append(priority)
+        
+        return waited
+
+
+class SchedulerTest(unittest.TestCase):
+    
+    
+    def test_delay(self):
+        
+        scheduler = Scheduler(delay=0.05)
+        
+        started = time.monotonic()
+        for i in range(3):
+            scheduler.acquire("key")
+        
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+    
+    
+    def test_keys_independent(self):
+        
+        scheduler = Scheduler(delay=1)
+        
+        started = time.monotonic()
+        scheduler.acquire("key1")
+        scheduler.acquire("key2")
+        
+        self.assertLess(time.monotonic() - started, 0.5)
+    
+    
+    def test_priority(self):
+        
+        scheduler = Scheduler(delay=0.1)
+        scheduler.acquire("key")
+        
+        order = []
+        
+        def acquire(priority):
+            scheduler.acquire("key", priority)
+            order.append(priority)
+        
+        # queue bulk requests before interactive one
+        threads = []
+        for priority in (PRIORITY_BULK,) * 3 + (PRIORITY_INTERACTIVE,):
+            thread = threading.Thread(target=acquire, args=(priority,))
+            thread.start()
+            threads.append(thread)
+            _wait_waiters(scheduler, "key", len(threads))
+        
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(order[0], PRIORITY_INTERACTIVE)
+        self.assertEqual(len(order), 4)
+    
+    
+    def test_deadline(self):
+        
+        scheduler = Scheduler(delay=1)
+        scheduler.acquire("key")
+        
+        with self.assertRaises(TimeoutError):
+            scheduler.acquire("key", deadline=time.monotonic() + 0.05)
+        
+        self.assertFalse(scheduler._buckets["key"].waiters)
+    
+    
+    def test_try_acquire(self):
+        
+        scheduler = Scheduler(delay=1)
+        
+        self.assertTrue(scheduler.try_acquire("key"))
+        self.assertFalse(scheduler.try_acquire("key"))
+        self.assertTrue(scheduler.try_acquire("other"))
+    
+    
+    def test_unknown_priority(self):
+        
+        with self.assertRaises(ValueError):
+            Scheduler().acquire("key", "unknown")
+
+
+class ClientPriorityTest(ClientTestCase):
+    
+    
+    def setUp(self):
+        
+        super().setUp()
+        
+        self.scheduler = RecordingScheduler(delay=0)
+        request.set_scheduler(self.scheduler)
+    
+    
+    def test_default(self):
+        
+        rebrick.Rebrick().get_colors()
+        self.assertEqual(set(self.scheduler.priorities), {rebrick.PRIORITY_NORMAL})
+    
+    
+    def test_instance(self):
+        
+        rebrick.Rebrick(priority=PRIORITY_BULK).get_colors()
+        self.assertEqual(set(self.scheduler.priorities), {PRIORITY_BULK})
+    
+    
+    def test_call(self):
+        
+        rebrick.Rebrick(priority=PRIORITY_BULK).get_colors(priority=PRIORITY_INTERACTIVE)
+        self.assertEqual(set(self.scheduler.priorities), {PRIORITY_INTERACTIVE})
+    
+    
+    def test_context(self):
+        
+        with rebrick.scheduled(PRIORITY_BULK):
+            rebrick.Rebrick().get_colors()
+        
+        self.assertEqual(set(self.scheduler.priorities), {PRIORITY_BULK})
+
+
+def _wait_waiters(scheduler, key, count):
+    """Waits until given number of requests is queued or dispatched."""
+    
+    for i in range(1000):
+        with scheduler._cond:
+            if len(scheduler._buckets[key].waiters) >= count:
+                return
+        time.sleep(0.001)
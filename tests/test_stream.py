@@ -0,0 +1,87 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import json
+import unittest
+import unittest.mock
+from rebrick import config
+from rebrick.stream import ResultsReader
+from rebrick.transport import Response
+
+# define sample page
+PAGE = {
+    'count': 3,
+    'next': "https://rebrickable.com/api/v3/lego/parts/?page=2",
+    'previous': None,
+    'results': [{'name': "Brick ]} \"1\"", 'ids': [1, {'id': 2}]}, 2, "text"]}
+
+
+class ResultsReaderTest(unittest.TestCase):
+    
+    
+    def make_reader(self, data, buffer_size, chunk_size=4):
+        
+        body = json.dumps(data).encode('utf-8')
+        response = Response(body, headers={'Content-Length': str(len(body))})
+        
+        return ResultsReader(response, chunk_size=chunk_size, buffer_size=buffer_size)
+    
+    
+    def test_results(self):
+        
+        for buffer_size in (0, 1000):
+            
+            reader = self.make_reader(PAGE, buffer_size)
+            
+            self.assertEqual(list(reader['results']), PAGE['results'])
+            self.assertEqual(reader['next'], PAGE['next'])
+            self.assertEqual(reader['count'], 3)
+            self.assertRaises(ValueError, reader.results)
+    
+    
+    def test_skip(self):
+        
+        for buffer_size in (0, 1000):
+            
+            reader = self.make_reader(PAGE, buffer_size)
+            
+            self.assertIsNone(reader['previous'])
+            self.assertEqual(reader.data['results'], [])
+    
+    
+    def test_no_results(self):
+        
+        for buffer_size in (0, 1000):
+            
+            reader = self.make_reader({'detail': "Not found."}, buffer_size)
+            
+            self.assertEqual(list(reader['results']), [])
+            self.assertEqual(reader['detail'], "Not found.")
+    
+    
+    def test_unicode(self):
+        
+        data = {'results': [{'name': "Kostka čtverec ★"}, "é" * 10]}
+        
+        for chunk_size in (1, 2, 3):
+            reader = self.make_reader(data, 0, chunk_size)
+            self.assertEqual(list(reader['results']), data['results'])
+    
+    
+    def test_truncated(self):
+        
+        response = Response(b'{"results": [{"id": 1}, {"id": 2')
+        reader = ResultsReader(response, chunk_size=4, buffer_size=0)
+        
+        self.assertRaises(ValueError, list, reader['results'])
+    
+    
+    def test_custom_decoder(self):
+        
+        decoder = unittest.mock.Mock(side_effect=json.loads)
+        
+        with unittest.mock.patch.object(config, 'JSON_DECODER', decoder):
+            reader = self.make_reader(PAGE, 0)
+            self.assertEqual(list(reader['results']), PAGE['results'])
+        
+        self.assertEqual(decoder.call_count, len(PAGE['results']) + 1)
@@ -0,0 +1,33 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import rebrick
+from .utils import ClientTestCase
+
+
+class SetThemesTest(ClientTestCase):
+    
+    
+    def test_themes(self):
+        
+        client = rebrick.Rebrick()
+        data = self.server.catalogue.sets["10000-1"]
+        
+        themes = client.get_set_themes("10000-1")
+        self.assertEqual(themes[-1].theme_id, data['theme_id'])
+    
+    
+    def test_unknown(self):
+        
+        client = rebrick.Rebrick()
+        self.server.catalogue.sets["10000-1"]['theme_id'] = 999
+        
+        self.assertRaises(KeyError, client.get_set_themes, "10000-1")
+    
+    
+    def test_unknown_silent(self):
+        
+        client = rebrick.Rebrick(silent=True)
+        self.server.catalogue.sets["10000-1"]['theme_id'] = 999
+        
+        self.assertIsNone(client.get_set_themes("10000-1"))
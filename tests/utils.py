@@ -0,0 +1,84 @@
+# Created byMartin.cz
+# Copyright (c) Martin Strohalm. All rights reserved.
+
+import unittest
+import urllib.parse
+from rebrick import config
+from rebrick import request
+from rebrick.scheduler import Scheduler
+from rebrick.server import MockServer
+from rebrick.transport import Transport, UrllibTransport
+
+
+class ClientTestCase(unittest.TestCase):
+    """Runs client against local mock server with clean request state."""
+    
+    
+    def setUp(self):
+        """Starts mock server and resets request state."""
+        
+        self._state = (
+            request.get_transport(),
+            request.get_scheduler(),
+            request.get_hedging(),
+            request.get_cache(),
+            request.get_negative_cache(),
+            request.get_breaker(),
+            config.API_KEY)
+        
+        self.server = MockServer()
+        self.server.start()
+        self.server.configure()
+        
+        self.transport = CountingTransport()
+        
+        request.set_transport(self.transport)
+        request.set_scheduler(Scheduler(delay=0))
+        request.set_hedging(None)
+        request.set_cache(None)
+        request.set_negative_cache(None)
+        request.set_breaker(None)
+        config.API_KEY = "key"
+    
+    
+    def tearDown(self):
+        """Stops mock server and restores request state."""
+        
+        self.server.stop()
+        
+        transport, scheduler, hedging, cache, negative, breaker, config.API_KEY = self._state
+        
+        request.set_transport(transport)
+        request.set_scheduler(scheduler)
+        request.set_hedging(hedging)
+        request.set_cache(cache)
+        request.set_negative_cache(negative)
+        request.set_breaker(breaker)
+
+
+class CountingTransport(Transport):
+    """Sends requests by urllib and remembers used API keys."""
+    
+    
+    def __init__(self, callback=None):
+        
+        super().__init__()
+        
+        self.keys = []
+        self.callback = callback
+        self._transport = UrllibTransport()
+    
+    
+    def open(self, url, data=None, headers=None, timeout=None):
+        """Sends request and remembers its API key."""
+        
+        query = urllib.parse.urlsplit(url).query
+        if data is not None:
+            query = data.decode('utf-8')
+        
+        self.keys.append(dict(urllib.parse.parse_qsl(query)).get('key', None))
+        
+        if self.callback is not None:
+            self.callback(url)
+        
+        return self._transport.open(url, data, headers, timeout)